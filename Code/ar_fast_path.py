@@ -0,0 +1,123 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from arima_order_search import quiet_fit
+from instrumentation import instrument, write_run_report
+from price_store import list_tickers, load_prices
+
+# Directories
+selected_view = "selected"  # Price store view holding the selected stocks
+validation_file = "arima_fast_path_validation.csv"
+
+# Fast Path Parameters
+panel_chunk_size = 500  # Tickers per (ticker x time) panel, bounding the memory of one batched solve
+validation_sample = 25  # Stocks compared with the statsmodels fit in validation mode (None = all)
+
+# Function to check whether an order can be estimated by least squares: pure AR(p) on the d-th differences
+def supports(order):
+    p, _, q = order
+    return q == 0 and p > 0
+
+# Function to fit AR(p) by least squares on the d-th differences of many series at once.
+# Series are left-aligned in a zero-padded (ticker x time) panel; every sum runs over all tickers in one pass.
+# Returns, per series, the coefficients (a constant first when d == 0, like statsmodels' trend) and the
+# one-step fitted values in levels (NaN for the first d bars, which have no difference to predict).
+def fit_ar_panel(series_list, p, d):
+    differenced = [np.diff(np.asarray(values, dtype=float), d) for values in series_list]
+    lengths = np.array([len(values) for values in differenced])
+    width = lengths.max(initial=0)
+    filled = np.arange(width) < lengths[:, np.newaxis]
+    panel = np.zeros(filled.shape)
+    panel[filled] = np.concatenate(differenced)
+
+    # Lags before the start of a series are taken as the series mean (d == 0) or zero (no drift, d > 0),
+    # so the first p bars still get a forecast; only rows with p real lags enter the fit
+    fill = panel.sum(axis=1) / np.maximum(lengths, 1) if d == 0 else np.zeros(len(panel))
+    padded = np.concatenate([np.repeat(fill[:, np.newaxis], p, axis=1), panel], axis=1)
+    regressors = [padded[:, p - 1 - lag:p - 1 - lag + width] for lag in range(p)]
+    if d == 0:
+        regressors.insert(0, np.ones_like(panel))
+    fit_mask = filled & (np.arange(width) >= p)
+
+    # Normal equations of every series, built from sums over the panel
+    k = len(regressors)
+    gram = np.empty((len(panel), k, k))
+    moment = np.empty((len(panel), k))
+    for a in range(k):
+        masked = np.where(fit_mask, regressors[a], 0.0)
+        moment[:, a] = (masked * panel).sum(axis=1)
+        for b in range(a, k):
+            gram[:, a, b] = gram[:, b, a] = (masked * regressors[b]).sum(axis=1)
+    try:
+        coefficients = np.linalg.solve(gram, moment[..., np.newaxis])[..., 0]
+    except np.linalg.LinAlgError:
+        # A constant or too short series makes its system singular, the pseudo-inverse still gives a fit
+        coefficients = np.einsum("nij,nj->ni", np.linalg.pinv(gram), moment)
+
+    # One-step forecasts of the differences, turned into levels as actual - residual
+    predicted = sum(coefficients[:, [a]] * regressors[a] for a in range(k))
+    residual = np.where(filled, panel - predicted, np.nan)
+    fitted = []
+    for index, values in enumerate(series_list):
+        levels = np.full(len(values), np.nan)
+        levels[d:] = np.asarray(values, dtype=float)[d:] - residual[index, :lengths[index]]
+        fitted.append(levels)
+    return coefficients, fitted
+
+# Function to fit the AR fast path for many stocks sharing one order, in chunks of tickers
+@instrument("arima_fast_path")
+def fit_stocks(datasets, order):
+    p, d, _ = order
+    names = list(datasets)
+    results = {}
+    for start in range(0, len(names), panel_chunk_size):
+        chunk = names[start:start + panel_chunk_size]
+        coefficients, fitted = fit_ar_panel([datasets[name]['Close'].values for name in chunk], p, d)
+        for name, params, values in zip(chunk, coefficients, fitted):
+            results[name] = (params, values)
+    return results
+
+# Function to compare the fast path with statsmodels' ARIMA fit for some stocks
+def validate(datasets, order, sample=validation_sample):
+    from statsmodels.tsa.arima.model import ARIMA
+    p, d, _ = order
+    names = list(datasets)[:sample] if sample else list(datasets)
+
+    start_time = time.perf_counter()
+    fast = fit_stocks({name: datasets[name] for name in names}, order)
+    fast_seconds = time.perf_counter() - start_time
+
+    rows, mle_seconds = [], 0.0
+    for name in names:
+        close = datasets[name]['Close'].values.astype(float)
+        start_time = time.perf_counter()
+        with quiet_fit():
+            arima_fit = ARIMA(close, order=order).fit()
+        mle_seconds += time.perf_counter() - start_time
+
+        params, fitted = fast[name]
+        ar_params = params[1:] if d == 0 else params
+        # Compared from the first bar with a full set of lags, where both are one-step forecasts from the same data
+        compared = slice(p + d, None)
+        mle_fitted = np.asarray(arima_fit.fittedvalues)[compared]
+        actual = close[compared]
+        rows.append({"Stock": name, "Order": str(tuple(order)),
+                     "Max_Coefficient_Difference": float(np.max(np.abs(ar_params - arima_fit.arparams))),
+                     "Max_Fitted_Difference": float(np.nanmax(np.abs(fitted[compared] - mle_fitted))),
+                     "Fast_Path_RMSE": float(np.sqrt(np.nanmean((fitted[compared] - actual) ** 2))),
+                     "Statsmodels_RMSE": float(np.sqrt(np.mean((mle_fitted - actual) ** 2)))})
+
+    report = pd.DataFrame(rows)
+    report.to_csv(validation_file, index=False)
+    print(report.to_string(index=False))
+    print(f"Fast path {fast_seconds:.3f}s, statsmodels {mle_seconds:.1f}s for {len(names)} stocks "
+          f"({mle_seconds / max(fast_seconds, 1e-9):.0f}x). Validation saved to {validation_file}")
+    return report
+
+if __name__ == "__main__":
+    # Usage: python ar_fast_path.py [p d] : compare the fast path with statsmodels on the selected stocks
+    order = (int(sys.argv[1]), int(sys.argv[2]), 0) if len(sys.argv) > 2 else (5, 1, 0)
+    stocks = {name: load_prices(selected_view, name, columns=["Date", "Close"]) for name in list_tickers(selected_view)}
+    validate(stocks, order)
+    write_run_report()
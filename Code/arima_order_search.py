@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import warnings
+from contextlib import contextmanager
+import numpy as np
+from bar_resampler import frequency_name, frequency_option, load_bars
+from feature_engine import first_difference
+from price_store import data_hash, list_tickers
+from worker_pool import process_pool
+
+# Directories
+selected_view = "selected"  # Price store view holding the selected stocks
+arima_orders_dir = frequency_name("arima_orders", frequency_option())  # Per bar frequency, one JSON file per ticker
+
+# Order Search Parameters
+use_selected_orders = False  # Let the modelling stages use the searched order instead of their default
+max_p = 5  # Largest AR order tried
+max_q = 3  # Largest MA order tried
+max_d = 2  # Largest differencing order tried
+criterion = "aic"  # "aic" or "bic"
+adf_significance = 0.05  # p-value below which a series counts as stationary
+prune_margin = 10.0  # Candidates scoring this much worse than the best are not expanded further
+parallel_mode = True  # Fit the candidates of a round in worker processes
+n_workers = None  # Number of worker processes (None = one per CPU core)
+bar_frequency = frequency_option()  # Bars the orders are searched on, from --bars; None keeps the stored bars
+
+# Function to silence, while ARIMA models are fitted, the convergence, starting-parameter and index-frequency warnings of statsmodels
+@contextmanager
+def quiet_fit():
+    from statsmodels.tools.sm_exceptions import ConvergenceWarning, EstimationWarning, ValueWarning
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        warnings.simplefilter("ignore", ValueWarning)
+        warnings.filterwarnings("ignore", message="Non-(stationary|invertible) starting", category=EstimationWarning)
+        yield
+
+# Function to pick the differencing order with repeated ADF tests, shared by all candidates.
+# The first difference can be passed in precomputed (from the feature store) instead of taken here.
+def select_differencing(values, max_diff=max_d, differenced=None):
+    from statsmodels.tsa.stattools import adfuller
+    series = np.asarray(values, dtype=float)
+    for d in range(max_diff + 1):
+        if d == 1 and differenced is not None:
+            series = np.asarray(differenced, dtype=float)
+        elif d > 0:
+            series = np.diff(series)
+        if adfuller(series, autolag="AIC")[1] < adf_significance:
+            return d, series
+    return max_diff, series
+
+# Function to fit one ARMA(p, q) candidate on the already differenced series and score it
+def score_candidate(differenced, p, q):
+    from statsmodels.tsa.arima.model import ARIMA
+    try:
+        with quiet_fit():
+            arima_fit = ARIMA(differenced, order=(p, 0, q), trend="n").fit()
+        score = arima_fit.aic if criterion == "aic" else arima_fit.bic
+
+        # Non-converged or non-finite fits count as diverged
+        converged = arima_fit.mle_retvals.get("converged", True) if arima_fit.mle_retvals else True
+        if not converged or not np.isfinite(score):
+            return p, q, np.nan
+        return p, q, float(score)
+    except Exception:
+        return p, q, np.nan
+
+# Function to search (p, d, q) for one series, expanding from simple to complex candidates
+def search_order(values, executor=None, first_diff=None):
+    d, differenced = select_differencing(values, differenced=first_diff)
+    scores = {}
+    best_order, best_score = (0, d, 0), np.inf
+
+    # Each round holds the candidates with p + q equal to the round number
+    for complexity in range(max_p + max_q + 1):
+        candidates = []
+        for p in range(min(complexity, max_p) + 1):
+            q = complexity - p
+            if q > max_q:
+                continue
+            # Only expand candidates whose simpler neighbours converged and were not dominated
+            parents = [(p - 1, q), (p, q - 1)]
+            parents = [parent for parent in parents if parent in scores]
+            if complexity > 0 and not any(np.isfinite(scores[parent]) and scores[parent] <= best_score + prune_margin
+                                          for parent in parents):
+                continue
+            candidates.append((p, q))
+
+        if not candidates:
+            break
+
+        if executor is None:
+            round_results = [score_candidate(differenced, p, q) for p, q in candidates]
+        else:
+            round_results = executor.map(score_candidate, *zip(*[(differenced, p, q) for p, q in candidates]))
+
+        improved = False
+        for p, q, score in round_results:
+            scores[(p, q)] = score
+            if np.isfinite(score) and score < best_score:
+                best_order, best_score, improved = (p, d, q), score, True
+
+        # A whole round without improvement means more complex candidates are dominated
+        if not improved and complexity > 0:
+            break
+
+    return best_order, best_score, len(scores)
+
+# Function to get the file holding the chosen order of a ticker
+def order_file(stock_name):
+    return os.path.join(arima_orders_dir, f"{stock_name}.json")
+
+# Function to load the chosen order of a ticker if it was searched on the same data
+def load_order(stock_name, current_hash):
+    if not os.path.exists(order_file(stock_name)):
+        return None
+    with open(order_file(stock_name)) as f:
+        saved = json.load(f)
+    if saved.get("data_hash") != current_hash or saved.get("criterion") != criterion:
+        return None
+    return tuple(saved["order"])
+
+# Function to save the chosen order of a ticker
+def save_order(stock_name, current_hash, order, score, n_candidates):
+    os.makedirs(arima_orders_dir, exist_ok=True)
+    with open(order_file(stock_name), "w") as f:
+        json.dump({"order": list(order), "criterion": criterion, "score": score,
+                   "candidates_fitted": n_candidates, "data_hash": current_hash}, f, indent=2)
+
+# Function to get the order of a ticker, searching only when its data changed since the last search
+def select_order(stock_name, data, executor=None):
+    current_hash = data_hash(data[['Date', 'Close']])
+    order = load_order(stock_name, current_hash)
+    if order is not None:
+        return order
+
+    start_time = time.perf_counter()
+    order, score, n_candidates = search_order(data['Close'].values, executor, first_difference(stock_name, data))
+    save_order(stock_name, current_hash, order, score, n_candidates)
+    print(f"Selected ARIMA{order} for {stock_name} ({criterion.upper()} {score:.1f}, "
+          f"{n_candidates} candidates, {time.perf_counter() - start_time:.1f}s).")
+    return order
+
+# Function used by the modelling stages to pick the order of a ticker
+def resolve_order(stock_name, data, default_order):
+    if not use_selected_orders:
+        return default_order
+    try:
+        return select_order(stock_name, data)
+    except Exception as e:
+        print(f"Error selecting ARIMA order for {stock_name}, using {default_order}: {e}")
+        return default_order
+
+if __name__ == "__main__":
+    # Search the order of each stock in the selected view, fitting candidates in parallel
+    executor = None
+    if parallel_mode:
+        executor = process_pool(n_workers)
+
+    try:
+        for stock_name in list_tickers(selected_view):
+            try:
+                select_order(stock_name, load_bars(selected_view, stock_name, bar_frequency, columns=["Date", "Close"]), executor)
+            except Exception as e:
+                print(f"Error selecting ARIMA order for {stock_name}: {e}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
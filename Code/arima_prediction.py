@@ -1,63 +1,172 @@
 import os
+import sys
+import time
+from concurrent.futures import as_completed
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.arima.model import ARIMA
-import matplotlib.pyplot as plt
+import ar_fast_path
+from arima_order_search import resolve_order
+from bar_resampler import frequency_name, frequency_option, load_bars, resample_view
+from instrumentation import instrument, timed, write_run_report
+from model_registry import cached_arima_fit
+from prediction_store import write_predictions
+from price_store import list_tickers
+from render_plots import arima_jobs, plots_enabled, render_jobs
+from worker_pool import process_pool
 
 # Directories
-selected_data_dir = "selected_stock_data"
-arima_results_dir = "arima_prediction_results"
+selected_view = "selected"  # Price store view holding the selected stocks
+arima_results_dir = frequency_name("arima_prediction_results", frequency_option())  # "..._5min" for --bars 5min
 os.makedirs(arima_results_dir, exist_ok=True)
 
 # ARIMA Model Parameters
 arima_order = (5, 1, 0)  # (p, d, q) order for ARIMA model
+bar_frequency = frequency_option()  # Bars the model is fitted on, from --bars ("5min", "h", "W" ...); None keeps the stored bars
+
+# Parallel execution parameters
+parallel_mode = True  # Fit each stock in a separate worker process
+n_workers = None  # Number of worker processes (None = one per CPU core)
+run_summary_file = f"{frequency_name('arima_run_summary', bar_frequency)}.csv"
+fast_path_mode = "--fast-path" in sys.argv  # Estimate pure AR orders (q = 0) of all stocks by batched least squares
+
+# Function to save the fitted values of a stock's ARIMA model
+def save_arima_predictions(data, stock_name, fitted_values):
+    ts = data['Close']
+    predictions = pd.Series(fitted_values, index=ts.index)
+    arima_file = os.path.join(arima_results_dir, f"{stock_name}_arima_predictions.csv")
+    with timed("io.write_csv", stock_name):
+        pd.DataFrame({"Date": data['Date'], "Actual": ts, "Predicted": predictions}).to_csv(arima_file, index=False)
+    write_predictions("ARIMA", stock_name, data['Date'], ts, predictions, frequency=bar_frequency)
 
 # Function to apply ARIMA model
+@instrument("arima", profile=True)
 def apply_arima(data, stock_name):
     try:
         # Extract the time series data (e.g., closing prices)
         ts = data['Close']
 
-        # Fit the ARIMA model
-        arima_model = ARIMA(ts, order=arima_order)
-        arima_fit = arima_model.fit()
-
-        # Generate predictions
-        predictions = arima_fit.fittedvalues
+        # Fit the ARIMA model, reusing a stored fit of the same data and order
+        order = resolve_order(stock_name, data, arima_order)
+        arima_fit, fitted_values = cached_arima_fit(stock_name, data, order)
 
         # Save results
-        arima_file = os.path.join(arima_results_dir, f"{stock_name}_arima_predictions.csv")
-        pd.DataFrame({"Date": data['Date'], "Actual": ts, "Predicted": predictions}).to_csv(arima_file, index=False)
+        save_arima_predictions(data, stock_name, fitted_values)
 
         print(f"ARIMA results saved for {stock_name}.")
 
-        # Plot results
-        plt.figure(figsize=(10, 6))
-        plt.plot(data['Date'], ts, label="Actual")
-        plt.plot(data['Date'], predictions, label="Predicted", linestyle="--")
-        plt.title(f"ARIMA Prediction for {stock_name}")
-        plt.xlabel("Date")
-        plt.ylabel("Price")
-        plt.legend()
-        plt.savefig(os.path.join(arima_results_dir, f"{stock_name}_arima_plot.png"))
-        plt.close()
+        return {"Stock": stock_name, "Status": "success", "Rows": len(ts), "Error": ""}
 
     except Exception as e:
         print(f"Error in ARIMA modeling for {stock_name}: {e}")
+        return {"Stock": stock_name, "Status": "error", "Rows": len(data), "Error": str(e)}
 
-# Process each stock in the selected data directory
-for file in os.listdir(selected_data_dir):
-    if file.endswith(".csv"):
-        stock_name = file.replace(".csv", "")
-        file_path = os.path.join(selected_data_dir, file)
+# Function to load one stock and apply the ARIMA model to it
+def process_stock(stock_name):
+    start_time = time.perf_counter()
 
-        try:
-            # Load the data
-            data = pd.read_csv(file_path)
-            data['Date'] = pd.to_datetime(data['Date'])
+    try:
+        # Load the data
+        data = load_bars(selected_view, stock_name, bar_frequency, columns=["Date", "Close"])
+
+        # Apply ARIMA model
+        result = apply_arima(data, stock_name)
+
+    except Exception as e:
+        print(f"Error processing {stock_name}: {e}")
+        result = {"Stock": stock_name, "Status": "error", "Rows": 0, "Error": str(e)}
 
-            # Apply ARIMA model
-            apply_arima(data, stock_name)
+    result["Seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
 
+# Function to fit every stock with a pure AR order in one batched least-squares pass, returning the
+# results of those stocks and the stocks left for the per-stock fits
+def run_fast_path(stock_names):
+    datasets, groups, remaining, results = {}, {}, [], []
+    for stock_name in stock_names:
+        # A stock that cannot be loaded or ordered fails alone, like in the per-stock fits
+        try:
+            data = load_bars(selected_view, stock_name, bar_frequency, columns=["Date", "Close"])
+            order = tuple(resolve_order(stock_name, data, arima_order))
         except Exception as e:
-            print(f"Error processing {file}: {e}")
+            print(f"Error processing {stock_name}: {e}")
+            results.append({"Stock": stock_name, "Status": "error", "Rows": 0, "Error": str(e), "Seconds": np.nan})
+            continue
+        if ar_fast_path.supports(order):
+            datasets[stock_name] = data
+            groups.setdefault(order, []).append(stock_name)
+        else:
+            remaining.append(stock_name)
+
+    fitted = 0
+    for order, names in groups.items():
+        # Each stock's time is its share of its group's batched fit plus saving its own predictions
+        fit_start = time.perf_counter()
+        try:
+            fits = ar_fast_path.fit_stocks({stock_name: datasets[stock_name] for stock_name in names}, order)
+        except Exception as e:
+            # The group's stocks get the per-stock fit instead
+            print(f"Error in ARIMA fast path for ARIMA{order}, fitting its {len(names)} stocks one by one: {e}")
+            remaining.extend(names)
+            continue
+        fit_seconds = (time.perf_counter() - fit_start) / len(names)
+        for stock_name in names:
+            start_time = time.perf_counter()
+            try:
+                save_arima_predictions(datasets[stock_name], stock_name, fits[stock_name][1])
+                result = {"Stock": stock_name, "Status": "success", "Rows": len(datasets[stock_name]), "Error": ""}
+            except Exception as e:
+                print(f"Error in ARIMA fast path for {stock_name}: {e}")
+                result = {"Stock": stock_name, "Status": "error", "Rows": len(datasets[stock_name]), "Error": str(e)}
+            result["Seconds"] = round(fit_seconds + time.perf_counter() - start_time, 3)
+            results.append(result)
+            fitted += 1
+    print(f"ARIMA fast path fitted {fitted} stocks by least squares, {len(remaining)} left for the full fit.")
+    return results, remaining
+
+# Function to run ARIMA for every stock, in worker processes when parallel mode is on
+def run_arima_stage(stock_names, parallel=parallel_mode, max_workers=n_workers):
+    # Bars are resampled once here, so the workers only read them from the cache
+    if bar_frequency:
+        resample_view(selected_view, bar_frequency, stock_names)
+
+    results = []
+    if fast_path_mode:
+        results, stock_names = run_fast_path(stock_names)
+
+    if not parallel:
+        for stock_name in stock_names:
+            results.append(process_stock(stock_name))
+        return results
+
+    if not stock_names:
+        return sorted(results, key=lambda result: result["Stock"])
+
+    # Each worker pins its own BLAS threads when it starts, leaving this process's threads untouched
+    with process_pool(max_workers) as executor:
+        futures = {executor.submit(process_stock, stock_name): stock_name for stock_name in stock_names}
+        for future in as_completed(futures):
+            stock_name = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # A crashed worker only fails its own stock
+                print(f"Error processing {stock_name}: {e}")
+                results.append({"Stock": stock_name, "Status": "error", "Rows": 0,
+                                "Error": str(e), "Seconds": np.nan})
+
+    return sorted(results, key=lambda result: result["Stock"])
+
+if __name__ == "__main__":
+    # Process each stock in the selected view of the price store
+    run_results = run_arima_stage(list_tickers(selected_view))
+
+    # Save one result row per stock
+    summary = pd.DataFrame(run_results, columns=["Stock", "Status", "Rows", "Seconds", "Error"])
+    summary.to_csv(run_summary_file, index=False)
+    failed = summary[summary["Status"] != "success"]
+    print(f"ARIMA stage finished: {len(summary) - len(failed)} succeeded, {len(failed)} failed. Summary saved to {run_summary_file}")
+
+    # Render plots from the saved predictions once all fits are done
+    if plots_enabled():
+        render_jobs(arima_jobs(summary.loc[summary["Status"] == "success", "Stock"]))
+    write_run_report()
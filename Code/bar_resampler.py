@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import threading
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from instrumentation import instrument, timed, write_run_report
+from price_store import list_tickers, load_prices, price_columns, resolve, save_prices, save_view, ticker_path
+
+# Directories
+selected_view = "selected"  # Price store view holding the selected stocks
+holidays_file = "nse_holidays.csv"  # Optional exchange holiday list (one Date column), bars on these days are dropped
+
+# Session Parameters
+session_open = "09:15"  # NSE continuous trading session, intraday bins are anchored at its open
+session_close = "15:30"  # Intraday bars stamped at or after the close (closing session, after-hours ticks) are dropped
+trading_weekdays = [0, 1, 2, 3, 4]  # Monday to Friday
+bars_option = "--bars"  # Command-line option choosing the bar frequency of the modelling stages
+
+# Lock serialising resampling between threads of one process (concurrent pipeline stages)
+resample_lock = threading.Lock()
+
+# Function to read the bar frequency given on the command line after --bars (None keeps the stored bars)
+def frequency_option(argv=None):
+    argv = sys.argv if argv is None else argv
+    return argv[argv.index(bars_option) + 1] if bars_option in argv[:-1] else None
+
+# Function to name an output (directory or file stem) of a bar frequency, so runs at different frequencies never
+# overwrite each other; the outputs of the stored bars keep their plain names
+def frequency_name(name, frequency):
+    return f"{name}_{frequency}" if frequency else name
+
+# Function to get the price store stage caching the bars of one frequency
+def bars_stage(frequency):
+    return f"bars_{frequency}"
+
+# Function to get the file recording which source and settings a ticker's cached bars were built from
+def source_path(frequency, ticker):
+    return f"{ticker_path(bars_stage(frequency), ticker)[:-len('.arrow')]}.source.json"
+
+# Function to load the exchange holidays as day timestamps (int64 nanoseconds)
+def load_holidays():
+    if not os.path.exists(holidays_file):
+        return np.array([], dtype=np.int64)
+    holidays = pd.to_datetime(pd.read_csv(holidays_file)["Date"]).dt.normalize()
+    return np.unique(holidays.values.astype("datetime64[ns]").astype(np.int64))
+
+# Function to keep the rows traded in a session: trading weekdays that are not holidays and,
+# for intraday bars, stamps between the open and the close
+def session_mask(dates, holidays):
+    stamps = dates.astype("datetime64[ns]").astype(np.int64)
+    day_ns = pd.Timedelta(days=1).value
+    days = stamps - stamps % day_ns
+    weekdays = (days // day_ns + 3) % 7  # 1970-01-01 was a Thursday
+    mask = np.isin(weekdays, trading_weekdays) & ~np.isin(days, holidays)
+
+    # Daily bars are stamped at midnight and carry no time of day to check
+    time_of_day = stamps - days
+    if time_of_day.any():
+        open_ns, close_ns = pd.Timedelta(f"{session_open}:00").value, pd.Timedelta(f"{session_close}:00").value
+        mask &= (time_of_day >= open_ns) & (time_of_day < close_ns)
+    return mask
+
+# Function to compute the bin of every (sorted, in-session) row and its label:
+# intraday bins are anchored at the session open of each day, daily bins count sessions,
+# longer bins follow the calendar period and are labelled with their first session
+def bin_keys(dates, frequency):
+    stamps = dates.astype("datetime64[ns]").astype(np.int64)
+    day_ns = pd.Timedelta(days=1).value
+    days = stamps - stamps % day_ns
+    offset = to_offset(frequency)
+
+    if isinstance(offset, pd.offsets.Tick) and offset.nanos < day_ns:
+        # Bars can only be made coarser: daily bars carry no time of day, and finer bins would get made-up stamps
+        spacing = np.diff(stamps)
+        spacing = spacing[spacing > 0]
+        if not (stamps - days).any():
+            raise ValueError(f"Bar frequency {frequency} is finer than the source bars (daily)")
+        if len(spacing) and offset.nanos < spacing.min():
+            raise ValueError(f"Bar frequency {frequency} is finer than the source bars ({pd.Timedelta(int(spacing.min()))})")
+        open_ns = pd.Timedelta(f"{session_open}:00").value
+        labels = days + open_ns + (stamps - days - open_ns) // offset.nanos * offset.nanos
+        return labels, labels
+    if isinstance(offset, (pd.offsets.Day, pd.offsets.BusinessDay)):
+        sessions = np.cumsum(np.concatenate([[0], days[1:] != days[:-1]]))
+        keys = sessions // offset.n
+    else:
+        try:
+            keys = pd.DatetimeIndex(days).to_period(offset).asi8
+        except Exception:
+            raise ValueError(f"Unsupported bar frequency {frequency}: "
+                             "use intraday (5min, h), daily (D) or calendar period (W, ME, QE) bars")
+    return keys, days
+
+# Function to aggregate OHLCV bars to a coarser frequency in one vectorized pass:
+# first open, highest high, lowest low, last close and summed volume of the in-session rows of each bin
+def resample_ohlcv(data, frequency, holidays=None):
+    holidays = load_holidays() if holidays is None else holidays
+    if not data['Date'].is_monotonic_increasing:
+        data = data.sort_values('Date', kind="stable")
+    dates = data['Date'].values
+    mask = session_mask(dates, holidays)
+    if not mask.any():
+        return data.iloc[:0][price_columns]
+    keys, labels = bin_keys(dates[mask], frequency)
+
+    # Rows are sorted, so each bin is a run of equal keys
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    ends = np.append(starts[1:], len(keys))
+    column = lambda name: data[name].to_numpy(dtype=float)[mask]
+    return pd.DataFrame({
+        "Date": pd.to_datetime(labels[starts]),
+        "Close": column("Close")[ends - 1],
+        "High": np.maximum.reduceat(column("High"), starts),
+        "Low": np.minimum.reduceat(column("Low"), starts),
+        "Open": column("Open")[starts],
+        "Volume": np.add.reduceat(column("Volume"), starts),
+    })
+
+# Function to describe the source file and session settings a ticker's bars are built from
+def source_signature(view, ticker, frequency):
+    stage, _ = resolve(view)
+    source = ticker_path(stage, ticker)
+    status = os.stat(source)
+    return {"source": source, "size": status.st_size, "mtime_ns": status.st_mtime_ns, "frequency": frequency,
+            "session": [session_open, session_close], "weekdays": trading_weekdays,
+            "holidays": load_holidays().tolist()}
+
+# Function to bring one ticker's bars of a frequency up to date, resampling only when its source or settings changed.
+# Returns True when the bars were rebuilt.
+def ensure_bars(view, ticker, frequency):
+    with resample_lock:
+        signature = source_signature(view, ticker, frequency)
+        path = source_path(frequency, ticker)
+        if os.path.exists(path) and os.path.exists(ticker_path(bars_stage(frequency), ticker)):
+            with open(path) as f:
+                if json.load(f) == signature:
+                    return False
+
+        with timed("resample.ticker", ticker):
+            bars = resample_ohlcv(load_prices(view, ticker), frequency, np.array(signature["holidays"], dtype=np.int64))
+            save_prices(bars_stage(frequency), ticker, bars)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(signature, f)
+        os.replace(f"{path}.tmp", path)
+        return True
+
+# Function to load one ticker's prices at a bar frequency, from the bar cache (None loads the stored bars as they are)
+def load_bars(view, ticker, frequency=None, columns=None):
+    if frequency is None:
+        return load_prices(view, ticker, columns=columns)
+    ensure_bars(view, ticker, frequency)
+    return load_prices(bars_stage(frequency), ticker, columns=columns)
+
+# Function to bring the bars of many tickers of a view up to date and save them as the view "<view>_<frequency>"
+@instrument("resample")
+def resample_view(view, frequency, tickers=None):
+    tickers = list_tickers(view) if tickers is None else tickers
+    rebuilt = 0
+    for ticker in tickers:
+        try:
+            rebuilt += ensure_bars(view, ticker, frequency)
+        except Exception as e:
+            print(f"Error resampling {ticker} to {frequency}: {e}")
+    save_view(f"{view}_{frequency}", bars_stage(frequency), tickers)
+    return rebuilt
+
+if __name__ == "__main__":
+    # Usage: python bar_resampler.py <frequency> [frequency ...] : cache the bars of the selected stocks
+    for frequency in [arg for arg in sys.argv[1:] if not arg.startswith("--")] or ["D"]:
+        tickers = list_tickers(selected_view)
+        rebuilt = resample_view(selected_view, frequency, tickers)
+        print(f"{frequency} bars of {len(tickers)} stocks saved to the {selected_view}_{frequency} view "
+              f"({rebuilt} resampled, {len(tickers) - rebuilt} cached).")
+    write_run_report()
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+import pandas as pd
+
+# Directories
+code_dir = os.path.dirname(os.path.abspath(__file__))
+benchmark_dir = os.path.abspath("benchmarks")
+benchmark_results_file = os.path.join(benchmark_dir, "benchmark_results.csv")  # Appended once per stage, scale and run
+stage_results_file = "benchmark_stages.json"  # Written by each scale's run inside its working directory
+
+# Benchmark Parameters
+scales = [25, 500, 5000]  # Universe sizes, in tickers
+benchmark_bars = 1250  # Bars of history per ticker (about five years of trading days)
+benchmark_frequency = "B"
+lstm_sample_tickers = 25  # LSTM training and the Hybrid model run on this many tickers at every scale
+lstm_epochs = 2  # Training epochs of the benchmarked LSTM
+regression_tolerance = 0.2  # Slowdown against the previous run of the same configuration reported as a regression
+regression_min_seconds = 0.5  # Slowdowns smaller than this are timer noise, not regressions
+stage_order = ["generate", "clean", "shortlist", "arima", "lstm_windowing", "lstm_training", "hybrid", "evaluation",
+               "hypothesis"]
+
+# Function to run every stage on one synthetic universe, in the current directory
+def run_scale(n_tickers, bars, frequency):
+    from instrumentation import enable_instrumentation, load_records, timed
+    import clean_data_nse
+    import hypothesis_code
+    import lstm_hybrid_analysis_modified as lstm
+    import performance_matrix
+    from arima_prediction import run_arima_stage
+    from price_store import list_tickers, load_prices
+    from shortlist_stock_data_nse import filter_selected_stocks
+    from synthetic_prices import write_universe
+    from window_batches import WindowBatches
+
+    enable_instrumentation()
+    lstm.epochs = lstm_epochs
+    tickers_run = {}
+
+    with timed("bench.generate"):
+        tickers = write_universe(n_tickers, bars, frequency)
+    tickers_run["generate"] = len(tickers)
+
+    with timed("bench.clean"):
+        for ticker in clean_data_nse.list_raw_tickers():
+            clean_data_nse.clean_and_preprocess(ticker)
+    tickers_run["clean"] = len(tickers)
+
+    with timed("bench.shortlist"):
+        filter_selected_stocks(list_tickers(clean_data_nse.clean_stage), tickers)
+    tickers_run["shortlist"] = len(tickers)
+
+    with timed("bench.arima"):
+        run_arima_stage(tickers)
+    tickers_run["arima"] = len(tickers)
+
+    # Windowing covers every ticker: build the windows and gather one epoch of shuffled batches
+    with timed("bench.lstm_windowing"):
+        for ticker in tickers:
+            close = load_prices("selected", ticker, columns=["Close"])["Close"].to_numpy()
+            X, Y = lstm.create_dataset((close - close.min()) / (close.max() - close.min()), lstm.look_back)
+            batches = WindowBatches(X, Y, lstm.batch_size)
+            for index in range(len(batches)):
+                batches[index]
+    tickers_run["lstm_windowing"] = len(tickers)
+
+    sample = tickers[:lstm_sample_tickers]
+    datasets = {ticker: load_prices("selected", ticker) for ticker in sample}
+    with timed("bench.lstm_training"):
+        for ticker, data in datasets.items():
+            lstm.train_lstm(data, ticker)
+    tickers_run["lstm_training"] = len(sample)
+
+    with timed("bench.hybrid"):
+        for ticker, data in datasets.items():
+            lstm.apply_lstm(data, ticker)
+            lstm.apply_hybrid(data, ticker)
+    tickers_run["hybrid"] = len(sample)
+
+    with timed("bench.evaluation"):
+        performance_matrix.evaluate_results()
+    tickers_run["evaluation"] = len(tickers)
+
+    # The t-tests on the metrics table and the paired per-ticker tests (Diebold-Mariano, block bootstrap, permutation)
+    with timed("bench.hypothesis"):
+        hypothesis_code.run_hypothesis_tests()
+        hypothesis_code.run_forecast_comparison()
+    tickers_run["hypothesis"] = len(tickers)
+
+    # Keep only the stage timers, the nested per-ticker records stay in this run's report
+    records = load_records()
+    records = records[records["Stage"].str.startswith("bench.")].assign(Stage=lambda frame: frame["Stage"].str[6:])
+    records = records.assign(Tickers=records["Stage"].map(tickers_run))
+    with open(stage_results_file, "w") as f:
+        json.dump(json.loads(records[["Stage", "Tickers", "Wall_s", "CPU_s", "Peak_RSS_MB"]].to_json(orient="records")), f)
+
+# Function to get the commit the benchmark runs on, if the code is in a git checkout
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=code_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+# Function to benchmark one scale in a fresh working directory and a fresh process
+def benchmark_scale(n_tickers, bars=benchmark_bars, frequency=benchmark_frequency):
+    work_dir = os.path.join(benchmark_dir, "work", f"{n_tickers}-{bars}-{frequency}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+
+    env = dict(os.environ, NO_PLOTS="1", RUN_REPORT_ID=f"benchmark-{n_tickers}")
+    command = [sys.executable, os.path.abspath(__file__), "--run-scale", str(n_tickers), str(bars), frequency]
+    with open(os.path.join(work_dir, "benchmark.log"), "w") as log:
+        subprocess.run(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT, check=True)
+
+    with open(os.path.join(work_dir, stage_results_file)) as f:
+        stages = pd.DataFrame(json.load(f))
+    return stages.assign(Scale=n_tickers, Bars=bars, Frequency=frequency)
+
+# Function to compare a run against the latest earlier run of the same configuration
+def compare_with_previous(results):
+    keys = ["Scale", "Bars", "Frequency", "Stage"]
+    if not os.path.exists(benchmark_results_file):
+        return results.assign(Previous_Wall_s=float("nan"), Regression=False)
+    history = pd.read_csv(benchmark_results_file)
+    previous = history.sort_values("Run").groupby(keys, as_index=False).last()[keys + ["Wall_s"]]
+    results = results.merge(previous.rename(columns={"Wall_s": "Previous_Wall_s"}), on=keys, how="left")
+    slowdown = results["Wall_s"] - results["Previous_Wall_s"]
+    return results.assign(Regression=(results["Wall_s"] > results["Previous_Wall_s"] * (1 + regression_tolerance))
+                          & (slowdown > regression_min_seconds))
+
+# Function to benchmark every scale and store the results for later comparison
+def run_benchmarks(scale_list=scales, bars=benchmark_bars, frequency=benchmark_frequency):
+    os.makedirs(benchmark_dir, exist_ok=True)
+    run, commit = time.strftime("%Y-%m-%d %H:%M:%S"), current_commit()
+    frames = []
+    for n_tickers in scale_list:
+        try:
+            print(f"Benchmarking {n_tickers} tickers...")
+            frames.append(benchmark_scale(n_tickers, bars, frequency))
+        except Exception as e:
+            print(f"Error benchmarking {n_tickers} tickers: {e}")
+    if not frames:
+        return pd.DataFrame()
+
+    results = pd.concat(frames, ignore_index=True)
+    results["Stage"] = pd.Categorical(results["Stage"], stage_order, ordered=True)
+    results = results.sort_values(["Scale", "Stage"]).assign(Stage=lambda frame: frame["Stage"].astype(str))
+    results["Per_Ticker_ms"] = (results["Wall_s"] / results["Tickers"] * 1000).round(3)
+    results = compare_with_previous(results.assign(Run=run, Commit=commit))
+
+    columns = ["Run", "Commit", "Scale", "Bars", "Frequency", "Stage", "Tickers", "Wall_s", "CPU_s", "Peak_RSS_MB",
+               "Per_Ticker_ms"]
+    results[columns].to_csv(benchmark_results_file, mode="a", header=not os.path.exists(benchmark_results_file), index=False)
+    print(results[columns[2:] + ["Previous_Wall_s", "Regression"]].to_string(index=False))
+    for _, row in results[results["Regression"]].iterrows():
+        print(f"Regression in {row['Stage']} at {row['Scale']} tickers: {row['Previous_Wall_s']:.2f}s -> {row['Wall_s']:.2f}s")
+    print(f"Benchmark results saved to {benchmark_results_file}")
+    return results
+
+if __name__ == "__main__":
+    # Usage: python benchmark_suite.py [scale ...] [--bars N] [--frequency F]
+    args = sys.argv[1:]
+    if args and args[0] == "--run-scale":
+        run_scale(int(args[1]), int(args[2]), args[3])
+    else:
+        bars = int(args[args.index("--bars") + 1]) if "--bars" in args else benchmark_bars
+        frequency = args[args.index("--frequency") + 1] if "--frequency" in args else benchmark_frequency
+        values = [arg for index, arg in enumerate(args) if not arg.startswith("--") and
+                  (index == 0 or args[index - 1] not in ("--bars", "--frequency"))]
+        run_benchmarks([int(value) for value in values] or scales, bars, frequency)
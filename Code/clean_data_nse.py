@@ -1,47 +1,147 @@
 import os
+import sys
+import csv
 import pandas as pd
+import pyarrow.feather as feather
+from instrumentation import instrument, write_run_report
+from price_store import PriceWriter, has_prices, iter_batches, list_tickers, load_prices, save_prices, ticker_path
 
 # Directories
-raw_data_dir = "stock_data"
-clean_data_dir = "clean_stock_data"
-os.makedirs(clean_data_dir, exist_ok=True)
+raw_data_dir = "stock_data"  # Legacy raw CSV files, used for tickers missing from the price store
 
-# Function to clean and preprocess stock data
-def clean_and_preprocess(file_name):
+# Price store stages
+raw_stage = "raw"
+clean_stage = "clean"
+
+# Cleaning Parameters
+required_columns = ["Date", "Open", "High", "Low", "Close", "Volume"]
+raw_dtypes = {"Date": "string", "Open": "float64", "High": "float64", "Low": "float64", "Close": "float64",
+              "Volume": "float64"}  # Volume is read as float so gaps stay NaN, the store rounds it back to int64
+chunk_rows = 250_000  # Rows of a raw file cleaned at a time, bounding memory for large intraday files
+market_timezone = "Asia/Kolkata"  # Timezone-aware (intraday) dates are stored as naive exchange-local times
+incremental_mode = "--incremental" in sys.argv  # Clean only the raw rows newer than the last cleaned date
+
+# Function to list tickers in the raw price store and any legacy raw CSV files
+def list_raw_tickers():
+    tickers = set(list_tickers(raw_stage))
+    if os.path.isdir(raw_data_dir):
+        tickers.update(file.replace(".csv", "") for file in os.listdir(raw_data_dir) if file.endswith(".csv"))
+    return sorted(tickers)
+
+# Function to check whether a CSV field holds a number
+def is_number(value):
     try:
-        # Load raw data
-        file_path = os.path.join(raw_data_dir, file_name)
-        data = pd.read_csv(file_path)
+        float(value)
+        return True
+    except ValueError:
+        return False
 
-        # Check if required columns exist
-        required_columns = ["Date", "Open", "High", "Low", "Close", "Volume"]
-        if not all(column in data.columns for column in required_columns):
-            print(f"Skipping {file_name}: Missing required columns.")
-            return
+# Function to find the header of a legacy raw CSV file: yfinance writes extra header rows of ticker names
+# (",INFY.NS,INFY.NS,...") and sometimes a "Date,,,," row under a "Price,..." header, which are skipped
+def csv_header(path, max_header_rows=3):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        skip_rows = []
+        for index, row in enumerate(reader, start=1):
+            if index > max_header_rows or not row:
+                break
+            values = [value for value in row[1:] if value != ""]
+            if values and all(is_number(value) for value in values):
+                break  # First data row
+            skip_rows.append(index)
+            if row[0] == "Date":
+                columns = ["Date"] + columns[1:]
+    return columns, skip_rows
+
+# Function to read the raw data of a ticker in chunks of required columns, from the price store or a legacy CSV file
+def read_raw_chunks(ticker):
+    if has_prices(raw_stage, ticker):
+        for batch in iter_batches(raw_stage, ticker, required_columns):
+            yield batch.to_pandas()
+        return
 
-        # Drop rows with missing values
-        data.dropna(inplace=True)
+    path = os.path.join(raw_data_dir, f"{ticker}.csv")
+    columns, skip_rows = csv_header(path)
+    yield from pd.read_csv(path, header=None, names=columns, skiprows=[0] + skip_rows, usecols=required_columns,
+                           dtype={column: raw_dtypes[column] for column in required_columns}, chunksize=chunk_rows)
 
-        # Ensure 'Date' column is in datetime format
-        data['Date'] = pd.to_datetime(data['Date'], errors='coerce')
+# Function to check that a ticker's raw data has the required columns
+def has_required_columns(ticker):
+    if has_prices(raw_stage, ticker):
+        columns = next(iter_batches(raw_stage, ticker)).schema.names
+    else:
+        columns = csv_header(os.path.join(raw_data_dir, f"{ticker}.csv"))[0]
+    return all(column in columns for column in required_columns)
+
+# Function to clean one chunk: drop incomplete rows and invalid dates, then sort and dedupe it by date
+def clean_chunk(chunk):
+    chunk = chunk[required_columns].dropna()
+    dates = pd.to_datetime(chunk['Date'], errors='coerce')
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_convert(market_timezone).dt.tz_localize(None)
+    chunk = chunk.assign(Date=dates).dropna(subset=['Date'])
+    # A stable sort keeps the later of two rows with the same date last, and that one is kept
+    chunk = chunk.sort_values(by='Date', kind='stable')
+    return chunk.drop_duplicates(subset='Date', keep='last')
+
+# Function to get the last cleaned date of a ticker, or None if it was never cleaned
+def last_clean_date(ticker):
+    if not has_prices(clean_stage, ticker):
+        return None
+    dates = feather.read_table(ticker_path(clean_stage, ticker), columns=["Date"], memory_map=True)["Date"]
+    return pd.Timestamp(dates[-1].as_py()) if len(dates) else None
+
+# Function to clean and preprocess stock data, streaming the raw file through in sorted, deduped chunks.
+# Rows arriving out of date order are set aside and merged in at the end, the only step holding all rows.
+@instrument("clean", ticker_arg="ticker")
+def clean_and_preprocess(ticker, incremental=None):
+    incremental = incremental_mode if incremental is None else incremental
+    try:
+        # Check if required columns exist
+        if not has_required_columns(ticker):
+            print(f"Skipping {ticker}: Missing required columns.")
+            return
 
-        # Remove rows with invalid dates
-        data.dropna(subset=['Date'], inplace=True)
+        # In incremental mode the cleaned rows are copied over and only newer raw rows are cleaned after them
+        cutoff = last_clean_date(ticker) if incremental else None
+        late_chunks, new_rows = [], 0
+        with PriceWriter(clean_stage, ticker) as writer:
+            if cutoff is not None:
+                for batch in iter_batches(clean_stage, ticker):
+                    writer.write(batch.to_pandas())
+            last_date = cutoff
+            for chunk in read_raw_chunks(ticker):
+                chunk = clean_chunk(chunk)
+                if cutoff is not None:
+                    chunk = chunk[chunk['Date'] > cutoff]
+                new_rows += len(chunk)
 
-        # Sort data by date
-        data.sort_values(by='Date', inplace=True)
+                # Rows not after the last written date are kept aside (in memory, they are rare in raw files)
+                if last_date is not None:
+                    late = chunk['Date'] <= last_date
+                    if late.any():
+                        late_chunks.append(chunk[late])
+                        chunk = chunk[~late]
+                writer.write(chunk)
+                if len(chunk):
+                    last_date = chunk['Date'].iloc[-1]
 
-        # Reset index after cleaning
-        data.reset_index(drop=True, inplace=True)
+        # Rows out of date order (or repeating a date already written) are merged into the sorted rows
+        if late_chunks:
+            data = pd.concat([load_prices(clean_stage, ticker)] + late_chunks, ignore_index=True)
+            data = data.sort_values(by='Date', kind='stable').drop_duplicates(subset='Date', keep='last')
+            save_prices(clean_stage, ticker, data.reset_index(drop=True))
+            print(f"Merged {sum(len(chunk) for chunk in late_chunks)} out-of-order rows for {ticker}.")
 
-        # Save cleaned data to new folder
-        clean_file_path = os.path.join(clean_data_dir, file_name)
-        data.to_csv(clean_file_path, index=False)
-        print(f"Cleaned data for {file_name} saved to {clean_file_path}.")
+        if cutoff is not None:
+            print(f"Cleaned {new_rows} new rows for {ticker} after {cutoff}.")
+        print(f"Cleaned data for {ticker} saved to {ticker_path(clean_stage, ticker)}.")
     except Exception as e:
-        print(f"Error cleaning {file_name}: {e}")
+        print(f"Error cleaning {ticker}: {e}")
 
-# Process all CSV files in the raw data directory
-for file in os.listdir(raw_data_dir):
-    if file.endswith(".csv"):
-        clean_and_preprocess(file)
+if __name__ == "__main__":
+    # Process every ticker in the raw price store and any legacy raw CSV files
+    for ticker in list_raw_tickers():
+        clean_and_preprocess(ticker)
+    write_run_report()
@@ -0,0 +1,66 @@
+import os
+import sys
+import runpy
+import importlib
+
+# Subcommands: the script each one runs and a short description.
+# Only the chosen script is imported, so its backends (TensorFlow, statsmodels, matplotlib)
+# are loaded by the subcommands that need them and by no other.
+subcommands = {
+    "fetch": ("fetch_data_nse_bse", "Download new price history into the price store"),
+    "select": ("select_stock_data_nse", "Select the stocks with the largest market capitalisation per sector"),
+    "sort": ("sort_stock_data_nse", "Sort the NSE stocks by market capitalisation"),
+    "clean": ("clean_data_nse", "Clean the raw prices into the clean stage"),
+    "metadata": ("metadata_index", "Refresh the metadata index and list the tickers a selection query picks"),
+    "shortlist": ("shortlist_stock_data_nse", "Save the stocks a selection query picks as the selected view"),
+    "resample": ("bar_resampler", "Cache the selected stocks' bars at other frequencies (5min, h, D, W ...)"),
+    "features": ("feature_engine", "Compute the rolling, return and scaling features of the selected stocks"),
+    "order-search": ("arima_order_search", "Search the ARIMA order of each selected stock"),
+    "arima": ("arima_prediction", "Fit ARIMA and save its predictions"),
+    "ar-validate": ("ar_fast_path", "Compare the least-squares AR fast path with statsmodels' ARIMA fits"),
+    "eda": ("eda_arima_analysis", "Run the EDA and ARIMA fit analysis"),
+    "lstm": ("lstm_hybrid_analysis_modified", "Train the LSTM and Hybrid models"),
+    "numpy-check": ("numpy_lstm", "Check the NumPy LSTM forward pass against the stored Keras models"),
+    "walk-forward": ("walk_forward_backtest", "Run the walk-forward ARIMA backtest"),
+    "metrics": ("performance_matrix", "Evaluate the predictions of every model"),
+    "predictions": ("prediction_store", "Summarise the prediction store, importing the prediction CSV files with --import"),
+    "plots": ("plot_code", "Show the combined metrics and plot them"),
+    "hypothesis": ("hypothesis_code", "Run the hypothesis tests"),
+    "render": ("render_plots", "Render the plots of the given stages"),
+    "pipeline": ("pipeline", "Run every stage whose inputs changed"),
+    "serve": ("forecast_server", "Serve next-close forecasts from warm models over HTTP"),
+    "synthetic": ("synthetic_prices", "Write a synthetic price universe into the raw stage"),
+    "benchmark": ("benchmark_suite", "Benchmark every stage on synthetic universes of several sizes"),
+}
+import_only_flag = "--import-only"  # Import the subcommand's script without running it (used by startup_benchmark.py)
+instrument_flag = "--instrument"  # Write timing records and a run report of the subcommand
+
+# Function to print the available subcommands
+def print_usage():
+    print(f"Usage: python cli.py <subcommand> [args ...] [{instrument_flag}]\n\nSubcommands:")
+    for name, (_, description) in subcommands.items():
+        print(f"  {name:<14}{description}")
+
+# Function to run one subcommand with the remaining command-line arguments
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help") or argv[0] not in subcommands:
+        print_usage()
+        return 0 if argv and argv[0] in ("-h", "--help") else 1
+
+    module_name = subcommands[argv[0]][0]
+    # Instrumentation is switched on through the environment, so the script and the processes it starts all see it
+    if instrument_flag in argv:
+        argv = [arg for arg in argv if arg != instrument_flag]
+        os.environ["INSTRUMENT"] = "1"
+    if import_only_flag in argv:
+        importlib.import_module(module_name)
+        return 0
+
+    # The script sees its own name followed by the subcommand's arguments, as if run directly
+    sys.argv = [f"{module_name}.py"] + argv[1:]
+    runpy.run_module(module_name, run_name="__main__", alter_sys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
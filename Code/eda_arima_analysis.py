@@ -1,96 +1,65 @@
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-from statsmodels.tsa.arima.model import ARIMA
+from arima_order_search import resolve_order
+from bar_resampler import frequency_name, frequency_option, load_bars
+from instrumentation import instrument, timed, write_run_report
+from model_registry import cached_arima_fit
+from price_store import list_tickers
+from render_plots import eda_jobs, plots_enabled, render_jobs
 import warnings
 
 # Directories
-selected_data_dir = "selected_stock_data"
-eda_results_dir = "eda_results"
-arima_results_dir = "arima_results"
+selected_view = "selected"  # Price store view holding the selected stocks
+eda_results_dir = frequency_name("eda_results", frequency_option())
+arima_results_dir = frequency_name("arima_results", frequency_option())
 os.makedirs(eda_results_dir, exist_ok=True)
 os.makedirs(arima_results_dir, exist_ok=True)
 
-warnings.filterwarnings("ignore")
-
-# Function to perform EDA and save visualizations
-def perform_eda(data, stock_name):
-    try:
-        # Plot closing price trends
-        plt.figure(figsize=(12, 6))
-        plt.plot(data['Date'], data['Close'], label='Closing Price', color='blue')
-        plt.title(f"Closing Price Trend for {stock_name}")
-        plt.xlabel("Date")
-        plt.ylabel("Closing Price")
-        plt.legend()
-        plt.grid()
-        plt.savefig(os.path.join(eda_results_dir, f"{stock_name}_trend.png"))
-        plt.close()
-
-        # Plot rolling mean for smoothing trends
-        rolling_mean = data['Close'].rolling(window=30).mean()
-        plt.figure(figsize=(12, 6))
-        plt.plot(data['Date'], data['Close'], label='Closing Price', color='blue')
-        plt.plot(data['Date'], rolling_mean, label='30-Day Rolling Mean', color='orange')
-        plt.title(f"Rolling Mean for {stock_name}")
-        plt.xlabel("Date")
-        plt.ylabel("Closing Price")
-        plt.legend()
-        plt.grid()
-        plt.savefig(os.path.join(eda_results_dir, f"{stock_name}_rolling_mean.png"))
-        plt.close()
+# Bar Parameters
+bar_frequency = frequency_option()  # Bars the EDA and ARIMA fits run on, from --bars; None keeps the stored bars
 
-        print(f"EDA visualizations saved for {stock_name}.")
-    except Exception as e:
-        print(f"Error in EDA for {stock_name}: {e}")
+warnings.filterwarnings("ignore")
 
 # Function to apply ARIMA and save results
+@instrument("eda_arima", profile=True)
 def apply_arima(data, stock_name):
     try:
         # ARIMA modeling requires the 'Close' column as a time series
         ts = data['Close']
 
-        # Fit ARIMA model
-        model = ARIMA(ts, order=(5, 1, 0))  # (p, d, q) parameters
-        model_fit = model.fit()
+        # Fit ARIMA model, reusing a stored fit of the same data and order
+        order = resolve_order(stock_name, data, (5, 1, 0))  # (p, d, q) parameters
+        model_fit, fitted_values = cached_arima_fit(stock_name, data, order)
 
         # Save model summary
         summary_file = os.path.join(arima_results_dir, f"{stock_name}_arima_summary.txt")
-        with open(summary_file, 'w') as f:
+        with timed("io.write_summary", stock_name), open(summary_file, 'w') as f:
             f.write(model_fit.summary().as_text())
 
-        # Plot actual vs fitted values
-        plt.figure(figsize=(12, 6))
-        plt.plot(ts, label='Actual', color='blue')
-        plt.plot(model_fit.fittedvalues, label='Fitted', color='red')
-        plt.title(f"ARIMA Model Fit for {stock_name}")
-        plt.xlabel("Date")
-        plt.ylabel("Closing Price")
-        plt.legend()
-        plt.grid()
-        plt.savefig(os.path.join(arima_results_dir, f"{stock_name}_arima_fit.png"))
-        plt.close()
+        # Save actual vs fitted values for the fit plot
+        fit_file = os.path.join(arima_results_dir, f"{stock_name}_arima_fit.csv")
+        with timed("io.write_csv", stock_name):
+            pd.DataFrame({"Date": data['Date'], "Actual": ts, "Fitted": fitted_values}).to_csv(fit_file, index=False)
 
         print(f"ARIMA results saved for {stock_name}.")
     except Exception as e:
         print(f"Error in ARIMA modeling for {stock_name}: {e}")
 
-# Process each stock in the selected data directory
-for file in os.listdir(selected_data_dir):
-    if file.endswith(".csv"):
-        stock_name = file.replace(".csv", "")
-        file_path = os.path.join(selected_data_dir, file)
-        
+if __name__ == "__main__":
+    # Process each stock in the selected view of the price store
+    stock_names = list_tickers(selected_view)
+    for stock_name in stock_names:
         try:
             # Load the data
-            data = pd.read_csv(file_path)
-            data['Date'] = pd.to_datetime(data['Date'])
-
-            # Perform EDA
-            perform_eda(data, stock_name)
+            data = load_bars(selected_view, stock_name, bar_frequency)
 
             # Apply ARIMA
             apply_arima(data, stock_name)
 
         except Exception as e:
-            print(f"Error processing {file}: {e}")
\ No newline at end of file
+            print(f"Error processing {stock_name}: {e}")
+
+    # Render the EDA and ARIMA fit plots once all fits are done
+    if plots_enabled():
+        render_jobs(eda_jobs(stock_names))
+    write_run_report()
@@ -0,0 +1,208 @@
+import os
+import json
+import glob
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from bar_resampler import frequency_name, frequency_option, load_bars
+from instrumentation import instrument, write_run_report
+from price_store import data_hash, list_tickers
+
+# Directories
+selected_view = "selected"  # Price store view holding the selected stocks
+# One store per bar frequency, with one directory per ticker holding its feature parts and metadata
+feature_store_dir = frequency_name("feature_store", frequency_option())
+
+# Feature Parameters
+feature_windows = [5, 20, 30, 60]  # Windows of the rolling means (of the close) and volatilities (of the log returns)
+panel_chunk_size = 500  # Tickers per (position x ticker) panel, bounding the memory of one vectorized pass
+max_parts = 16  # Appended parts of a ticker merged back into one file beyond this many
+
+# Lock serialising feature updates between threads of one process (concurrent pipeline stages)
+update_lock = threading.Lock()
+
+# Function to list the feature columns computed for the given windows
+def feature_columns(windows=None):
+    windows = feature_windows if windows is None else windows
+    columns = ["Date", "Close", "Log_Return", "Diff_1"]
+    for window in windows:
+        columns += [f"Rolling_Mean_{window}", f"Volatility_{window}"]
+    return columns
+
+# Function to get the directory holding one ticker's features
+def ticker_dir(ticker):
+    return os.path.join(feature_store_dir, ticker)
+
+# Function to get the metadata file of one ticker's features
+def meta_path(ticker):
+    return os.path.join(ticker_dir(ticker), "meta.json")
+
+# Function to get the file of one part of a ticker's features
+def part_path(ticker, index):
+    return os.path.join(ticker_dir(ticker), f"part-{index:05d}.arrow")
+
+# Function to load the metadata of a ticker's features, or None if it has none
+def load_meta(ticker):
+    if not os.path.exists(meta_path(ticker)):
+        return None
+    with open(meta_path(ticker)) as f:
+        return json.load(f)
+
+# Function to save the metadata of a ticker's features
+def save_meta(ticker, meta):
+    tmp_path = f"{meta_path(ticker)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path(ticker))
+
+# Function to save one part of a ticker's features
+def save_part(ticker, index, features):
+    os.makedirs(ticker_dir(ticker), exist_ok=True)
+    table = pa.Table.from_pandas(features, preserve_index=False).replace_schema_metadata(None)
+    tmp_path = f"{part_path(ticker, index)}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, part_path(ticker, index))
+
+# Function to load one ticker's features from all of its parts
+def load_features(ticker, columns=None):
+    meta = load_meta(ticker)
+    if meta is None:
+        raise FileNotFoundError(f"No features stored for {ticker}")
+    tables = [feather.read_table(part_path(ticker, index), columns=columns, memory_map=True)
+              for index in range(meta["parts"])]
+    return pa.concat_tables(tables).to_pandas(split_blocks=True)
+
+# Function to decide how a ticker's features are brought up to date:
+# "cached" when its data is unchanged, "extended" when bars were only appended, otherwise "computed"
+def plan_update(ticker, data, windows, current_hash):
+    meta = load_meta(ticker)
+    if meta is None or meta["windows"] != windows or not all(
+            os.path.exists(part_path(ticker, index)) for index in range(meta["parts"])):
+        return "computed", meta
+    if meta["data_hash"] == current_hash:
+        return "cached", meta
+
+    # Appended bars leave the stored rows untouched: the last stored bar and the tail the windows need must match
+    rows, tail = meta["rows"], np.array(meta["tail_close"], dtype=float)
+    if len(data) > rows and str(data['Date'].iloc[rows - 1]) == meta["last_date"] and np.array_equal(
+            data['Close'].values[rows - len(tail):rows].astype(float), tail):
+        return "extended", meta
+    return "computed", meta
+
+# Function to compute the features of many tickers in one vectorized pass over a (position x ticker) panel.
+# Each series is its context (stored tail, only read by the windows) followed by the rows to compute.
+def panel_features(contexts, series, windows):
+    lengths = np.array([len(context) + len(values) for context, values in zip(contexts, series)])
+    filled = np.arange(lengths.max(initial=0)) < lengths[:, np.newaxis]
+    close = np.full(filled.shape, np.nan)
+    close[filled] = np.concatenate([np.concatenate([context, values]) for context, values in zip(contexts, series)])
+    close = pd.DataFrame(close.T)
+
+    # Shorter series are padded after their end, so the padding never enters a window of real rows
+    log_return = np.log(close).diff()
+    panels = {"Close": close, "Log_Return": log_return, "Diff_1": close.diff()}
+    for window in windows:
+        panels[f"Rolling_Mean_{window}"] = close.rolling(window, min_periods=window).mean()
+        panels[f"Volatility_{window}"] = log_return.rolling(window, min_periods=window).std()
+
+    arrays = {name: panel.to_numpy() for name, panel in panels.items()}
+    return [{name: array[len(context):length, column] for name, array in arrays.items()}
+            for column, (context, length) in enumerate(zip(contexts, lengths))]
+
+# Function to write the computed rows of one ticker and record its new metadata
+def store_features(ticker, data, meta, status, computed, windows, current_hash):
+    rows = len(data)
+    start = meta["rows"] if status == "extended" else 0
+    features = pd.DataFrame({"Date": data['Date'].values[start:], **computed})
+    close = data['Close'].values.astype(float)
+    tail_length = max(windows, default=0) + 1
+
+    if status == "extended":
+        index = meta["parts"]
+        close_min = min(meta["close_min"], float(np.nanmin(computed["Close"])))
+        close_max = max(meta["close_max"], float(np.nanmax(computed["Close"])))
+    else:
+        index = 0
+        close_min, close_max = float(np.nanmin(close)), float(np.nanmax(close))
+    save_part(ticker, index, features)
+    parts = index + 1
+
+    # Merge the appended parts once there are too many of them, keeping reads to a few files
+    if parts > max_parts:
+        save_part(ticker, 0, pd.concat([load_features(ticker).iloc[:start], features], ignore_index=True))
+        parts = 1
+    for stale in glob.glob(os.path.join(ticker_dir(ticker), "part-*.arrow")):
+        if int(os.path.basename(stale)[5:10]) >= parts:
+            os.remove(stale)
+
+    save_meta(ticker, {"data_hash": current_hash, "rows": rows, "parts": parts, "windows": windows,
+                       "last_date": str(data['Date'].iloc[-1]), "tail_close": close[-tail_length:].tolist(),
+                       "close_min": close_min, "close_max": close_max})
+
+# Function to bring the features of many tickers up to date, computing only new or changed rows
+@instrument("features")
+def update_features(datasets, windows=None):
+    windows = list(feature_windows if windows is None else windows)
+    tail_length = max(windows, default=0) + 1
+    statuses, pending = {}, []
+
+    with update_lock:
+        for ticker, data in datasets.items():
+            current_hash = data_hash(data[['Date', 'Close']])
+            status, meta = plan_update(ticker, data, windows, current_hash)
+            statuses[ticker] = status
+            if status != "cached":
+                pending.append((ticker, data, meta, status, current_hash))
+
+        # Appended bars are computed from the stored tail only, changed series from scratch
+        for chunk_start in range(0, len(pending), panel_chunk_size):
+            chunk = pending[chunk_start:chunk_start + panel_chunk_size]
+            contexts, series = [], []
+            for ticker, data, meta, status, _ in chunk:
+                close = data['Close'].values.astype(float)
+                if status == "extended":
+                    contexts.append(close[max(meta["rows"] - tail_length, 0):meta["rows"]])
+                    series.append(close[meta["rows"]:])
+                else:
+                    contexts.append(close[:0])
+                    series.append(close)
+
+            for (ticker, data, meta, status, current_hash), computed in zip(chunk, panel_features(contexts, series, windows)):
+                try:
+                    store_features(ticker, data, meta, status, computed, windows, current_hash)
+                except Exception as e:
+                    print(f"Error storing features for {ticker}: {e}")
+    return statuses
+
+# Function to get one ticker's features, updating them first if its data changed
+def get_features(ticker, data, columns=None):
+    update_features({ticker: data})
+    return load_features(ticker, columns)
+
+# Function to get the min/max scaling parameters of a ticker's close, updating its features first if needed
+def get_scaling(ticker, data):
+    update_features({ticker: data})
+    meta = load_meta(ticker)
+    return meta["close_min"], meta["close_max"]
+
+# Function to get the rolling mean of a ticker's close, from its features when the window is one of them
+def rolling_mean(ticker, data, window):
+    if window not in feature_windows:
+        return data['Close'].rolling(window=window).mean()
+    return get_features(ticker, data, [f"Rolling_Mean_{window}"])[f"Rolling_Mean_{window}"]
+
+# Function to get the first difference of a ticker's close from its features, without the leading gap
+def first_difference(ticker, data):
+    return get_features(ticker, data, ["Diff_1"])["Diff_1"].values[1:]
+
+if __name__ == "__main__":
+    # Compute the features of every selected stock in one pass, extending those whose data only grew
+    tickers = list_tickers(selected_view)
+    statuses = update_features({ticker: load_bars(selected_view, ticker, frequency_option(), ["Date", "Close"])
+                                for ticker in tickers})
+    counts = pd.Series(statuses, dtype=object).value_counts()
+    print(f"Features of {len(tickers)} stocks up to date in {feature_store_dir}: "
+          + ", ".join(f"{count} {status}" for status, count in counts.items()))
+    write_run_report()
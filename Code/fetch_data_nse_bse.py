@@ -1,42 +1,141 @@
 import os
+import json
 import pandas as pd
 import yfinance as yf
 from datetime import datetime
+from fetch_layer import download_many
+from metadata_index import universe
+from price_store import data_hash, has_prices, load_prices, price_store_dir, save_prices, ticker_path
+
+# Price store stage holding the downloaded data
+raw_stage = "raw"
+
+# Download parameters
+history_start = "2015-01-01"  # First date requested for tickers not yet in the store
+incremental_mode = True  # Only request the dates missing from the store
+data_provider = yf.download  # Any function with the yf.download(ticker, start=..., end=...) interface
+fetch_cache_file = os.path.join(price_store_dir, "fetch_cache.json")
+
+# Function to load the fetch cache metadata
+def load_fetch_cache():
+    if not os.path.exists(fetch_cache_file):
+        return {}
+    with open(fetch_cache_file) as f:
+        return json.load(f)
+
+# Function to save the fetch cache metadata
+def save_fetch_cache(cache):
+    os.makedirs(os.path.dirname(fetch_cache_file), exist_ok=True)
+    tmp_file = f"{fetch_cache_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, fetch_cache_file)
+
+# Function to find the first date still missing from the store for a ticker
+def missing_start_date(ticker, end_date):
+    if not incremental_mode or not has_prices(raw_stage, ticker):
+        return history_start, None
+
+    existing_data = load_prices(raw_stage, ticker)
+    if existing_data.empty:
+        return history_start, None
+
+    # The download end date is exclusive, so a ticker is current when no business day is missing before it
+    start_date = (existing_data['Date'].max() + pd.Timedelta(days=1)).normalize()
+    if len(pd.bdate_range(start_date, end_date, inclusive="left")) == 0:
+        return None, existing_data
+    return start_date.strftime('%Y-%m-%d'), existing_data
+
+# Function to append downloaded rows to a ticker's stored history and record its cache metadata
+def store_stock_data(ticker, stock_data, existing_data, cache):
+    # Nothing new was published since the last fetch (or nothing at all for a new ticker)
+    if stock_data.empty:
+        if existing_data is None:
+            print(f"No data returned for {ticker}.")
+            return
+        print(f"No new data for {ticker}.")
+        cache.setdefault(ticker, {})["last_fetch"] = datetime.now().isoformat(timespec='seconds')
+        return
+
+    # Drop the ticker level yfinance adds to the column names
+    if isinstance(stock_data.columns, pd.MultiIndex):
+        stock_data.columns = stock_data.columns.get_level_values(0)
+
+    # Add 'Date' column at the start (intraday downloads index the bars by 'Datetime')
+    stock_data = stock_data.rename_axis('Date').reset_index()
+    stock_data.insert(0, 'Date', stock_data.pop('Date'))
+
+    # Append the new rows to the stored history
+    if existing_data is not None:
+        stock_data = pd.concat([existing_data, stock_data[existing_data.columns]], ignore_index=True)
+        stock_data.drop_duplicates(subset='Date', keep='last', inplace=True)
+
+    # Save to the price store
+    save_prices(raw_stage, ticker, stock_data)
+    stored_data = load_prices(raw_stage, ticker)
+    cache[ticker] = {
+        "last_fetch": datetime.now().isoformat(timespec='seconds'),
+        "last_date": stored_data['Date'].max().strftime('%Y-%m-%d'),
+        "rows": len(stored_data),
+        "checksum": data_hash(stored_data),
+    }
+    print(f"Data for {ticker} saved to {ticker_path(raw_stage, ticker)} ({len(stored_data)} rows).")
+
+# Function to download stock data and save it to the price store
+def download_stock_data(ticker, cache=None, provider=None):
+    provider = provider or data_provider
+    cache = load_fetch_cache() if cache is None else cache
 
-# List of stock tickers (NSE and BSE)
-stock_tickers = [
-    "RELIANCE.NS", "TCS.NS", "INFY.NS", "HDFCBANK.NS", "ICICIBANK.NS", "SBIN.NS",
-    "HINDUNILVR.NS", "BHARTIARTL.NS", "ITC.NS", "LT.NS", "ASIANPAINT.NS", "MARUTI.NS",
-    "AXISBANK.NS", "WIPRO.NS", "HCLTECH.NS", "BAJFINANCE.NS", "KOTAKBANK.NS", "TATAMOTORS.NS",
-    "SUNPHARMA.NS", "ULTRACEMCO.NS", "ADANIENT.NS", "NTPC.NS", "POWERGRID.NS", "TATASTEEL.NS",
-    "JSWSTEEL.NS", "HDFCLIFE.NS", "TECHM.NS", "MARICO.NS", "BRITANNIA.NS", "DRREDDY.NS", 
-    "DIVISLAB.NS", "EICHERMOT.NS", "DMART.NS", "BAJAJ-AUTO.NS", "HEROMOTOCO.NS",
-    "BHARATFORG.NS", "UPL.NS", "HINDALCO.NS", "INDUSINDBK.NS", "GRASIM.NS", "BAJAJFINSV.NS", 
-    "BPCL.NS", "IOC.NS", "CIPLA.NS", "LUPIN.NS", "M&M.NS", "SBILIFE.NS", "ZEEL.NS"
-]
-
-# Directory to store stock data
-output_dir = "stock_data"
-os.makedirs(output_dir, exist_ok=True)
-
-# Function to download stock data and save it to a CSV file
-def download_stock_data(ticker):
     try:
-        print(f"Downloading data for {ticker}...")
+        end_date = datetime.today().strftime('%Y-%m-%d')
+        start_date, existing_data = missing_start_date(ticker, end_date)
+        if start_date is None:
+            print(f"Data for {ticker} is already up to date.")
+            return cache
+
+        print(f"Downloading data for {ticker} from {start_date}...")
         # Download historical data
-        stock_data = yf.download(ticker, start="2015-01-01", end=datetime.today().strftime('%Y-%m-%d'))
-        
-        # Add 'Date' column at the start
-        stock_data.reset_index(inplace=True)
-        stock_data.insert(0, 'Date', stock_data.pop('Date'))
-        
-        # Save to CSV file
-        file_path = os.path.join(output_dir, f"{ticker}.csv")
-        stock_data.to_csv(file_path, index=False)
-        print(f"Data for {ticker} saved to {file_path}.")
+        stock_data = provider(ticker, start=start_date, end=end_date)
+        store_stock_data(ticker, stock_data, existing_data, cache)
     except Exception as e:
         print(f"Failed to download data for {ticker}: {e}")
 
-# Loop through all stock tickers and download their data
-for ticker in stock_tickers:
-    download_stock_data(ticker)
+    return cache
+
+# Function to download many tickers in batched, concurrent requests and save them to the price store
+def download_all_stock_data(tickers, cache=None, provider=None):
+    provider = provider or data_provider
+    cache = load_fetch_cache() if cache is None else cache
+    end_date = datetime.today().strftime('%Y-%m-%d')
+
+    # Tickers missing the same dates can share one multi-symbol request
+    groups = {}
+    for ticker in tickers:
+        try:
+            start_date, existing_data = missing_start_date(ticker, end_date)
+        except Exception as e:
+            print(f"Failed to read stored data for {ticker}: {e}")
+            continue
+        if start_date is None:
+            print(f"Data for {ticker} is already up to date.")
+            continue
+        groups.setdefault(start_date, {})[ticker] = existing_data
+
+    for start_date, group in groups.items():
+        print(f"Downloading data for {len(group)} tickers from {start_date}...")
+        frames, errors = download_many(list(group), start_date, end_date, provider=provider)
+
+        for ticker, stock_data in frames.items():
+            try:
+                store_stock_data(ticker, stock_data, group[ticker], cache)
+            except Exception as e:
+                print(f"Failed to save data for {ticker}: {e}")
+        for ticker, error in errors.items():
+            print(f"Failed to download data for {ticker}: {error}")
+
+    return cache
+
+if __name__ == "__main__":
+    # Download every ticker of the universe (nse_universe.csv) in batches and record their cache metadata
+    fetch_cache = download_all_stock_data(universe())
+    save_fetch_cache(fetch_cache)
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import yfinance as yf
+
+# Fetch parameters
+max_workers = 8  # Concurrent requests in flight
+requests_per_second = 2.0  # Sustained request rate allowed by the token bucket
+burst_size = 4  # Requests allowed at once before the rate limit applies
+max_retries = 4  # Attempts after the first failure
+backoff_base = 1.0  # Seconds before the first retry, doubled on every later retry
+backoff_max = 30.0  # Longest wait between two retries
+batch_size = 20  # Tickers per multi-symbol download request
+metadata_cache_file = "metadata_cache.json"
+metadata_max_age_days = 7  # Cached metadata older than this is fetched again
+request_timeout = 30  # Seconds before a request without a response fails
+
+# Token bucket limiting how often requests are sent, shared across threads
+class TokenBucket:
+    def __init__(self, rate=requests_per_second, capacity=burst_size):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Function to block until a request may be sent
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+# Function to create one HTTP session shared by all requests, keeping connections alive across requests
+def make_session(pool_size=max_workers):
+    try:
+        # yfinance prefers curl_cffi sessions; they keep one connection handle per thread, so need no pool size
+        from curl_cffi import requests as curl_requests
+        return curl_requests.Session(impersonate="chrome")
+    except ImportError:
+        import requests
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        return session
+
+# Function to get a JSON document through a session, failing on HTTP error statuses so the request is retried
+def fetch_json(session, url, params=None):
+    response = session.get(url, params=params, timeout=request_timeout)
+    response.raise_for_status()
+    return response.json()
+
+# Function to call a fetch function with rate limiting and exponential-backoff retries
+def call_with_retries(fetch_fn, *args, rate_limiter=None, retries=max_retries, backoff=backoff_base, **kwargs):
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return fetch_fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            # Jitter keeps workers that failed together from retrying together
+            delay = min(backoff_max, backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"Attempt {attempt + 1} failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+# Function to run a fetch function for every item on a bounded thread pool
+def fetch_concurrently(items, fetch_fn, workers=max_workers, rate_limiter=None, retries=max_retries,
+                       backoff=backoff_base):
+    rate_limiter = rate_limiter or TokenBucket()
+    results, errors = {}, {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(call_with_retries, fetch_fn, item, rate_limiter=rate_limiter, retries=retries,
+                            backoff=backoff): item
+            for item in items
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                errors[item] = str(e)
+
+    return results, errors
+
+# Function to split tickers into batches for multi-symbol requests
+def make_batches(tickers, size=batch_size):
+    tickers = list(tickers)
+    return [tuple(tickers[i:i + size]) for i in range(0, len(tickers), size)]
+
+# Function to download a batch of tickers in one request and split the result per ticker
+def download_batch(tickers, start, end, provider=None, session=None):
+    provider = provider or yf.download
+    kwargs = {"session": session} if session is not None else {}
+    stock_data = provider(list(tickers), start=start, end=end, group_by="column", progress=False, **kwargs)
+
+    # Columns without a ticker level can only be attributed when the batch holds one ticker
+    if not isinstance(stock_data.columns, pd.MultiIndex) and len(tickers) > 1:
+        raise ValueError(f"Columns without a ticker level returned for {len(tickers)} tickers")
+
+    frames = {}
+    for ticker in tickers:
+        if isinstance(stock_data.columns, pd.MultiIndex):
+            if ticker not in stock_data.columns.get_level_values(1):
+                continue
+            ticker_data = stock_data.xs(ticker, axis=1, level=1)
+        else:
+            ticker_data = stock_data
+        # Tickers missing from part of the batch's date range come back as empty rows
+        frames[ticker] = ticker_data.dropna(how="all")
+    return frames
+
+# Function to download price data for many tickers in concurrent, rate-limited batches
+def download_many(tickers, start, end, provider=None, session=None, size=batch_size, workers=max_workers):
+    # Only yfinance's own download can use the pooled session
+    if session is None and provider in (None, yf.download):
+        session = make_session(workers)
+    batch_results, batch_errors = fetch_concurrently(
+        make_batches(tickers, size),
+        lambda batch: download_batch(batch, start, end, provider, session),
+        workers=workers,
+    )
+
+    # The tickers of a failed multi-ticker batch are requested again one at a time
+    retry_tickers = [ticker for batch in batch_errors if len(batch) > 1 for ticker in batch]
+    if retry_tickers:
+        batch_errors = {batch: error for batch, error in batch_errors.items() if len(batch) == 1}
+        single_results, single_errors = fetch_concurrently(
+            make_batches(retry_tickers, 1),
+            lambda batch: download_batch(batch, start, end, provider, session),
+            workers=workers,
+        )
+        batch_results.update(single_results)
+        batch_errors.update(single_errors)
+
+    frames = {}
+    for batch_frames in batch_results.values():
+        frames.update(batch_frames)
+    errors = {ticker: error for batch, error in batch_errors.items() for ticker in batch}
+    for ticker in tickers:
+        if ticker not in frames and ticker not in errors:
+            errors[ticker] = "No data returned"
+    return frames, errors
+
+# Function to load cached ticker metadata
+def load_metadata_cache():
+    if not os.path.exists(metadata_cache_file):
+        return {}
+    with open(metadata_cache_file) as f:
+        return json.load(f)
+
+# Function to save cached ticker metadata
+def save_metadata_cache(cache):
+    tmp_file = f"{metadata_cache_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True, default=str)
+    os.replace(tmp_file, metadata_cache_file)
+
+# Function to check whether a cached metadata entry is still fresh
+def is_fresh(entry, max_age_days=metadata_max_age_days):
+    fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    return (datetime.now() - fetched_at).days < max_age_days
+
+# Function to fetch a ticker's metadata and traded date range without pulling its full price history
+def fetch_ticker_metadata(ticker, session=None):
+    stock = yf.Ticker(ticker, session=session)
+    info = stock.info
+
+    # A few recent bars give the last traded date, and the history metadata gives the first
+    recent = stock.history(period="5d")
+    first_trade = stock.history_metadata.get("firstTradeDate")
+    return {
+        "info": info,
+        "data_from": str(pd.to_datetime(first_trade, unit="s").date()) if first_trade else "N/A",
+        "data_to": str(recent.index.max().date()) if not recent.empty else "N/A",
+        "fetched_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+# Function to get metadata for many tickers, fetching only those missing or stale in the cache
+def fetch_metadata(tickers, fetch_fn=None, workers=max_workers):
+    cache = load_metadata_cache()
+    stale = [ticker for ticker in tickers if ticker not in cache or not is_fresh(cache[ticker])]
+
+    if stale:
+        if fetch_fn is None:
+            session = make_session(workers)
+            fetch_fn = lambda ticker: fetch_ticker_metadata(ticker, session)
+        print(f"Fetching metadata for {len(stale)} tickers ({len(tickers) - len(stale)} cached)...")
+        results, errors = fetch_concurrently(stale, fetch_fn, workers=workers)
+        for ticker, error in errors.items():
+            print(f"Failed to fetch metadata for {ticker}: {error}")
+        cache.update(results)
+        save_metadata_cache(cache)
+
+    return {ticker: cache[ticker] for ticker in tickers if ticker in cache}
+
+# Local HTTP server standing in for the price API: every path fails with the given statuses, then answers with JSON
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, failures=(503, 429)):
+        self.failures = list(failures)
+        self.requests = {}
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), StubHandler)
+
+    # Function to get the base URL the server listens on
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+# Request handler of the stub server
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            attempt = self.server.requests.get(self.path, 0)
+            self.server.requests[self.path] = attempt + 1
+        status = self.server.failures[attempt] if attempt < len(self.server.failures) else 200
+        body = json.dumps({"path": self.path, "attempt": attempt + 1}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to check the fetch layer end to end against the stub server: a session from make_session sends every
+# request, and call_with_retries has to retry past the failing statuses. Returns the problems found.
+def check_against_stub(n_items=24, workers=max_workers):
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        session = make_session(workers)
+        items = [f"/v8/finance/chart/STOCK{i}.NS" for i in range(n_items)]
+        results, errors = fetch_concurrently(items, lambda path: fetch_json(session, server.url() + path),
+                                             workers=workers, rate_limiter=TokenBucket(rate=200.0, capacity=workers),
+                                             backoff=0.01)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    problems = [f"{item}: {error}" for item, error in errors.items()]
+    for item, result in results.items():
+        if result != {"path": item, "attempt": len(server.failures) + 1}:
+            problems.append(f"{item}: unexpected response {result}")
+    print(f"{type(session).__module__}.{type(session).__name__} fetched {len(results)}/{n_items} items "
+          f"with {sum(server.requests.values())} requests from a stub server.")
+    return problems
+
+if __name__ == "__main__":
+    # Usage: python fetch_layer.py --check : run the fetch layer against a local stub server
+    if "--check" in sys.argv:
+        problems = check_against_stub()
+        for problem in problems:
+            print(f"Check failed: {problem}")
+        sys.exit(1 if problems else 0)
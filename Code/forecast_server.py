@@ -0,0 +1,266 @@
+import sys
+import json
+import time
+import queue
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import lstm_hybrid_analysis_modified as lstm
+from arima_order_search import resolve_order
+from bar_resampler import load_bars
+from model_registry import cached_arima_fit, load_keras_model, load_numpy_model, load_object
+from numpy_lstm import NumpyLSTM, forward, stack_weights
+from price_store import list_tickers
+
+# Server Parameters
+host = "127.0.0.1"
+port = 8050
+preload = True  # Load every selected stock's models at startup instead of on its first request
+batch_window_ms = 5  # Requests arriving within this window share one predict call
+batch_buckets = (1, 8, 64, 256)  # Batches are padded to these sizes, so each model is traced only once per size
+latency_window = 10000  # Latencies kept per model for the p50/p99 statistics
+numpy_inference = True  # Serve the LSTM with the NumPy forward pass of numpy_lstm.py, never loading TensorFlow
+
+# Warm models of one stock, loaded once per server process
+class WarmModels:
+    def __init__(self, stock_name, data, arima_fit, lstm_model, scaler, ticker_id=None):
+        self.stock_name = stock_name
+        self.arima_fit = arima_fit
+        self.lstm_model = lstm_model
+        self.ticker_id = ticker_id
+        # The look-back window of the last closes, already scaled for the LSTM
+        self.window = scaler.transform(data['Close'].values[-lstm.look_back:].reshape(-1, 1)).reshape(1, lstm.look_back, 1)
+        self.scaler = scaler
+        self.last_date = str(data['Date'].iloc[-1].date())
+
+# Function to pad a batch of model inputs to the next bucket size
+def pad_to_bucket(inputs):
+    size = len(inputs[0])
+    bucket = next(bucket for bucket in batch_buckets if bucket >= size)
+    return [np.concatenate([part, np.repeat(part[-1:], bucket - size, axis=0)]) for part in inputs]
+
+# Function to trace a model for every bucket size before it serves its first request
+def trace_buckets(model, with_ticker_ids):
+    for bucket in batch_buckets:
+        inputs = [np.zeros((bucket, lstm.look_back, 1), dtype=np.float32)]
+        if with_ticker_ids:
+            inputs.append(np.zeros((bucket, 1), dtype=np.int32))
+        model.predict_on_batch(inputs if with_ticker_ids else inputs[0])
+
+# Cache of warm models, loading each stock from the model registry (training it if it was never stored)
+class ModelCache:
+    def __init__(self):
+        self.models = {}
+        self.lock = threading.Lock()
+        self.global_model = None
+        self.global_scalers = None
+
+    # Function to load the global LSTM and its scalers, training it first if needed
+    def load_global(self, datasets):
+        lstm.train_global_lstm(datasets)
+        key = lstm.global_lstm_key(datasets)
+        self.global_scalers = load_object("global_lstm", key, "scalers.pkl")
+        if numpy_inference:
+            self.global_model = load_numpy_model("global_lstm", key)
+        else:
+            self.global_model = load_keras_model("global_lstm", key)
+            trace_buckets(self.global_model, lstm.use_ticker_embedding)
+
+    # Function to load the warm models of one stock
+    def load(self, stock_name):
+        data = load_bars(lstm.selected_view, stock_name, lstm.bar_frequency)
+        order = resolve_order(stock_name, data, lstm.arima_order)
+        arima_fit, _ = cached_arima_fit(stock_name, data, order)
+
+        if lstm.global_model_mode:
+            ticker_ids = {name: index for index, name in enumerate(self.global_scalers)}
+            return WarmModels(stock_name, data, arima_fit, self.global_model, self.global_scalers[stock_name],
+                              ticker_ids[stock_name] if lstm.use_ticker_embedding else None)
+
+        lstm.train_lstm(data, stock_name)
+        key = lstm.lstm_key(data, stock_name)
+        if numpy_inference:
+            lstm_model = load_numpy_model("lstm", key)
+        else:
+            lstm_model = load_keras_model("lstm", key)
+            trace_buckets(lstm_model, False)
+        return WarmModels(stock_name, data, arima_fit, lstm_model, load_object("lstm", key, "scaler.pkl"))
+
+    # Function to get the warm models of a stock, loading them on first use
+    def get(self, stock_name):
+        if stock_name not in self.models:
+            with self.lock:
+                if stock_name not in self.models:
+                    self.models[stock_name] = self.load(stock_name)
+        return self.models[stock_name]
+
+    # Function to load every selected stock up front
+    def warm_up(self, stock_names):
+        if lstm.global_model_mode:
+            self.load_global({stock_name: load_bars(lstm.selected_view, stock_name, lstm.bar_frequency)
+                              for stock_name in stock_names})
+        for stock_name in stock_names:
+            try:
+                self.get(stock_name)
+                print(f"Models loaded for {stock_name}.")
+            except Exception as e:
+                print(f"Error loading models for {stock_name}: {e}")
+
+# Micro-batcher collecting LSTM requests for a short window and running one predict call per model
+class MicroBatcher:
+    def __init__(self, window_ms=batch_window_ms, max_batch=batch_buckets[-1]):
+        self.requests = queue.Queue()
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        threading.Thread(target=self.run, daemon=True).start()
+
+    # Function to queue the window of a stock and get a future for its scaled forecast
+    def submit(self, warm):
+        future = Future()
+        self.requests.put((warm, future))
+        return future
+
+    # Function to collect the requests of one batch window
+    def collect(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    # Function to run one forward pass for a group of requests sharing a model (or, in NumPy, per-stock models)
+    def predict(self, requests):
+        inputs = [np.concatenate([warm.window for warm, _ in requests]).astype(np.float32)]
+        if requests[0][0].ticker_id is not None:
+            inputs.append(np.array([[warm.ticker_id] for warm, _ in requests], dtype=np.int32))
+        model = requests[0][0].lstm_model
+
+        if isinstance(model, NumpyLSTM):
+            # Per-stock NumPy models run together, each window through its own stock's stacked weights
+            if any(warm.lstm_model is not model for warm, _ in requests):
+                return forward(stack_weights([warm.lstm_model.weights for warm, _ in requests]), inputs[0])
+            return model.predict_on_batch(inputs if len(inputs) > 1 else inputs[0])
+
+        inputs = pad_to_bucket(inputs)
+        return model.predict_on_batch(inputs if len(inputs) > 1 else inputs[0])
+
+    # Function to serve batches forever, stacking the windows of requests that share a model
+    def run(self):
+        while True:
+            groups = defaultdict(list)
+            for warm, future in self.collect():
+                # NumPy models of different stocks share one batch, Keras models one batch per model
+                groups["numpy" if isinstance(warm.lstm_model, NumpyLSTM) else id(warm.lstm_model)].append((warm, future))
+
+            for requests in groups.values():
+                try:
+                    predictions = np.asarray(self.predict(requests)).reshape(-1)
+                    for (_, future), prediction in zip(requests, predictions):
+                        future.set_result(prediction)
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+
+# Rolling latency statistics per model
+class LatencyStats:
+    def __init__(self, window=latency_window):
+        self.latencies = defaultdict(lambda: deque(maxlen=window))
+        self.lock = threading.Lock()
+
+    def record(self, model, milliseconds):
+        with self.lock:
+            self.latencies[model].append(milliseconds)
+
+    def summary(self, model=None):
+        with self.lock:
+            models = [model] if model else list(self.latencies)
+            stats = {}
+            for name in models:
+                values = np.array(self.latencies[name])
+                if len(values):
+                    stats[name] = {"count": len(values), "p50_ms": round(float(np.percentile(values, 50)), 3),
+                                   "p99_ms": round(float(np.percentile(values, 99)), 3)}
+            return stats
+
+cache = ModelCache()
+batcher = None
+latency_stats = LatencyStats()
+
+# Function to forecast the next close of a stock with one model
+def forecast(stock_name, model):
+    warm = cache.get(stock_name)
+    forecasts = {}
+    if model in ("arima", "hybrid"):
+        forecasts["arima"] = float(np.asarray(warm.arima_fit.forecast(1))[0])
+    if model in ("lstm", "hybrid"):
+        scaled = batcher.submit(warm).result()
+        forecasts["lstm"] = float(warm.scaler.inverse_transform([[scaled]])[0, 0])
+    if model == "hybrid":
+        # Same equal weighting as the Hybrid model in lstm_hybrid_analysis_modified.py
+        forecasts["hybrid"] = 0.5 * forecasts["arima"] + 0.5 * forecasts["lstm"]
+    return {"stock": stock_name, "model": model, "after": warm.last_date, "forecast": forecasts[model]}
+
+# HTTP handler serving /forecast?ticker=...&model=..., /stats and /health
+class ForecastHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/health":
+            self.send_json(200, {"status": "ok", "stocks_loaded": len(cache.models)})
+        elif url.path == "/stats":
+            self.send_json(200, latency_stats.summary())
+        elif url.path == "/forecast":
+            start_time = time.perf_counter()
+            stock_name = query.get("ticker", [""])[0]
+            model = query.get("model", ["hybrid"])[0]
+            if model not in ("arima", "lstm", "hybrid"):
+                self.send_json(400, {"error": f"unknown model {model}"})
+                return
+            try:
+                result = forecast(stock_name, model)
+            except Exception as e:
+                self.send_json(404 if isinstance(e, FileNotFoundError) else 500, {"error": str(e)})
+                return
+            latency_stats.record(model, (time.perf_counter() - start_time) * 1000)
+            result["latency"] = latency_stats.summary(model)[model]
+            self.send_json(200, result)
+        else:
+            self.send_json(404, {"error": f"unknown path {url.path}"})
+
+    def log_message(self, format, *args):
+        pass  # Per-request logging would dominate the latency of a forecast
+
+if __name__ == "__main__":
+    # Usage: python forecast_server.py [port] [--bars frequency]
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("--"):
+        port = int(sys.argv[1])
+    batcher = MicroBatcher()
+    if preload:
+        cache.warm_up(list_tickers(lstm.selected_view))
+    elif lstm.global_model_mode:
+        cache.load_global({stock_name: load_bars(lstm.selected_view, stock_name, lstm.bar_frequency)
+                           for stock_name in list_tickers(lstm.selected_view)})
+
+    server = ThreadingHTTPServer((host, port), ForecastHandler)
+    print(f"Forecast server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
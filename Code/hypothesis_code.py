@@ -1,78 +1,209 @@
 import os
 import pandas as pd
 import numpy as np
-from scipy.stats import ttest_ind
-import matplotlib.pyplot as plt
+from scipy.stats import t as student_t, ttest_ind
+from bar_resampler import frequency_name, frequency_option
+from performance_matrix import build_panel, load_predictions
+from render_plots import hypothesis_jobs, plots_enabled, render_jobs
+from worker_pool import process_pool
 
 # Directories
-evaluation_results_dir = "evaluation_results"
-plots_dir = os.path.join(evaluation_results_dir, "hypothesis_plots")
-os.makedirs(plots_dir, exist_ok=True)
+evaluation_results_dir = frequency_name("evaluation_results", frequency_option())
 
-# Load combined evaluation metrics
+# Combined evaluation metrics written by performance_matrix.py
 combined_metrics_file = os.path.join(evaluation_results_dir, "combined_evaluation_metrics.csv")
-metrics_data = pd.read_csv(combined_metrics_file)
-
-# Hypothesis H1: LSTM and Hybrid models outperform ARIMA
-# Group data by models
-lstm_data = metrics_data[metrics_data["Model"] == "LSTM"]
-hybrid_data = metrics_data[metrics_data["Model"] == "Hybrid"]
-arima_data = metrics_data[metrics_data["Model"] == "ARIMA"]
-
-# Combine LSTM and Hybrid for comparison against ARIMA
-advanced_models_data = pd.concat([lstm_data, hybrid_data])
-
-# T-test for MAE
-ttest_mae = ttest_ind(advanced_models_data["MAE"], arima_data["MAE"], equal_var=False)
-
-# T-test for RMSE
-ttest_rmse = ttest_ind(advanced_models_data["RMSE"], arima_data["RMSE"], equal_var=False)
-
-# Display H1 results
-print("\nH1 Results: Advanced Models vs ARIMA")
-print(f"MAE T-test p-value: {ttest_mae.pvalue:.5f}")
-print(f"RMSE T-test p-value: {ttest_rmse.pvalue:.5f}")
-
-# Hypothesis H2: Seasonal and trend components influence forecast accuracy
-# Compare Hybrid vs LSTM for MAE and RMSE
-ttest_hybrid_lstm_mae = ttest_ind(hybrid_data["MAE"], lstm_data["MAE"], equal_var=False)
-ttest_hybrid_lstm_rmse = ttest_ind(hybrid_data["RMSE"], lstm_data["RMSE"], equal_var=False)
-
-# Display H2 results
-print("\nH2 Results: Hybrid vs LSTM")
-print(f"MAE T-test p-value: {ttest_hybrid_lstm_mae.pvalue:.5f}")
-print(f"RMSE T-test p-value: {ttest_hybrid_lstm_rmse.pvalue:.5f}")
-
-# Visualizations for Hypotheses
-# H1: MAE and RMSE comparison (Advanced Models vs ARIMA)
-def plot_h1(metric):
-    plt.figure(figsize=(10, 6))
-    plt.boxplot([
-        advanced_models_data[metric],
-        arima_data[metric]
-    ], labels=["Advanced Models (LSTM + Hybrid)", "ARIMA"])
-    plt.title(f"H1: {metric} Comparison")
-    plt.ylabel(metric)
-    plt.savefig(os.path.join(plots_dir, f"H1_{metric}_comparison.png"))
-    plt.close()
-
-# H2: MAE and RMSE comparison (Hybrid vs LSTM)
-def plot_h2(metric):
-    plt.figure(figsize=(10, 6))
-    plt.boxplot([
-        hybrid_data[metric],
-        lstm_data[metric]
-    ], labels=["Hybrid", "LSTM"])
-    plt.title(f"H2: {metric} Comparison")
-    plt.ylabel(metric)
-    plt.savefig(os.path.join(plots_dir, f"H2_{metric}_comparison.png"))
-    plt.close()
-
-# Generate plots
-plot_h1("MAE")
-plot_h1("RMSE")
-plot_h2("MAE")
-plot_h2("RMSE")
-
-# Summary
-print("\nHypothesis testing completed. Results and plots saved.")
+comparison_tests_file = os.path.join(evaluation_results_dir, "forecast_comparison_tests.csv")
+
+# Forecast Comparison Parameters
+model_pairs = [("Hybrid", "LSTM"), ("LSTM", "ARIMA"), ("Hybrid", "ARIMA")]  # (A, B): positive differentials favour B
+loss_function = "squared"  # "squared" or "absolute" forecast error
+dm_horizon = 1  # Forecast horizon of the Diebold-Mariano test (lags in its long-run variance)
+n_draws = 10000  # Bootstrap and permutation draws per (ticker, model pair)
+block_length = None  # Block length of the resampling tests (None = cube root of the median series length)
+draws_per_batch = 500  # Draws generated together in one array
+significance_level = 0.05
+random_seed = 404
+parallel_mode = False  # Split the (ticker, model pair) series over worker processes
+n_workers = None  # Number of worker processes (None = one per CPU core)
+
+# Function to run the H1 and H2 t-tests on the combined evaluation metrics
+def run_hypothesis_tests():
+    # Load combined evaluation metrics
+    metrics_data = pd.read_csv(combined_metrics_file)
+
+    # Hypothesis H1: LSTM and Hybrid models outperform ARIMA
+    # Group data by models
+    lstm_data = metrics_data[metrics_data["Model"] == "LSTM"]
+    hybrid_data = metrics_data[metrics_data["Model"] == "Hybrid"]
+    arima_data = metrics_data[metrics_data["Model"] == "ARIMA"]
+
+    # Combine LSTM and Hybrid for comparison against ARIMA
+    advanced_models_data = pd.concat([lstm_data, hybrid_data])
+
+    # T-test for MAE
+    ttest_mae = ttest_ind(advanced_models_data["MAE"], arima_data["MAE"], equal_var=False)
+
+    # T-test for RMSE
+    ttest_rmse = ttest_ind(advanced_models_data["RMSE"], arima_data["RMSE"], equal_var=False)
+
+    # Display H1 results
+    print("\nH1 Results: Advanced Models vs ARIMA")
+    print(f"MAE T-test p-value: {ttest_mae.pvalue:.5f}")
+    print(f"RMSE T-test p-value: {ttest_rmse.pvalue:.5f}")
+
+    # Hypothesis H2: Seasonal and trend components influence forecast accuracy
+    # Compare Hybrid vs LSTM for MAE and RMSE
+    ttest_hybrid_lstm_mae = ttest_ind(hybrid_data["MAE"], lstm_data["MAE"], equal_var=False)
+    ttest_hybrid_lstm_rmse = ttest_ind(hybrid_data["RMSE"], lstm_data["RMSE"], equal_var=False)
+
+    # Display H2 results
+    print("\nH2 Results: Hybrid vs LSTM")
+    print(f"MAE T-test p-value: {ttest_hybrid_lstm_mae.pvalue:.5f}")
+    print(f"RMSE T-test p-value: {ttest_hybrid_lstm_rmse.pvalue:.5f}")
+
+# Function to build the loss differential series of every (model pair, ticker) from the aligned error panel
+def loss_differentials(panel, pairs=model_pairs, loss=loss_function):
+    errors = panel["Predicted"] - panel["Actual"]
+    losses = errors ** 2 if loss == "squared" else np.abs(errors)
+    models = panel["models"]
+
+    labels, differentials = [], []
+    for model_a, model_b in pairs:
+        if model_a not in models or model_b not in models:
+            print(f"Skipping {model_a} vs {model_b}: no predictions for one of the models.")
+            continue
+        differentials.append(losses[models.index(model_a)] - losses[models.index(model_b)])
+        labels += [(ticker, model_a, model_b) for ticker in panel["tickers"]]
+    if not differentials:
+        return labels, np.empty((0, len(panel["dates"])))
+    return labels, np.concatenate(differentials)
+
+# Function to move the dates both models forecast to the front of each series, padding the rest with zeros
+def compact_series(differentials):
+    valid = ~np.isnan(differentials)
+    order = np.argsort(~valid, axis=1, kind="stable")
+    compact = np.take_along_axis(np.nan_to_num(differentials), order, axis=1)
+    return compact, valid.sum(axis=1)
+
+# Function to run the Diebold-Mariano test (with the Harvey-Leybourne-Newbold correction) on every series at once
+def diebold_mariano(compact, lengths, horizon=dm_horizon):
+    n = lengths.astype(float)
+    mask = np.arange(compact.shape[1]) < lengths[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = compact.sum(axis=1) / n
+        centered = np.where(mask, compact - mean[:, np.newaxis], 0.0)
+
+        # Long-run variance from the autocovariances up to horizon - 1 lags
+        long_run_variance = (centered ** 2).sum(axis=1) / n
+        for lag in range(1, horizon):
+            long_run_variance += 2 * (centered[:, lag:] * centered[:, :-lag]).sum(axis=1) / n
+
+        statistic = mean / np.sqrt(long_run_variance / n)
+        statistic *= np.sqrt((n + 1 - 2 * horizon + horizon * (horizon - 1) / n) / n)
+        p_value = 2 * student_t.sf(np.abs(statistic), df=n - 1)
+    return mean, statistic, p_value
+
+# Function to pick the resampling block length from the series lengths
+def resampling_block_length(lengths):
+    if block_length:
+        return block_length
+    return max(1, int(round(np.median(lengths[lengths > 0]) ** (1 / 3)))) if (lengths > 0).any() else 1
+
+# Function to run the circular block bootstrap and the block sign-flip permutation test on a set of series.
+# Draws are generated in batched arrays: bootstrap means are sums of precomputed circular block sums,
+# and permutation statistics are one matrix product of block sums and random signs.
+def resampling_tests(compact, lengths, block, draws=n_draws, seed=random_seed):
+    rng = np.random.default_rng(seed)
+    n_series, width = compact.shape
+    safe_lengths = np.maximum(lengths, 1)
+    n_blocks = -(-safe_lengths // block)  # Blocks per series, rounded up
+    max_blocks = int(n_blocks.max()) if n_series else 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = compact.sum(axis=1) / lengths
+
+    # Sum of the circular block starting at every position of every series
+    positions = (np.arange(width)[:, np.newaxis] + np.arange(block)) % safe_lengths[:, np.newaxis, np.newaxis]
+    circular_sums = np.take_along_axis(compact, positions.reshape(n_series, -1), axis=1).reshape(n_series, width, block).sum(axis=2)
+    block_mask = np.arange(max_blocks) < n_blocks[:, np.newaxis]
+
+    # Sums of the consecutive, non-overlapping blocks whose signs are flipped
+    padded = np.zeros((n_series, max_blocks * block))
+    padded[:, :min(width, max_blocks * block)] = compact[:, :max_blocks * block]
+    fixed_sums = padded.reshape(n_series, max_blocks, block).sum(axis=2)
+
+    bootstrap_exceed = np.zeros(n_series)
+    permutation_exceed = np.zeros(n_series)
+    for start in range(0, draws, draws_per_batch):
+        batch = min(draws_per_batch, draws - start)
+
+        # Circular block bootstrap of the mean, centred on the observed mean
+        starts = (rng.random((batch, max_blocks)) * safe_lengths[:, np.newaxis, np.newaxis]).astype(np.int64)
+        sums = np.take_along_axis(circular_sums, starts.reshape(n_series, -1), axis=1).reshape(n_series, batch, max_blocks)
+        bootstrap_means = (sums * block_mask[:, np.newaxis, :]).sum(axis=2) / (n_blocks * block)[:, np.newaxis]
+        bootstrap_exceed += (np.abs(bootstrap_means - mean[:, np.newaxis]) >= np.abs(mean)[:, np.newaxis]).sum(axis=1)
+
+        # Sign flips of whole blocks keep the dependence within each block
+        signs = rng.choice([-1.0, 1.0], size=(max_blocks, batch))
+        permuted_means = fixed_sums @ signs / safe_lengths[:, np.newaxis]
+        permutation_exceed += (np.abs(permuted_means) >= np.abs(mean)[:, np.newaxis]).sum(axis=1)
+
+    valid = lengths > 1
+    return (np.where(valid, (bootstrap_exceed + 1) / (draws + 1), np.nan),
+            np.where(valid, (permutation_exceed + 1) / (draws + 1), np.nan))
+
+# Function to run the resampling tests, split over worker processes when parallel mode is on
+def run_resampling_tests(compact, lengths, block, draws=n_draws, parallel=parallel_mode, max_workers=n_workers):
+    if not parallel or len(compact) < 2:
+        return resampling_tests(compact, lengths, block, draws)
+
+    chunks = np.array_split(np.arange(len(compact)), max_workers or os.cpu_count() or 1)
+    chunks = [chunk for chunk in chunks if len(chunk)]
+    seeds = np.random.SeedSequence(random_seed).generate_state(len(chunks))
+    with process_pool(len(chunks)) as executor:
+        results = list(executor.map(resampling_tests, [compact[chunk] for chunk in chunks], [lengths[chunk] for chunk in chunks],
+                                    [block] * len(chunks), [draws] * len(chunks), seeds))
+    return np.concatenate([bootstrap for bootstrap, _ in results]), np.concatenate([permutation for _, permutation in results])
+
+# Function to compare the forecasts of every model pair for every ticker and save the test results
+def run_forecast_comparison(pairs=model_pairs, draws=n_draws, loss=loss_function):
+    labels, differentials = loss_differentials(build_panel(load_predictions()), pairs, loss)
+    if not labels:
+        print("No model pairs to compare.")
+        return pd.DataFrame()
+
+    compact, lengths = compact_series(differentials)
+    mean, dm_statistic, dm_p_value = diebold_mariano(compact, lengths)
+    block = resampling_block_length(lengths)
+    bootstrap_p_value, permutation_p_value = run_resampling_tests(compact, lengths, block, draws)
+
+    results = pd.DataFrame(labels, columns=["Ticker", "Model_A", "Model_B"]).assign(
+        Loss=loss, Observations=lengths, Mean_Loss_Difference=mean, DM_Statistic=dm_statistic, DM_p_value=dm_p_value,
+        Bootstrap_p_value=bootstrap_p_value, Permutation_p_value=permutation_p_value, Block_Length=block)
+    results = results[results["Observations"] > 1]
+    results.to_csv(comparison_tests_file, index=False)
+
+    # Count per model pair the tickers where each test finds a significant difference
+    summary = results.groupby(["Model_A", "Model_B"], sort=False).agg(
+        Tickers=("Ticker", "size"),
+        B_Better=("Mean_Loss_Difference", lambda values: int((values > 0).sum())),
+        DM_Significant=("DM_p_value", lambda values: int((values < significance_level).sum())),
+        Bootstrap_Significant=("Bootstrap_p_value", lambda values: int((values < significance_level).sum())),
+        Permutation_Significant=("Permutation_p_value", lambda values: int((values < significance_level).sum())),
+    )
+    print(f"\nPer-ticker forecast comparison ({loss} loss, {draws} draws, block length {block}):")
+    print(summary.to_string())
+    print(f"Forecast comparison tests saved to {comparison_tests_file}")
+    return results
+
+if __name__ == "__main__":
+    run_hypothesis_tests()
+
+    # Paired per-ticker tests on the full error series
+    run_forecast_comparison()
+
+    # Visualizations for Hypotheses
+    if plots_enabled():
+        render_jobs(hypothesis_jobs())
+
+    # Summary
+    print("\nHypothesis testing completed. Results and plots saved.")
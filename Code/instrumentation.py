@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+import functools
+import inspect
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+# Directories
+run_reports_dir = "run_reports"  # One sub-directory per run with the raw records, the report and any profiles
+
+# Instrumentation Parameters
+# Settings are read from flags or environment variables so worker processes and subprocesses inherit them
+run_id_env_var = "RUN_REPORT_ID"
+instrument_enabled = "--instrument" in sys.argv or os.environ.get("INSTRUMENT", "") == "1"  # Timing records, opt-in
+trace_memory = "--trace-memory" in sys.argv or os.environ.get("TRACE_MEMORY", "") == "1"  # tracemalloc peaks
+profile_stages = "--profile" in sys.argv or os.environ.get("PROFILE_STAGES", "") == "1"  # cProfile dump per stage
+report_columns = ["Stage", "Ticker", "Status", "Wall_s", "CPU_s", "Peak_RSS_MB", "RSS_Growth_MB", "Traced_Peak_MB",
+                  "PID", "Started"]
+
+# Per-thread stack of open timers (used to carry tracemalloc peaks of nested timers) and profiler state
+local = threading.local()
+write_lock = threading.Lock()
+profilers = {}
+record_files = {}  # Open record file of this process, by process id (forked workers open their own)
+
+if instrument_enabled:
+    os.environ["INSTRUMENT"] = "1"
+if trace_memory:
+    os.environ["TRACE_MEMORY"] = "1"
+if profile_stages:
+    os.environ["PROFILE_STAGES"] = "1"
+
+# Function to get the id of the current run, shared with every process started from this one
+def run_id():
+    if run_id_env_var not in os.environ:
+        os.environ[run_id_env_var] = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    return os.environ[run_id_env_var]
+
+# Fix the run id at import, so worker processes started later write into the same run
+run_id()
+
+# Function to turn timing records on for this process and every process started from it
+# (used by the pipeline and benchmark runs, which always write a run report)
+def enable_instrumentation():
+    global instrument_enabled
+    instrument_enabled = True
+    os.environ["INSTRUMENT"] = "1"
+
+# Function to get the directory of the current run
+def run_dir():
+    directory = os.path.join(run_reports_dir, run_id())
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+# Function to get the peak resident set size of this process in MB
+def peak_rss_mb():
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+    except ImportError:
+        return float("nan")
+
+# Function to reset the peak resident set size of this process to its current size, where the OS allows it.
+# Linux resets the peak through /proc, so the next timer's peak covers only its own block.
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+# Function to append one record to this process's record file of the run, which stays open between records
+def save_record(record):
+    with write_lock:
+        pid = os.getpid()
+        if pid not in record_files:
+            record_files[pid] = open(os.path.join(run_dir(), f"records-{pid}.jsonl"), "a")
+        record_files[pid].write(json.dumps(record) + "\n")
+        record_files[pid].flush()
+
+# Context manager timing a block of one stage (and ticker) with its CPU time and memory.
+# CPU time, peak RSS and the tracemalloc peak are per process, so blocks running in concurrent threads share them.
+# With reset_peak the peak RSS is that of the block alone, and timers around it no longer see earlier peaks.
+@contextmanager
+def timed(stage, ticker=None, reset_peak=False):
+    if not instrument_enabled:
+        yield
+        return
+
+    stack = local.__dict__.setdefault("stack", [])
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if stack:
+            stack[-1]["traced_peak"] = max(stack[-1]["traced_peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    frame = {"traced_peak": 0}
+    stack.append(frame)
+
+    if reset_peak:
+        reset_peak_rss()
+    status = "success"
+    started, start_wall, start_cpu, start_rss = time.time(), time.perf_counter(), time.process_time(), peak_rss_mb()
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        wall, cpu, rss = time.perf_counter() - start_wall, time.process_time() - start_cpu, peak_rss_mb()
+        stack.pop()
+        traced_peak = float("nan")
+        if trace_memory:
+            # A nested timer's peak also counts towards the timers around it
+            frame["traced_peak"] = max(frame["traced_peak"], tracemalloc.get_traced_memory()[1])
+            traced_peak = frame["traced_peak"] / (1024 * 1024)
+            if stack:
+                stack[-1]["traced_peak"] = max(stack[-1]["traced_peak"], frame["traced_peak"])
+            tracemalloc.reset_peak()
+
+        save_record({"Stage": stage, "Ticker": ticker, "Status": status, "Wall_s": round(wall, 6), "CPU_s": round(cpu, 6),
+                     "Peak_RSS_MB": round(rss, 2), "RSS_Growth_MB": round(rss - start_rss, 2),
+                     "Traced_Peak_MB": round(traced_peak, 3), "PID": os.getpid(), "Started": started})
+
+# Context manager collecting a cProfile of a stage, dumped per stage and process after every call
+@contextmanager
+def profiled(stage):
+    # Only the outermost profiled block of a thread is profiled, profilers cannot be nested
+    if not profile_stages or getattr(local, "profiling", False):
+        yield
+        return
+
+    profiler = profilers.setdefault(stage, cProfile.Profile())
+    local.profiling = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        local.profiling = False
+        profile_dir = os.path.join(run_dir(), "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profile_dir, f"{stage}-{os.getpid()}.prof"))
+
+# Decorator timing (and optionally profiling) every call of a function, taking the ticker from one of its arguments
+def instrument(stage, ticker_arg="stock_name", profile=False):
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            ticker = None
+            if ticker_arg in signature.parameters:
+                bound = signature.bind_partial(*args, **kwargs)
+                ticker = bound.arguments.get(ticker_arg)
+            with timed(stage, ticker):
+                if profile:
+                    with profiled(stage):
+                        return function(*args, **kwargs)
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function to load every record saved by any process of a run
+def load_records(current_run=None):
+    directory = os.path.join(run_reports_dir, current_run or run_id())
+    records = []
+    if os.path.isdir(directory):
+        for file in sorted(os.listdir(directory)):
+            if file.startswith("records-") and file.endswith(".jsonl"):
+                with open(os.path.join(directory, file)) as f:
+                    records.extend(json.loads(line) for line in f if line.strip())
+    return pd.DataFrame(records, columns=report_columns)
+
+# Function to summarise the records of a run per stage
+def summarise_stages(records):
+    if records.empty:
+        return pd.DataFrame()
+    return records.groupby("Stage").agg(
+        Calls=("Wall_s", "size"), Errors=("Status", lambda status: int((status != "success").sum())),
+        Total_Wall_s=("Wall_s", "sum"), Mean_Wall_s=("Wall_s", "mean"), Max_Wall_s=("Wall_s", "max"),
+        Total_CPU_s=("CPU_s", "sum"), Max_Peak_RSS_MB=("Peak_RSS_MB", "max"), Max_Traced_Peak_MB=("Traced_Peak_MB", "max"),
+    ).round(4).sort_values("Total_Wall_s", ascending=False)
+
+# Function to write the JSON and CSV report of the current run (stage x ticker x wall/CPU/memory)
+def write_run_report(current_run=None):
+    if not instrument_enabled:
+        return None
+    current_run = current_run or run_id()
+    records = load_records(current_run)
+    directory = os.path.join(run_reports_dir, current_run)
+    os.makedirs(directory, exist_ok=True)
+    stages = summarise_stages(records)
+
+    records.to_csv(os.path.join(directory, "run_report.csv"), index=False)
+    with open(os.path.join(directory, "run_report.json"), "w") as f:
+        json.dump({"run_id": current_run, "trace_memory": trace_memory, "profile_stages": profile_stages,
+                   "stages": json.loads(stages.reset_index().to_json(orient="records")) if not stages.empty else [],
+                   "records": json.loads(records.to_json(orient="records"))}, f, indent=2)
+
+    if not stages.empty:
+        print("\nRun report by stage:\n")
+        print(stages.to_string())
+    print(f"Run report saved to {directory}")
+    return records
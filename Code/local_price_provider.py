@@ -0,0 +1,35 @@
+import os
+import pandas as pd
+
+# Directories
+local_data_dir = "stock_data"  # Raw CSV files in the layout written by yf.download
+
+# Function to read one raw CSV file, skipping the ticker-name row under the header
+def read_local_csv(ticker):
+    file_path = os.path.join(local_data_dir, f"{ticker}.csv")
+    data = pd.read_csv(file_path)
+    data = data[pd.to_datetime(data['Date'], errors='coerce').notna()]
+    data['Date'] = pd.to_datetime(data['Date'])
+    return data.set_index('Date').apply(pd.to_numeric)
+
+# Function with the yf.download interface that serves prices from local files instead of the network
+def download(tickers, start=None, end=None, **kwargs):
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    frames = {}
+    for ticker in tickers:
+        # Like yfinance, unknown tickers are left out instead of failing the whole request
+        if not os.path.exists(os.path.join(local_data_dir, f"{ticker}.csv")):
+            continue
+        data = read_local_csv(ticker)
+        if start is not None:
+            data = data[data.index >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[data.index < pd.Timestamp(end)]
+        frames[ticker] = data
+
+    if not frames:
+        return pd.DataFrame()
+
+    # Match yfinance's (Price, Ticker) column levels
+    combined = pd.concat(frames, axis=1, names=["Ticker", "Price"]).swaplevel(axis=1)
+    return combined.sort_index(axis=1, level=0, sort_remaining=False)
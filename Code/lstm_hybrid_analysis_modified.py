@@ -1,121 +1,342 @@
 import os
+import gc
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from keras.models import Sequential
-from keras.layers import LSTM, Dense, Input
-import matplotlib.pyplot as plt
-from statsmodels.tsa.arima.model import ARIMA
+from numpy.lib.stride_tricks import sliding_window_view
+from arima_order_search import resolve_order
+from bar_resampler import frequency_name, frequency_option, load_bars, resample_view
+from feature_engine import get_scaling, update_features
+from instrumentation import instrument, timed, write_run_report
+from model_registry import (cached_arima_fit, has_artifacts, load_predictions, make_key, save_keras_model,
+                            save_numpy_weights, save_object, save_predictions)
+from numpy_lstm import NumpyLSTM, model_weights
+from prediction_store import write_predictions
+from price_store import list_tickers
+from worker_pool import pin_blas_threads, recycled_pool
 
 # Directories
-selected_data_dir = "selected_stock_data"
-lstm_results_dir = "lstm_results"
-hybrid_results_dir = "hybrid_results"
+selected_view = "selected"  # Price store view holding the selected stocks
+lstm_results_dir = frequency_name("lstm_results", frequency_option())
+hybrid_results_dir = frequency_name("hybrid_results", frequency_option())
 os.makedirs(lstm_results_dir, exist_ok=True)
 os.makedirs(hybrid_results_dir, exist_ok=True)
 
 # LSTM Model Parameters
 look_back = 60  # Number of previous days to consider for prediction
+batch_size = 32  # Windows per training batch
+predict_batch_size = 1024  # Windows per prediction batch
+lstm_units = 50  # Units in each of the two LSTM layers
+epochs = 20  # Training epochs
+arima_order = (5, 1, 0)  # (p, d, q) order of the ARIMA part of the Hybrid model
+bar_frequency = frequency_option()  # Bars the models are trained on, from --bars ("5min", "h", "W" ...); None keeps the stored bars
+numpy_inference = False  # Predict with the NumPy forward pass of numpy_lstm.py instead of Keras after training
 
-# Function to create LSTM dataset
+# Global Model Parameters
+global_model_mode = False  # Train one LSTM on the windows of all selected stocks instead of one per stock
+use_ticker_embedding = True  # Feed a learned ticker embedding to the global model next to each window
+embedding_dim = 4  # Size of the ticker embedding
+global_batch_size = 256  # Windows per training batch of the global model
+global_epochs = epochs  # Training epochs of the global model
+
+# Memory Parameters
+bounded_memory_mode = False  # Train every stock on one reused model, free memory after each stock and cap TensorFlow's threads
+recycle_workers = False  # In bounded mode, also run the stocks in worker processes replaced after a few stocks each
+stocks_per_worker = 10  # Stocks a worker process handles before it is replaced
+n_workers = 1  # Worker processes training at the same time (each holds its own TensorFlow runtime)
+tf_intra_op_threads = 2  # Threads TensorFlow uses inside one op in bounded mode
+tf_inter_op_threads = 1  # Ops TensorFlow runs at the same time in bounded mode
+worker_settings = ["bar_frequency", "look_back", "batch_size", "predict_batch_size", "lstm_units", "epochs", "arima_order",
+                   "numpy_inference", "bounded_memory_mode", "tf_intra_op_threads", "tf_inter_op_threads"]  # Passed on to worker processes
+
+# Whether this process has already applied the TensorFlow thread caps
+tensorflow_configured = False
+
+# Model reused by every stock of this process in bounded mode, with its initial weights and optimizer state
+shared_model = None
+
+# Function to create LSTM dataset as strided views over the series, without copying any window
 def create_dataset(data, look_back):
-    X, Y = [], []
-    for i in range(len(data) - look_back):
-        X.append(data[i:i + look_back])
-        Y.append(data[i + look_back])
-    return np.array(X), np.array(Y)
-
-# Function to build and train LSTM model
-def apply_lstm(data, stock_name):
+    series = np.asarray(data).reshape(-1)
+    # A series no longer than the look-back has no complete window
+    if len(series) <= look_back:
+        return np.empty((0, look_back, 1), dtype=series.dtype), np.empty((0, 1), dtype=series.dtype)
+    X = sliding_window_view(series[:-1], look_back)[..., np.newaxis]
+    Y = series[look_back:].reshape(-1, 1)
+    return X, Y
+
+# Function to cap TensorFlow's thread pools, which is only possible before its runtime starts
+def configure_tensorflow():
+    global tensorflow_configured
+    if tensorflow_configured:
+        return
+    import tensorflow as tf
     try:
-        # Normalize the data
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        scaled_data = scaler.fit_transform(data['Close'].values.reshape(-1, 1))
+        tf.config.threading.set_intra_op_parallelism_threads(tf_intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(tf_inter_op_threads)
+    except RuntimeError as e:
+        print(f"TensorFlow threads not capped, its runtime already started: {e}")
+    tensorflow_configured = True
+
+# Function to build the LSTM model
+def build_lstm_model():
+    # Keras (and TensorFlow behind it) is only imported once a model is actually built
+    from keras.models import Sequential
+    from keras.layers import LSTM, Dense, Input
+    model = Sequential()
+    model.add(Input(shape=(look_back, 1)))  # Updated to use Input layer
+    model.add(LSTM(units=lstm_units, return_sequences=True))
+    model.add(LSTM(units=lstm_units))
+    model.add(Dense(units=1))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+# Function to get the model shared by the stocks of this process, reset to its initial weights and optimizer state.
+# Every new model leaves graph state behind in TensorFlow, even after clear_session(), so bounded mode builds one.
+def reusable_lstm_model():
+    global shared_model
+    if shared_model is None:
+        configure_tensorflow()
+        model = build_lstm_model()
+        model.optimizer.build(model.trainable_variables)
+        shared_model = (model, model.get_weights(), [variable.numpy() for variable in model.optimizer.variables])
+
+    model, weights, optimizer_state = shared_model
+    model.set_weights(weights)
+    for variable, value in zip(model.optimizer.variables, optimizer_state):
+        variable.assign(value)
+    return model
+
+# Function to build the global LSTM model, optionally conditioned on a ticker embedding
+def build_global_lstm_model(n_tickers):
+    if bounded_memory_mode:
+        configure_tensorflow()
+    from keras.models import Model
+    from keras.layers import LSTM, Concatenate, Dense, Embedding, Flatten, Input, RepeatVector
+
+    window_input = Input(shape=(look_back, 1))
+    inputs, features = [window_input], window_input
+    if use_ticker_embedding:
+        # The ticker embedding is repeated along the window so every time step sees it
+        ticker_input = Input(shape=(1,), dtype="int32")
+        embedding = Flatten()(Embedding(n_tickers, embedding_dim)(ticker_input))
+        features = Concatenate()([window_input, RepeatVector(look_back)(embedding)])
+        inputs.append(ticker_input)
+
+    hidden = LSTM(units=lstm_units, return_sequences=True)(features)
+    hidden = LSTM(units=lstm_units)(hidden)
+    model = Model(inputs=inputs, outputs=Dense(units=1)(hidden))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+# Function to get a stock's scaler from the min/max of its close stored with its features
+def feature_scaler(data, stock_name):
+    from sklearn.preprocessing import MinMaxScaler
+    close_min, close_max = get_scaling(stock_name, data)
+    return MinMaxScaler(feature_range=(0, 1)).fit([[close_min], [close_max]])
+
+# Function to scale every series with its own scaler and pool them into one array with window start offsets
+def pool_series(datasets):
+    # One vectorized feature pass over every stock before the scalers are read
+    update_features(datasets)
+
+    scalers, pieces, starts, ticker_ids = {}, [], [], []
+    offset = 0
+    for ticker_id, (stock_name, data) in enumerate(datasets.items()):
+        scalers[stock_name] = feature_scaler(data, stock_name)
+        scaled = scalers[stock_name].transform(data['Close'].values.reshape(-1, 1)).reshape(-1)
+        n_windows = len(scaled) - look_back
+        pieces.append(scaled)
+        starts.append(offset + np.arange(max(n_windows, 0)))
+        ticker_ids.append(np.full(max(n_windows, 0), ticker_id, dtype=np.int32))
+        offset += len(scaled)
+    return np.concatenate(pieces), np.concatenate(starts), np.concatenate(ticker_ids), scalers
+
+# Function to build the registry key of the global model from all of its training data
+def global_lstm_key(datasets):
+    params = {"model": "global_lstm", "look_back": look_back, "units": lstm_units, "epochs": global_epochs,
+              "batch_size": global_batch_size, "embedding": embedding_dim if use_ticker_embedding else 0}
+    pooled_data = pd.concat([data[['Date', 'Close']].assign(Ticker=stock_name) for stock_name, data in datasets.items()],
+                            ignore_index=True)
+    return make_key("global", pooled_data, params)
+
+# Function to train one LSTM on all stocks and predict every stock in large batches,
+# or load the predictions of an identical stored model
+def train_global_lstm(datasets):
+    key = global_lstm_key(datasets)
+    names = [f"{stock_name}.npy" for stock_name in datasets]
+    if has_artifacts("global_lstm", key, ["model.keras", "scalers.pkl"] + names):
+        return {stock_name: load_predictions("global_lstm", key, f"{stock_name}.npy") for stock_name in datasets}
+
+    from window_batches import PooledWindowBatches
+
+    # Pool the windows of every stock, each scaled by its own scaler
+    series, starts, ticker_ids, scalers = pool_series(datasets)
+    ids = ticker_ids if use_ticker_embedding else None
+
+    # Build and train the global model
+    model = build_global_lstm_model(len(datasets))
+    with timed("global_lstm.fit"):
+        model.fit(PooledWindowBatches(series, starts, look_back, ids, global_batch_size), epochs=global_epochs, verbose=0)
+
+    # Predict every window of every stock in one batched pass and split the result per stock
+    with timed("global_lstm.predict"):
+        batches = PooledWindowBatches(series, starts, look_back, ids, predict_batch_size, shuffle=False)
+        if numpy_inference:
+            numpy_model = NumpyLSTM(model_weights(model))
+            scaled_predictions = np.concatenate([numpy_model.predict_on_batch(batches[index][0]) for index in range(len(batches))])
+        else:
+            scaled_predictions = model.predict(batches, verbose=0)
+    predictions = {}
+    for ticker_id, stock_name in enumerate(datasets):
+        stock_predictions = scaled_predictions[ticker_ids == ticker_id]
+        predictions[stock_name] = scalers[stock_name].inverse_transform(stock_predictions)
+        save_predictions("global_lstm", key, predictions[stock_name], f"{stock_name}.npy")
 
-        # Prepare dataset for LSTM
-        X, Y = create_dataset(scaled_data, look_back)
-        X = X.reshape((X.shape[0], X.shape[1], 1))
+    # Store the model and scalers for later runs
+    save_keras_model("global_lstm", key, model)
+    save_numpy_weights("global_lstm", key, model)
+    save_object("global_lstm", key, "scalers.pkl", scalers)
+    return predictions
 
-        # Build the LSTM model
-        model = Sequential()
-        model.add(Input(shape=(X.shape[1], 1)))  # Updated to use Input layer
-        model.add(LSTM(units=50, return_sequences=True))
-        model.add(LSTM(units=50))
-        model.add(Dense(units=1))
-        model.compile(optimizer='adam', loss='mean_squared_error')
+# Function to build the registry key of a stock's LSTM model
+def lstm_key(data, stock_name):
+    params = {"model": "lstm", "look_back": look_back, "units": lstm_units, "epochs": epochs, "batch_size": batch_size}
+    return make_key(stock_name, data[['Date', 'Close']], params)
 
-        # Train the model
-        model.fit(X, Y, epochs=20, batch_size=32, verbose=0)
+# Function to train the LSTM model and predict prices, or load the predictions of an identical stored model
+def train_lstm(data, stock_name):
+    key = lstm_key(data, stock_name)
+    if has_artifacts("lstm", key, ["model.keras", "scaler.pkl", "predictions.npy"]):
+        return load_predictions("lstm", key)
 
-        # Make predictions
-        predicted_prices = model.predict(X)
-        predicted_prices = scaler.inverse_transform(predicted_prices)
+    from window_batches import WindowBatches
+
+    # Normalize the data with the scaling parameters of the stock's features
+    scaler = feature_scaler(data, stock_name)
+    scaled_data = scaler.transform(data['Close'].values.reshape(-1, 1))
+
+    # Prepare dataset for LSTM
+    X, Y = create_dataset(scaled_data, look_back)
+
+    # Build and train the LSTM model
+    model = reusable_lstm_model() if bounded_memory_mode else build_lstm_model()
+    with timed("lstm.fit", stock_name):
+        model.fit(WindowBatches(X, Y, batch_size), epochs=epochs, verbose=0)
+
+    # Make predictions
+    with timed("lstm.predict", stock_name):
+        if numpy_inference:
+            predicted_prices = NumpyLSTM(model_weights(model)).predict(X, predict_batch_size)
+        else:
+            predicted_prices = model.predict(WindowBatches(X, Y, predict_batch_size, shuffle=False), verbose=0)
+    predicted_prices = scaler.inverse_transform(predicted_prices)
+
+    # Store the model, scaler and predictions for later stages and runs
+    save_keras_model("lstm", key, model)
+    save_numpy_weights("lstm", key, model)
+    save_object("lstm", key, "scaler.pkl", scaler)
+    save_predictions("lstm", key, predicted_prices)
+    return predicted_prices
+
+# Function to build and train LSTM model, or save the given predictions of the global model
+@instrument("lstm", profile=True)
+def apply_lstm(data, stock_name, predicted_prices=None):
+    try:
+        # Train the model and make predictions
+        if predicted_prices is None:
+            predicted_prices = train_lstm(data, stock_name)
 
         # Save results
         lstm_file = os.path.join(lstm_results_dir, f"{stock_name}_lstm_predictions.csv")
-        pd.DataFrame({"Date": data['Date'][look_back:].values, "Actual": data['Close'][look_back:].values, "Predicted": predicted_prices.flatten()}).to_csv(lstm_file, index=False)
+        with timed("io.write_csv", stock_name):
+            pd.DataFrame({"Date": data['Date'][look_back:].values, "Actual": data['Close'][look_back:].values, "Predicted": predicted_prices.flatten()}).to_csv(lstm_file, index=False)
+        write_predictions("LSTM", stock_name, data['Date'][look_back:].values, data['Close'][look_back:].values,
+                          predicted_prices.flatten(), frequency=bar_frequency)
         
         print(f"LSTM results saved for {stock_name}.")
     except Exception as e:
         print(f"Error in LSTM modeling for {stock_name}: {e}")
 
 # Function to combine ARIMA and LSTM predictions (Hybrid Model)
-def apply_hybrid(data, stock_name):
+@instrument("hybrid", profile=True)
+def apply_hybrid(data, stock_name, lstm_predictions=None):
     try:
-        # ARIMA modeling
-        ts = data['Close']
-        arima_model = ARIMA(ts, order=(5, 1, 0))
-        arima_fit = arima_model.fit()
-        arima_predictions = arima_fit.fittedvalues
-
-        # Normalize the data for LSTM
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        scaled_data = scaler.fit_transform(data['Close'].values.reshape(-1, 1))
-
-        # Prepare dataset for LSTM
-        X, Y = create_dataset(scaled_data, look_back)
-        X = X.reshape((X.shape[0], X.shape[1], 1))
-
-        # Build and train the LSTM model
-        lstm_model = Sequential()
-        lstm_model.add(Input(shape=(X.shape[1], 1)))  # Updated to use Input layer
-        lstm_model.add(LSTM(units=50, return_sequences=True))
-        lstm_model.add(LSTM(units=50))
-        lstm_model.add(Dense(units=1))
-        lstm_model.compile(optimizer='adam', loss='mean_squared_error')
-        lstm_model.fit(X, Y, epochs=20, batch_size=32, verbose=0)
-
-        # Make LSTM predictions
-        lstm_predictions = lstm_model.predict(X)
-        lstm_predictions = scaler.inverse_transform(lstm_predictions)
+        # ARIMA modeling, reusing the fit stored by the ARIMA stage
+        order = resolve_order(stock_name, data, arima_order)
+        _, arima_predictions = cached_arima_fit(stock_name, data, order)
+
+        # LSTM predictions, reusing the model trained by apply_lstm
+        if lstm_predictions is None:
+            lstm_predictions = train_lstm(data, stock_name)
 
         # Combine ARIMA and LSTM predictions
         hybrid_predictions = 0.5 * arima_predictions[look_back:] + 0.5 * lstm_predictions.flatten()
 
         # Save results
         hybrid_file = os.path.join(hybrid_results_dir, f"{stock_name}_hybrid_predictions.csv")
-        pd.DataFrame({"Date": data['Date'][look_back:].values, "Actual": data['Close'][look_back:].values, "Hybrid_Predicted": hybrid_predictions}).to_csv(hybrid_file, index=False)
+        with timed("io.write_csv", stock_name):
+            pd.DataFrame({"Date": data['Date'][look_back:].values, "Actual": data['Close'][look_back:].values, "Hybrid_Predicted": hybrid_predictions}).to_csv(hybrid_file, index=False)
+        write_predictions("Hybrid", stock_name, data['Date'][look_back:].values, data['Close'][look_back:].values,
+                          hybrid_predictions, frequency=bar_frequency)
 
         print(f"Hybrid model results saved for {stock_name}.")
     except Exception as e:
         print(f"Error in Hybrid modeling for {stock_name}: {e}")
 
-# Process each stock in the selected data directory
-for file in os.listdir(selected_data_dir):
-    if file.endswith(".csv"):
-        stock_name = file.replace(".csv", "")
-        file_path = os.path.join(selected_data_dir, file)
-
-        try:
+# Function to run the LSTM and Hybrid models of one stock, recording the peak memory of the stock alone
+def process_stock(stock_name, predicted_prices=None):
+    try:
+        with timed("lstm.stock", stock_name, reset_peak=bounded_memory_mode):
             # Load the data
-            data = pd.read_csv(file_path)
-            data['Date'] = pd.to_datetime(data['Date'])
+            data = load_bars(selected_view, stock_name, bar_frequency)
 
             # Apply LSTM
-            apply_lstm(data, stock_name)
+            apply_lstm(data, stock_name, predicted_prices)
 
             # Apply Hybrid Model
-            apply_hybrid(data, stock_name)
+            apply_hybrid(data, stock_name, predicted_prices)
+
+            # Free the stock's data and windows before the next stock, so memory stays flat across the universe
+            if bounded_memory_mode:
+                gc.collect()
+
+    except Exception as e:
+        print(f"Error processing {stock_name}: {e}")
+
+# Function to set up a worker process with the settings of the process that started it
+def init_worker(settings):
+    pin_blas_threads()
+    globals().update(settings)
 
+# Function to run the LSTM and Hybrid models for the given stocks
+def run_lstm_stage(stock_names):
+    # Bars are resampled once here, so the workers only read them from the cache
+    if bar_frequency:
+        resample_view(selected_view, bar_frequency, list_tickers(selected_view) if global_model_mode else stock_names)
+
+    global_predictions = {}
+    if global_model_mode:
+        # The global model is trained on every selected stock, whichever stocks are being written
+        datasets = {stock_name: load_bars(selected_view, stock_name, bar_frequency)
+                    for stock_name in list_tickers(selected_view)}
+        try:
+            global_predictions = train_global_lstm(datasets)
         except Exception as e:
-            print(f"Error processing {file}: {e}")
+            print(f"Error in global LSTM modeling: {e}")
+            return
+
+    if bounded_memory_mode and recycle_workers:
+        # Whatever a worker leaks is returned to the OS when it is replaced
+        settings = {name: globals()[name] for name in worker_settings}
+        with recycled_pool(n_workers, stocks_per_worker, init_worker, (settings,)) as pool:
+            pool.starmap(process_stock, [(stock_name, global_predictions.get(stock_name)) for stock_name in stock_names],
+                         chunksize=1)
+        return
+
+    for stock_name in stock_names:
+        process_stock(stock_name, global_predictions.get(stock_name))
+
+if __name__ == "__main__":
+    # Process each stock in the selected view of the price store
+    run_lstm_stage(list_tickers(selected_view))
+    write_run_report()
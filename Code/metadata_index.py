@@ -0,0 +1,179 @@
+import os
+import re
+import sys
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+from fetch_layer import (fetch_concurrently, fetch_ticker_metadata, load_metadata_cache, make_session, max_workers,
+                         metadata_max_age_days)
+from instrumentation import instrument, write_run_report
+
+# Directories
+code_dir = os.path.dirname(os.path.abspath(__file__))
+universe_file = os.path.join(code_dir, "nse_universe.csv")  # Ticker, Sector and Shortlisted flag of every stock tracked
+metadata_db_file = "metadata_index.sqlite"
+
+# Index Parameters
+metadata_columns = {  # Column of the index: key of the yfinance info it is read from
+    "name": "shortName",
+    "market_cap": "marketCap",
+    "pe_ratio": "trailingPE",
+    "volume": "volume",
+    "previous_close": "regularMarketPreviousClose",
+    "dividend_yield": "dividendYield",
+}
+query_pattern = re.compile(r"^\s*(?:(top|bottom)\s+(\d+)\s+by\s+(\w+)\s*)?(?:per\s+(\w+)\s*)?(?:where\s+(.+))?$",
+                           re.IGNORECASE)
+
+# Function to open the metadata index, creating its table and indexes on first use, and close it afterwards
+@contextmanager
+def connect():
+    connection = sqlite3.connect(metadata_db_file, timeout=30)
+    try:
+        initialise(connection)
+        sync_universe(connection)
+        yield connection
+    finally:
+        connection.close()
+
+# Function to create the table and indexes of the metadata index
+def initialise(connection):
+    connection.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked while a refresh writes
+    connection.execute(f"""
+        CREATE TABLE IF NOT EXISTS tickers (
+            ticker TEXT PRIMARY KEY,
+            sector TEXT,
+            shortlisted INTEGER DEFAULT 0,
+            {", ".join(f"{column} {'TEXT' if column == 'name' else 'REAL'}" for column in metadata_columns)},
+            data_from TEXT,
+            data_to TEXT,
+            fetched_at TEXT
+        )""")
+    connection.execute("CREATE INDEX IF NOT EXISTS sector_market_cap ON tickers (sector, market_cap DESC)")
+    connection.execute("CREATE INDEX IF NOT EXISTS market_cap ON tickers (market_cap DESC)")
+    connection.execute("CREATE INDEX IF NOT EXISTS fetched_at ON tickers (fetched_at)")
+    connection.execute("CREATE TABLE IF NOT EXISTS index_state (key TEXT PRIMARY KEY, value TEXT)")
+
+# Function to load the universe file into the index when it changed, keeping the metadata already fetched
+def sync_universe(connection):
+    modified = str(os.stat(universe_file).st_mtime_ns)
+    state = connection.execute("SELECT value FROM index_state WHERE key = 'universe_mtime'").fetchone()
+    if state and state[0] == modified:
+        return
+
+    universe = pd.read_csv(universe_file)
+    with connection:
+        connection.executemany(
+            "INSERT INTO tickers (ticker, sector, shortlisted) VALUES (?, ?, ?) "
+            "ON CONFLICT(ticker) DO UPDATE SET sector = excluded.sector, shortlisted = excluded.shortlisted",
+            universe[["Ticker", "Sector", "Shortlisted"]].itertuples(index=False, name=None))
+        placeholders = ", ".join("?" * len(universe))
+        connection.execute(f"DELETE FROM tickers WHERE ticker NOT IN ({placeholders})", list(universe["Ticker"]))
+        connection.execute("INSERT OR REPLACE INTO index_state VALUES ('universe_mtime', ?)", (modified,))
+
+# Function to list every ticker of the universe
+def universe():
+    with connect() as connection:
+        return [row[0] for row in connection.execute("SELECT ticker FROM tickers ORDER BY ticker")]
+
+# Function to turn one fetched metadata entry (see fetch_layer.fetch_ticker_metadata) into a row of the index
+def metadata_row(ticker, entry):
+    info = entry.get("info", {})
+    row = {"ticker": ticker, "data_from": entry.get("data_from"), "data_to": entry.get("data_to"),
+           "fetched_at": entry.get("fetched_at")}
+    for column, key in metadata_columns.items():
+        value = info.get(key)
+        row[column] = value if column == "name" else pd.to_numeric(value, errors="coerce")
+    return {column: None if pd.isna(value) else value for column, value in row.items()}
+
+# Function to store fetched metadata rows
+def save_rows(connection, rows):
+    if not rows:
+        return
+    columns = list(rows[0])
+    with connection:
+        connection.executemany(
+            f"UPDATE tickers SET {', '.join(f'{column} = ?' for column in columns[1:])} WHERE ticker = ?",
+            [[row[column] for column in columns[1:]] + [row["ticker"]] for row in rows])
+
+# Function to fetch the metadata of the tickers missing or stale in the index, leaving fresh rows untouched
+@instrument("metadata_refresh")
+def refresh(tickers=None, max_age_days=metadata_max_age_days, fetch_fn=None, workers=max_workers):
+    with connect() as connection:
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat(timespec="seconds")
+        stale = [row[0] for row in connection.execute(
+            "SELECT ticker FROM tickers WHERE fetched_at IS NULL OR fetched_at < ? ORDER BY ticker", (cutoff,))]
+        if tickers is not None:
+            stale = sorted(set(stale) & set(tickers))
+
+        # Entries still fresh in the older JSON metadata cache are imported instead of fetched again
+        cache = load_metadata_cache()
+        imported = [metadata_row(ticker, cache[ticker]) for ticker in stale
+                    if ticker in cache and cache[ticker].get("fetched_at", "") >= cutoff]
+        save_rows(connection, imported)
+        stale = sorted(set(stale) - {row["ticker"] for row in imported})
+        if not stale:
+            return 0
+
+        if fetch_fn is None:
+            session = make_session(workers)
+            fetch_fn = lambda ticker: fetch_ticker_metadata(ticker, session)
+        print(f"Fetching metadata for {len(stale)} tickers...")
+        results, errors = fetch_concurrently(stale, fetch_fn, workers=workers)
+        for ticker, error in errors.items():
+            print(f"Failed to fetch metadata for {ticker}: {error}")
+        save_rows(connection, [metadata_row(ticker, entry) for ticker, entry in results.items()])
+        return len(results)
+
+# Function to load the whole index (or the given tickers) as a DataFrame
+def load_index(tickers=None):
+    with connect() as connection:
+        index = pd.read_sql_query("SELECT * FROM tickers ORDER BY ticker", connection)
+    return index if tickers is None else index[index["ticker"].isin(tickers)]
+
+# Function to translate a selection query into SQL. Queries read
+# "[top|bottom N by <column>] [per <column>] [where <SQL condition>]", for example
+# "top 3 by market_cap per sector", "top 100 by volume where pe_ratio < 40" or "where shortlisted = 1"
+def query_sql(query):
+    match = query_pattern.match(query)
+    if match is None:
+        raise ValueError(f"Cannot parse selection query: {query!r}")
+    direction, count, order_column, group_column, condition = match.groups()
+    known = {"ticker", "sector", "shortlisted", "data_from", "data_to", "fetched_at", *metadata_columns}
+    for column in (order_column, group_column):
+        if column is not None and column not in known:
+            raise ValueError(f"Unknown column {column!r} in selection query, use one of {sorted(known)}")
+
+    if group_column is not None and order_column is None:
+        raise ValueError(f"Selection query {query!r} groups by {group_column!r} without a 'top|bottom N by' ranking")
+
+    # Stocks selected without a ranking are listed grouped by sector, as the shortlist always was
+    where = f"WHERE ({condition})" if condition else ""
+    if order_column is None:
+        return f"SELECT ticker FROM tickers {where} ORDER BY sector, ticker"
+
+    # Rows without a value for the ranking column cannot be ranked, so they are never selected
+    where = f"{where} AND {order_column} IS NOT NULL" if where else f"WHERE {order_column} IS NOT NULL"
+    order = "DESC" if direction.lower() == "top" else "ASC"
+    partition = f"PARTITION BY {group_column}" if group_column else ""
+    return (f"SELECT ticker FROM (SELECT ticker, {group_column or 'NULL'} AS grp, "
+            f"ROW_NUMBER() OVER ({partition} ORDER BY {order_column} {order}) AS position FROM tickers {where}) "
+            f"WHERE position <= {int(count)} ORDER BY grp, position")
+
+# Function to select the tickers matching a query against the index
+def select_universe(query):
+    with connect() as connection:
+        return [row[0] for row in connection.execute(query_sql(query))]
+
+if __name__ == "__main__":
+    # Usage: python metadata_index.py [--refresh] [query] : refresh the stale metadata and print the tickers a query selects
+    args = sys.argv[1:]
+    if "--refresh" in args:
+        print(f"Metadata of {refresh()} tickers fetched into {metadata_db_file}.")
+    query = " ".join(arg for arg in args if not arg.startswith("--"))
+    if query:
+        print("\n".join(select_universe(query)))
+    else:
+        print(load_index().to_string(index=False))
+    write_run_report()
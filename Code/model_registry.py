@@ -0,0 +1,88 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+from instrumentation import timed
+from price_store import data_hash
+
+# Directories
+registry_dir = "model_registry"
+
+# Function to build the registry key of a model from its ticker, training data and hyperparameters
+def make_key(ticker, data, params):
+    payload = json.dumps({"data": data_hash(data), "params": params}, sort_keys=True, default=str)
+    return f"{ticker}-{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+# Function to get the directory holding the artifacts of one model
+def artifact_dir(kind, key):
+    return os.path.join(registry_dir, kind, key)
+
+# Function to get the path of one artifact, creating its directory when saving
+def artifact_path(kind, key, name, create=False):
+    directory = artifact_dir(kind, key)
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+# Function to check whether all the named artifacts of a model are stored
+def has_artifacts(kind, key, names):
+    return all(os.path.exists(artifact_path(kind, key, name)) for name in names)
+
+# Function to save a prediction array
+def save_predictions(kind, key, predictions, name="predictions.npy"):
+    path = artifact_path(kind, key, name, create=True)
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, np.asarray(predictions))
+    os.replace(f"{path}.tmp", path)
+
+# Function to load a prediction array
+def load_predictions(kind, key, name="predictions.npy"):
+    return np.load(artifact_path(kind, key, name))
+
+# Function to save any picklable artifact (fitted scalers, ARIMA results)
+def save_object(kind, key, name, obj):
+    path = artifact_path(kind, key, name, create=True)
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(f"{path}.tmp", path)
+
+# Function to load a pickled artifact
+def load_object(kind, key, name):
+    with open(artifact_path(kind, key, name), "rb") as f:
+        return pickle.load(f)
+
+# Function to save a trained Keras model with its weights
+def save_keras_model(kind, key, model, name="model.keras"):
+    model.save(artifact_path(kind, key, name, create=True))
+
+# Function to load a trained Keras model
+def load_keras_model(kind, key, name="model.keras"):
+    from keras.models import load_model
+    return load_model(artifact_path(kind, key, name))
+
+# Function to save the weights of a trained Keras LSTM for NumPy inference (see numpy_lstm.py)
+def save_numpy_weights(kind, key, model, name="weights.npz"):
+    from numpy_lstm import export_weights
+    export_weights(model, artifact_path(kind, key, name, create=True))
+
+# Function to load a stored LSTM as a NumPy model, exporting its weights from the Keras model first if needed
+def load_numpy_model(kind, key, name="weights.npz", keras_name="model.keras"):
+    from numpy_lstm import NumpyLSTM, load_weights
+    if not has_artifacts(kind, key, [name]):
+        save_numpy_weights(kind, key, load_keras_model(kind, key, keras_name), name)
+    return NumpyLSTM(load_weights(artifact_path(kind, key, name)))
+
+# Function to fit an ARIMA model, or load it and its fitted values if the same fit is already stored
+def cached_arima_fit(stock_name, data, order):
+    from statsmodels.tsa.arima.model import ARIMA
+
+    key = make_key(stock_name, data[['Date', 'Close']], {"model": "arima", "order": list(order)})
+    if has_artifacts("arima", key, ["results.pkl", "predictions.npy"]):
+        return load_object("arima", key, "results.pkl"), load_predictions("arima", key)
+
+    with timed("arima.fit", stock_name):
+        arima_fit = ARIMA(data['Close'], order=order).fit()
+    save_object("arima", key, "results.pkl", arima_fit)
+    save_predictions("arima", key, arima_fit.fittedvalues)
+    return arima_fit, np.asarray(arima_fit.fittedvalues)
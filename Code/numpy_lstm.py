@@ -0,0 +1,134 @@
+import sys
+import time
+import numpy as np
+
+# Inference Parameters
+inference_dtype = np.float32  # float32 halves the memory and time of the forward pass; float64 matches Keras more closely
+check_tolerance = 1e-4  # Largest absolute difference (in scaled units) from Keras accepted by check_against_keras
+check_windows = 256  # Windows per stock compared with Keras
+
+# Function to get the weights of a trained LSTM/Dense Keras model (optionally with a ticker embedding) as NumPy arrays
+def model_weights(model, dtype=inference_dtype):
+    arrays, n_lstm = {}, 0
+    for layer in model.layers:
+        kind = type(layer).__name__
+        weights = layer.get_weights()
+        if kind == "LSTM":
+            arrays[f"lstm_{n_lstm}_kernel"], arrays[f"lstm_{n_lstm}_recurrent"], arrays[f"lstm_{n_lstm}_bias"] = weights
+            n_lstm += 1
+        elif kind == "Dense":
+            arrays["dense_kernel"], arrays["dense_bias"] = weights
+        elif kind == "Embedding":
+            arrays["embedding"] = weights[0]
+    return {"n_lstm": np.array(n_lstm), **{name: array.astype(dtype) for name, array in arrays.items()}}
+
+# Function to export the weights of a trained Keras model to an .npz file, which only needs NumPy to run afterwards
+def export_weights(model, path):
+    with open(path, "wb") as f:
+        np.savez(f, **model_weights(model, np.float32))
+
+# Function to load exported weights in the given precision
+def load_weights(path, dtype=inference_dtype):
+    with np.load(path) as arrays:
+        return {name: arrays[name] if name == "n_lstm" else arrays[name].astype(dtype) for name in arrays.files}
+
+# Function to stack the weights of several models of the same shape, so one forward pass can run all of them.
+# The result runs with one window per model (row i of the batch through model i).
+def stack_weights(weight_sets):
+    return {name: weight_sets[0][name] if name == "n_lstm" else np.stack([weights[name] for weights in weight_sets])
+            for name in weight_sets[0]}
+
+# Function to get the logistic sigmoid used by the Keras LSTM gates
+def sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+# Function to run one LSTM layer over a batch of sequences (batch, steps, features), returning every hidden state.
+# Weights may carry a leading batch axis (stacked models), the matrix products broadcast over it.
+def lstm_layer(x, kernel, recurrent, bias):
+    batch, steps = x.shape[:2]
+    units = recurrent.shape[-2]
+    bias = bias[:, np.newaxis, :] if bias.ndim == 2 else bias
+
+    # The input part of every gate is computed for all time steps at once (step-major), only the recurrence is stepped
+    projected = np.ascontiguousarray(np.swapaxes(np.matmul(x, kernel) + bias, 0, 1))
+    stacked = recurrent.ndim == 3
+    h = np.zeros((batch, units), dtype=x.dtype)
+    c = np.zeros((batch, units), dtype=x.dtype)
+    hidden = np.empty((batch, steps, units), dtype=x.dtype)
+    for step in range(steps):
+        gates = projected[step] + (np.matmul(h[:, np.newaxis, :], recurrent)[:, 0] if stacked else h @ recurrent)
+        # Keras gate order: input, forget, cell, output
+        activated = sigmoid(gates)
+        c = activated[:, units:2 * units] * c + activated[:, :units] * np.tanh(gates[:, 2 * units:3 * units])
+        h = activated[:, 3 * units:] * np.tanh(c)
+        hidden[:, step] = h
+    return hidden
+
+# Function to run the model forward on a batch of windows (batch, look_back, 1), with ticker ids for embedding models
+def forward(weights, windows, ticker_ids=None):
+    dtype = weights["dense_kernel"].dtype
+    x = np.asarray(windows, dtype=dtype)
+    if "embedding" in weights:
+        # The ticker embedding is repeated along the window, after the window's own feature
+        embedded = weights["embedding"][np.asarray(ticker_ids).reshape(-1)]
+        x = np.concatenate([x, np.repeat(embedded[:, np.newaxis, :], x.shape[1], axis=1)], axis=2)
+
+    for layer in range(int(weights["n_lstm"])):
+        x = lstm_layer(x, weights[f"lstm_{layer}_kernel"], weights[f"lstm_{layer}_recurrent"], weights[f"lstm_{layer}_bias"])
+    bias = weights["dense_bias"][:, np.newaxis, :] if weights["dense_bias"].ndim == 2 else weights["dense_bias"]
+    return (np.matmul(x[:, -1][:, np.newaxis, :], weights["dense_kernel"]) + bias)[:, 0]
+
+# NumPy model exposing the predict calls of a Keras model
+class NumpyLSTM:
+    def __init__(self, weights):
+        self.weights = weights
+
+    def predict_on_batch(self, inputs):
+        if isinstance(inputs, (list, tuple)):
+            return forward(self.weights, inputs[0], inputs[1])
+        return forward(self.weights, inputs)
+
+    def predict(self, inputs, batch_size=1024):
+        windows = np.asarray(inputs)
+        return np.concatenate([forward(self.weights, windows[start:start + batch_size])
+                               for start in range(0, len(windows), batch_size)])
+
+# Function to check a NumPy model against its Keras model on the given windows, returning the largest difference
+def check_against_keras(keras_model, weights, windows, ticker_ids=None):
+    keras_inputs = [windows, ticker_ids] if ticker_ids is not None else windows
+    expected = np.asarray(keras_model.predict_on_batch(keras_inputs))
+    return float(np.max(np.abs(forward(weights, windows, ticker_ids) - expected)))
+
+if __name__ == "__main__":
+    # Check the exported weights of every stored per-stock LSTM against Keras, exporting them first where missing
+    import os
+    import lstm_hybrid_analysis_modified as lstm
+    from bar_resampler import load_bars
+    from model_registry import artifact_dir, artifact_path, has_artifacts, load_keras_model, load_object
+    from price_store import list_tickers
+
+    dtype = np.float64 if "--float64" in sys.argv else inference_dtype
+    failures = 0
+    for stock_name in list_tickers(lstm.selected_view):
+        data = load_bars(lstm.selected_view, stock_name, lstm.bar_frequency)
+        key = lstm.lstm_key(data, stock_name)
+        if not os.path.isdir(artifact_dir("lstm", key)):
+            print(f"No stored LSTM for {stock_name}.")
+            continue
+        keras_model = load_keras_model("lstm", key)
+        if not has_artifacts("lstm", key, ["weights.npz"]):
+            export_weights(keras_model, artifact_path("lstm", key, "weights.npz"))
+
+        weights = load_weights(artifact_path("lstm", key, "weights.npz"), dtype)
+        scaled = load_object("lstm", key, "scaler.pkl").transform(data[['Close']].values).reshape(-1)
+        X, _ = lstm.create_dataset(scaled, lstm.look_back)
+        windows = np.ascontiguousarray(X[-check_windows:], dtype=np.float32)
+
+        start_time = time.perf_counter()
+        forward(weights, windows)
+        numpy_ms = (time.perf_counter() - start_time) * 1000
+        difference = check_against_keras(keras_model, weights, windows)
+        failures += difference > check_tolerance
+        print(f"{stock_name}: max difference from Keras {difference:.2e} over {len(windows)} windows, "
+              f"NumPy forward pass {numpy_ms:.1f}ms ({np.dtype(dtype).name}).")
+    sys.exit(1 if failures else 0)
@@ -1,71 +1,176 @@
 import os
+import warnings
 import pandas as pd
 import numpy as np
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+import prediction_store
+from bar_resampler import frequency_name, frequency_option
+from instrumentation import instrument, timed, write_run_report
 
-# Directories
-lstm_results_dir = "lstm_results"
-hybrid_results_dir = "hybrid_results"
-arima_results_dir = "arima_prediction_results"
-evaluation_results_dir = "evaluation_results"
+# Bar frequency evaluated, from --bars; every model is read and evaluated at this one frequency
+bar_frequency = frequency_option()
+
+# Directories (one of each per bar frequency)
+lstm_results_dir = frequency_name("lstm_results", bar_frequency)
+hybrid_results_dir = frequency_name("hybrid_results", bar_frequency)
+arima_results_dir = frequency_name("arima_prediction_results", bar_frequency)
+walk_forward_results_dir = frequency_name("walk_forward_results", bar_frequency)
+evaluation_results_dir = frequency_name("evaluation_results", bar_frequency)
 os.makedirs(evaluation_results_dir, exist_ok=True)
 
-# Function to calculate evaluation metrics
-def evaluate_model(actual, predicted):
-    mae = mean_absolute_error(actual, predicted)
-    rmse = np.sqrt(mean_squared_error(actual, predicted))
-    mape = np.mean(np.abs((actual - predicted) / actual)) * 100
-    return mae, rmse, mape
-
-# Function to evaluate results and save metrics
-def evaluate_results(results_dir, evaluation_file):
-    evaluation_data = []
-
-    for file in os.listdir(results_dir):
-        if file.endswith(".csv"):
-            stock_name = file.replace(".csv", "")
-            file_path = os.path.join(results_dir, file)
-
-            try:
-                # Load the results
-                data = pd.read_csv(file_path)
-                actual = data['Actual'].values
-
-                if 'Predicted' in data.columns:
-                    predicted = data['Predicted'].values
-                elif 'Hybrid_Predicted' in data.columns:
-                    predicted = data['Hybrid_Predicted'].values
-                else:
-                    print(f"No prediction column found in {file}")
-                    continue
-
-                # Evaluate the model
-                mae, rmse, mape = evaluate_model(actual, predicted)
-
-                # Append results
-                evaluation_data.append({
-                    "Stock": stock_name,
-                    "MAE": mae,
-                    "RMSE": rmse,
-                    "MAPE": mape
-                })
-
-            except Exception as e:
-                print(f"Error evaluating {file}: {e}")
-
-    # Save evaluation results
-    evaluation_df = pd.DataFrame(evaluation_data)
-    evaluation_df.to_csv(evaluation_file, index=False)
-    print(f"Evaluation results saved to {evaluation_file}")
-
-# Evaluate LSTM Results
-lstm_evaluation_file = os.path.join(evaluation_results_dir, "lstm_evaluation_metrics.csv")
-evaluate_results(lstm_results_dir, lstm_evaluation_file)
-
-# Evaluate Hybrid Model Results
-hybrid_evaluation_file = os.path.join(evaluation_results_dir, "hybrid_evaluation_metrics.csv")
-evaluate_results(hybrid_results_dir, hybrid_evaluation_file)
-
-# Evaluate ARIMA Results
-arima_evaluation_file = os.path.join(evaluation_results_dir, "arima_evaluation_metrics.csv")
-evaluate_results(arima_results_dir, arima_evaluation_file)
+# Results directory, prediction file suffix and metrics file of each model
+model_results = {
+    "LSTM": (lstm_results_dir, "_lstm_predictions", "lstm_evaluation_metrics.csv"),
+    "Hybrid": (hybrid_results_dir, "_hybrid_predictions", "hybrid_evaluation_metrics.csv"),
+    "ARIMA": (arima_results_dir, "_arima_predictions", "arima_evaluation_metrics.csv"),
+    "Walk-Forward ARIMA": (walk_forward_results_dir, "_walk_forward_predictions", "walk_forward_evaluation_metrics.csv"),
+}
+metric_columns = ["MAE", "RMSE", "MAPE", "sMAPE", "MASE", "Directional_Accuracy"]
+
+# Function to list the per-ticker prediction CSV files (model, ticker, path) of the given models and tickers
+def list_csv_predictions(models, tickers=None):
+    files = []
+    for model, (results_dir, suffix, _) in models.items():
+        if not os.path.isdir(results_dir):
+            continue
+        for file in sorted(os.listdir(results_dir)):
+            ticker = file[:-len(f"{suffix}.csv")]
+            if file.endswith(f"{suffix}.csv") and (tickers is None or ticker in tickers):
+                files.append((model, ticker, os.path.join(results_dir, file)))
+    return files
+
+# Function to list the prediction CSV files of the models and tickers the prediction store holds nothing for
+def csv_fallback_files(models=model_results, tickers=None, frequency=bar_frequency):
+    stored = {(model, ticker) for model, ticker, *_ in
+              prediction_store.list_partitions(list(models), tickers, frequency=frequency)}
+    return [(model, ticker, path) for model, ticker, path in list_csv_predictions(models, tickers)
+            if (model, ticker) not in stored]
+
+# Function to load prediction CSV files (model, ticker, path) into one long table
+def load_csv_predictions(files):
+    frames = []
+    for model, ticker, path in files:
+        file = os.path.basename(path)
+        try:
+            with timed("io.read_csv", file):
+                data = pd.read_csv(path)
+            prediction_column = "Predicted" if "Predicted" in data.columns else "Hybrid_Predicted"
+            if prediction_column not in data.columns:
+                print(f"No prediction column found in {file}")
+                continue
+            frames.append(pd.DataFrame({
+                "Model": model,
+                "Ticker": ticker,
+                "Date": data["Date"].values,
+                "Actual": data["Actual"].values,
+                "Predicted": data[prediction_column].values,
+            }))
+        except Exception as e:
+            print(f"Error loading {file}: {e}")
+
+    if not frames:
+        return pd.DataFrame(columns=["Model", "Ticker", "Date", "Actual", "Predicted"])
+    return pd.concat(frames, ignore_index=True)
+
+# Function to load the latest predictions of every model at one bar frequency into one long table, from the
+# prediction store. Only the partitions of the requested models and tickers are read, and only the row groups within
+# the dates; each model and ticker the store holds nothing for (runs from before the store, partial runs) falls back
+# to its prediction CSV file. The CSV files of the model_results directories must be of the same bar frequency.
+def load_predictions(models=model_results, tickers=None, start=None, end=None, frequency=bar_frequency):
+    stored = prediction_store.read_predictions(list(models), tickers, start=start, end=end,
+                                               frequency=frequency).drop(columns="Run")
+    fallback = csv_fallback_files(models, tickers, frequency)
+    if not fallback:
+        return stored
+    csv_predictions = load_csv_predictions(fallback)
+    csv_predictions["Date"] = pd.to_datetime(csv_predictions["Date"])
+    if start is not None:
+        csv_predictions = csv_predictions[csv_predictions["Date"] >= pd.Timestamp(start)]
+    if end is not None:
+        csv_predictions = csv_predictions[csv_predictions["Date"] <= pd.Timestamp(end)]
+    return pd.concat([stored, csv_predictions], ignore_index=True)
+
+# Function to align all predictions into (model x ticker x date) arrays
+def build_panel(predictions):
+    predictions = predictions.copy()
+    # Previous actual of the same series, used by MASE and directional accuracy
+    predictions["Previous"] = predictions.groupby(["Model", "Ticker"], sort=False)["Actual"].shift(1)
+
+    model_codes, models = pd.factorize(predictions["Model"])
+    ticker_codes, tickers = pd.factorize(predictions["Ticker"], sort=True)
+    date_codes, dates = pd.factorize(pd.to_datetime(predictions["Date"]), sort=True)
+
+    shape = (len(models), len(tickers), len(dates))
+    panel = {"models": list(models), "tickers": list(tickers), "dates": dates}
+    for column in ["Actual", "Predicted", "Previous"]:
+        values = np.full(shape, np.nan)
+        values[model_codes, ticker_codes, date_codes] = predictions[column].to_numpy(dtype=float)
+        panel[column] = values
+    return panel
+
+# Function to compute every metric for every (model, ticker) pair in vectorized passes over the panel
+def compute_metrics(panel):
+    actual, predicted, previous = panel["Actual"], panel["Predicted"], panel["Previous"]
+    error = predicted - actual
+    abs_error = np.abs(error)
+    valid = ~np.isnan(error)
+    count = valid.sum(axis=2)
+
+    # (model, ticker) pairs with no predictions are empty slices, they come out as NaN and are dropped below
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mae = np.nanmean(abs_error, axis=2)
+        rmse = np.sqrt(np.nanmean(error ** 2, axis=2))
+
+        # Zero actuals (and zero denominators) are left out instead of producing infinities
+        nonzero_actual = np.where(actual != 0, np.abs(actual), np.nan)
+        mape = np.nanmean(abs_error / nonzero_actual, axis=2) * 100
+
+        smape_denominator = np.abs(actual) + np.abs(predicted)
+        smape = np.nanmean(np.where(smape_denominator > 0, 2 * abs_error / smape_denominator, np.nan), axis=2) * 100
+
+        # MASE scales the MAE by the in-sample MAE of the naive previous-value forecast
+        naive_mae = np.nanmean(np.abs(actual - previous), axis=2)
+        mase = np.where(naive_mae > 0, mae / naive_mae, np.nan)
+
+        actual_move = np.sign(actual - previous)
+        predicted_move = np.sign(predicted - previous)
+        has_move = ~np.isnan(actual_move) & ~np.isnan(predicted_move)
+        directional_accuracy = np.where(has_move, actual_move == predicted_move, False).sum(axis=2) / has_move.sum(axis=2) * 100
+
+    model_index, ticker_index = np.nonzero(count > 0)
+    metrics = pd.DataFrame({
+        "Model": np.asarray(panel["models"], dtype=object)[model_index],
+        "Ticker": np.asarray(panel["tickers"], dtype=object)[ticker_index],
+        "Observations": count[model_index, ticker_index],
+    })
+    for name, values in zip(metric_columns, [mae, rmse, mape, smape, mase, directional_accuracy]):
+        metrics[name] = values[model_index, ticker_index]
+    return metrics
+
+# Function to evaluate all model results and save the per-model and combined metrics
+@instrument("metrics", profile=True)
+def evaluate_results(models=model_results, evaluation_dir=evaluation_results_dir):
+    metrics = compute_metrics(build_panel(load_predictions(models)))
+
+    # Per-model files keep their original layout, keyed by prediction file name
+    for model, (_, suffix, evaluation_file) in models.items():
+        model_metrics = metrics[metrics["Model"] == model]
+        if model_metrics.empty:
+            continue
+        evaluation_df = model_metrics.assign(Stock=model_metrics["Ticker"] + suffix)[["Stock"] + metric_columns]
+        evaluation_file = os.path.join(evaluation_dir, evaluation_file)
+        evaluation_df.to_csv(evaluation_file, index=False)
+        print(f"Evaluation results saved to {evaluation_file}")
+
+    # One tidy table for all models, with stock names as used in the plots
+    combined = metrics.assign(Stock=metrics["Ticker"].str.replace(r"\.NS$", "", regex=True))
+    combined = combined[["Stock"] + metric_columns + ["Observations", "Model"]]
+    combined_metrics_file = os.path.join(evaluation_dir, "combined_evaluation_metrics.csv")
+    combined.to_csv(combined_metrics_file, index=False)
+    print(f"Combined evaluation metrics saved to {combined_metrics_file}")
+    return combined
+
+if __name__ == "__main__":
+    # Evaluate LSTM, Hybrid, ARIMA and Walk-Forward ARIMA results in one pass
+    evaluate_results()
+    write_run_report()
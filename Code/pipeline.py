@@ -0,0 +1,354 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from instrumentation import enable_instrumentation, timed, write_run_report
+from price_store import list_tickers, resolve, ticker_path
+
+# Directories
+code_dir = os.path.dirname(os.path.abspath(__file__))
+pipeline_state_file = "pipeline_state.json"
+
+# Pipeline Parameters
+max_concurrent_stages = 3  # Independent stages (ARIMA, EDA and LSTM) running at the same time
+
+# Lock guarding the pipeline state shared by concurrent stages
+state_lock = threading.Lock()
+
+# Function to hash the content of a file
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to hash a cell's input files and parameters together
+def cell_hash(input_paths, params):
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode())
+    for path in sorted(input_paths):
+        digest.update(path.encode())
+        digest.update(file_hash(path).encode() if os.path.exists(path) else b"missing")
+    return digest.hexdigest()
+
+# Function to load the input hashes recorded by earlier runs
+def load_state():
+    if not os.path.exists(pipeline_state_file):
+        return {}
+    with open(pipeline_state_file) as f:
+        return json.load(f)
+
+# Function to save the recorded input hashes
+def save_state(state):
+    with state_lock:
+        tmp_file = f"{pipeline_state_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, pipeline_state_file)
+
+# Function to get the clean price file behind the selected view for a ticker
+def selected_path(ticker):
+    return ticker_path(resolve("selected")[0], ticker)
+
+# Functions running the dirty cells of each stage
+def run_fetch(tickers):
+    import fetch_data_nse_bse
+    fetch_data_nse_bse.save_fetch_cache(fetch_data_nse_bse.download_all_stock_data(tickers))
+
+def run_clean(tickers):
+    import clean_data_nse
+    for ticker in tickers:
+        clean_data_nse.clean_and_preprocess(ticker)
+
+def run_shortlist(_):
+    import shortlist_stock_data_nse
+    shortlist_stock_data_nse.filter_selected_stocks(list_tickers("clean"))
+
+def run_features(tickers):
+    import feature_engine
+    from bar_resampler import frequency_option, load_bars
+    statuses = feature_engine.update_features({ticker: load_bars("selected", ticker, frequency_option(), ["Date", "Close"])
+                                               for ticker in tickers})
+    # Features already up to date in the store still count as produced by this run
+    for ticker, status in statuses.items():
+        if status == "cached":
+            os.utime(feature_engine.meta_path(ticker))
+
+def run_arima(tickers):
+    import arima_prediction
+    arima_prediction.run_arima_stage(tickers)
+
+def run_eda(tickers):
+    import eda_arima_analysis
+    from bar_resampler import load_bars
+    for ticker in tickers:
+        eda_arima_analysis.apply_arima(load_bars("selected", ticker, eda_arima_analysis.bar_frequency), ticker)
+
+def run_lstm(tickers):
+    import lstm_hybrid_analysis_modified
+    lstm_hybrid_analysis_modified.run_lstm_stage(tickers)
+
+def run_walk_forward(tickers):
+    import walk_forward_backtest
+    walk_forward_backtest.run_backtest(tickers)
+
+def run_metrics(_):
+    import performance_matrix
+    performance_matrix.evaluate_results()
+
+def run_hypothesis(_):
+    subprocess.run([sys.executable, os.path.join(code_dir, "hypothesis_code.py"), "--no-plots"], check=True)
+
+def run_plots(cells):
+    import render_plots
+    jobs = []
+    for cell in cells:
+        if cell == "metrics":
+            jobs += render_plots.metric_jobs() + render_plots.hypothesis_jobs()
+        else:
+            jobs += render_plots.arima_jobs([cell]) + render_plots.eda_jobs([cell])
+    render_plots.render_jobs(jobs)
+
+# Functions listing the parameters of each stage, part of every cell's hash
+def arima_params():
+    import arima_prediction
+    import arima_order_search
+    return {"order": arima_prediction.arima_order, "use_selected_orders": arima_order_search.use_selected_orders}
+
+def lstm_params():
+    import lstm_hybrid_analysis_modified as lstm
+    params = {"look_back": lstm.look_back, "units": lstm.lstm_units, "epochs": lstm.epochs,
+              "batch_size": lstm.batch_size, "bars": lstm.bar_frequency, "arima": arima_params()}
+    if lstm.global_model_mode:
+        params["global"] = {"epochs": lstm.global_epochs, "batch_size": lstm.global_batch_size,
+                            "embedding": lstm.embedding_dim if lstm.use_ticker_embedding else 0}
+    return params
+
+# Function to list the price files an LSTM cell depends on, every selected stock for the global model
+def lstm_inputs(ticker):
+    import lstm_hybrid_analysis_modified as lstm
+    if lstm.global_model_mode:
+        return [selected_path(cell) for cell in list_tickers("selected")]
+    return [selected_path(ticker)]
+
+# Function to list every prediction file the metrics stage reads: the latest run of each model and ticker
+# in the prediction store, and the CSV files of the models and tickers the store holds nothing for
+def prediction_files():
+    import performance_matrix
+    import prediction_store
+    return prediction_store.list_files(list(performance_matrix.model_results),
+                                       frequency=performance_matrix.bar_frequency) + [
+        path for *_, path in performance_matrix.csv_fallback_files()]
+
+# Function to list the input and output files of a plots cell, in the directories of the run's bar frequency
+def plot_files(cell):
+    import render_plots
+    if cell == "metrics":
+        return [render_plots.combined_metrics_file], [os.path.join(render_plots.metric_plots_dir, "MAE_comparison.png")]
+    inputs = [os.path.join(render_plots.arima_results_dir, f"{cell}_arima_predictions.csv"),
+              os.path.join(render_plots.arima_fit_results_dir, f"{cell}_arima_fit.csv"), selected_path(cell)]
+    return inputs, [os.path.join(render_plots.arima_results_dir, f"{cell}_arima_plot.png")]
+
+# Function to list the raw tickers cleaned by the clean stage
+def raw_tickers():
+    import clean_data_nse
+    return clean_data_nse.list_raw_tickers()
+
+# Function to get the raw input file of a ticker
+def raw_path(ticker):
+    import clean_data_nse
+    store_path = ticker_path("raw", ticker)
+    return store_path if os.path.exists(store_path) else os.path.join(clean_data_nse.raw_data_dir, f"{ticker}.csv")
+
+# Stages of the pipeline: dependencies, cells, input files, parameters, output files and runner.
+# A cell re-runs only when the hash of its inputs and parameters changed or one of its outputs is missing.
+stages = {
+    "fetch": {
+        "deps": [],
+        "cells": lambda: __import__("metadata_index").universe(),
+        "inputs": lambda cell: [],
+        "params": lambda: {"run": time.strftime("%Y-%m-%d")},  # Fetched again at most once a day
+        "outputs": lambda cell: [ticker_path("raw", cell)],
+        "run": run_fetch,
+    },
+    "clean": {
+        "deps": ["fetch"],
+        "cells": raw_tickers,
+        "inputs": lambda cell: [raw_path(cell)],
+        "params": lambda: {},
+        "outputs": lambda cell: [ticker_path("clean", cell)],
+        "run": run_clean,
+    },
+    "shortlist": {
+        "deps": ["clean"],
+        "cells": lambda: ["selected"],
+        "inputs": lambda cell: [ticker_path("clean", ticker) for ticker in list_tickers("clean")],
+        "params": lambda: {"selected_stocks": __import__("metadata_index").select_universe(
+            __import__("shortlist_stock_data_nse").selection_query)},
+        "outputs": lambda cell: [os.path.join("price_store", "selected.view.json")],
+        "run": run_shortlist,
+    },
+    "features": {
+        "deps": ["shortlist"],
+        "cells": lambda: list_tickers("selected"),
+        "inputs": lambda cell: [selected_path(cell)],
+        "params": lambda: {"windows": __import__("feature_engine").feature_windows,
+                           "bars": __import__("bar_resampler").frequency_option()},
+        "outputs": lambda cell: [__import__("feature_engine").meta_path(cell)],
+        "run": run_features,
+    },
+    "arima": {
+        "deps": ["shortlist"],
+        "cells": lambda: list_tickers("selected"),
+        "inputs": lambda cell: [selected_path(cell)],
+        "params": lambda: {**arima_params(), "fast_path": __import__("arima_prediction").fast_path_mode,
+                           "bars": __import__("arima_prediction").bar_frequency},
+        "outputs": lambda cell: [os.path.join(__import__("arima_prediction").arima_results_dir,
+                                              f"{cell}_arima_predictions.csv")],
+        "run": run_arima,
+    },
+    "eda": {
+        "deps": ["features"],
+        "cells": lambda: list_tickers("selected"),
+        "inputs": lambda cell: [selected_path(cell)],
+        "params": lambda: {**arima_params(), "bars": __import__("eda_arima_analysis").bar_frequency},
+        "outputs": lambda cell: [os.path.join(__import__("eda_arima_analysis").arima_results_dir, f"{cell}_arima_fit.csv")],
+        "run": run_eda,
+    },
+    "lstm": {
+        "deps": ["features"],
+        "cells": lambda: list_tickers("selected"),
+        "inputs": lstm_inputs,
+        "params": lstm_params,
+        "outputs": lambda cell: [
+            os.path.join(__import__("lstm_hybrid_analysis_modified").lstm_results_dir, f"{cell}_lstm_predictions.csv"),
+            os.path.join(__import__("lstm_hybrid_analysis_modified").hybrid_results_dir, f"{cell}_hybrid_predictions.csv")],
+        "run": run_lstm,
+    },
+    "walk_forward": {
+        "deps": ["shortlist"],
+        "cells": lambda: list_tickers("selected"),
+        "inputs": lambda cell: [selected_path(cell)],
+        "params": lambda: {"arima": arima_params(), "train_size": __import__("walk_forward_backtest").initial_train_size,
+                           "refit_every": __import__("walk_forward_backtest").refit_every,
+                           "bars": __import__("walk_forward_backtest").bar_frequency},
+        "outputs": lambda cell: [os.path.join(__import__("walk_forward_backtest").walk_forward_results_dir,
+                                              f"{cell}_walk_forward_predictions.csv")],
+        "run": run_walk_forward,
+    },
+    "metrics": {
+        "deps": ["arima", "lstm", "walk_forward"],
+        "cells": lambda: ["metrics"],
+        "inputs": lambda cell: prediction_files(),
+        "params": lambda: {},
+        "outputs": lambda cell: [__import__("render_plots").combined_metrics_file],
+        "run": run_metrics,
+    },
+    "hypothesis": {
+        "deps": ["metrics"],
+        "cells": lambda: ["hypothesis"],
+        "inputs": lambda cell: [__import__("render_plots").combined_metrics_file],
+        "params": lambda: {},
+        "outputs": lambda cell: [],
+        "run": run_hypothesis,
+    },
+    "plots": {
+        "deps": ["arima", "eda", "metrics"],
+        "cells": lambda: list_tickers("selected") + ["metrics"],
+        "inputs": lambda cell: plot_files(cell)[0],
+        "params": lambda: {},
+        "outputs": lambda cell: plot_files(cell)[1],
+        "run": run_plots,
+    },
+}
+
+# Function to run the dirty cells of one stage and record the cells that produced their outputs
+def run_stage(name, state, force=False):
+    stage = stages[name]
+    params = stage["params"]()
+    with state_lock:
+        stage_state = state.setdefault(name, {})
+
+    # Hash every cell's inputs and keep those that changed or lost an output
+    hashes = {cell: cell_hash(stage["inputs"](cell), params) for cell in stage["cells"]()}
+    dirty = [cell for cell, current in hashes.items()
+             if force or stage_state.get(cell) != current or not all(os.path.exists(path) for path in stage["outputs"](cell))]
+    print(f"[{name}] {len(dirty)} of {len(hashes)} cells out of date.")
+    if not dirty:
+        return
+
+    start_time = time.time()
+    with timed(f"pipeline.{name}"):
+        stage["run"](dirty)
+
+    # The stage scripts report per-cell errors instead of raising, so only cells with fresh outputs are recorded
+    for cell in dirty:
+        outputs = stage["outputs"](cell)
+        if all(os.path.exists(path) and os.path.getmtime(path) >= start_time - 1 for path in outputs):
+            with state_lock:
+                stage_state[cell] = hashes[cell]
+        else:
+            print(f"[{name}] {cell} did not produce its outputs and will run again next time.")
+    save_state(state)
+    print(f"[{name}] finished in {time.time() - start_time:.1f}s.")
+
+# Function to list a set of stages together with all the stages they depend on
+def with_dependencies(names):
+    required = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in required:
+            required.add(name)
+            pending.extend(stages[name]["deps"])
+    return required
+
+# Function to run the pipeline, starting each stage as soon as the stages it depends on are done
+def run_pipeline(targets=None, skip=(), force=False):
+    required = with_dependencies(targets or list(stages)) - set(skip)
+    state = load_state()
+    done, failed, running = set(), set(), {}
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_stages) as executor:
+        while len(done) + len(failed) < len(required):
+            for name in sorted(required - done - failed - set(running.values())):
+                deps = set(stages[name]["deps"]) & required
+                if deps & failed:
+                    print(f"[{name}] skipped because a stage it depends on failed.")
+                    failed.add(name)
+                elif deps <= done:
+                    running[executor.submit(run_stage, name, state, force)] = name
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    done.add(name)
+                except Exception as e:
+                    print(f"[{name}] failed: {e}")
+                    failed.add(name)
+
+    return done, failed
+
+if __name__ == "__main__":
+    # Usage: python pipeline.py [stage ...] [--fetch] [--walk-forward] [--force] [--no-plots] [--fast-path] [--bars F]
+    args = sys.argv[1:]
+    targets = [arg for index, arg in enumerate(args)
+               if not arg.startswith("--") and (index == 0 or args[index - 1] != "--bars")] or None
+    skip = set()
+    if "--fetch" not in args:
+        skip.add("fetch")  # Downloading needs the network, so it only runs when asked for
+    if "--walk-forward" not in args and "walk_forward" not in args:
+        skip.add("walk_forward")  # The backtest refits every stock many times, so it is opt-in as well
+    if "--no-plots" in args:
+        skip.add("plots")
+    enable_instrumentation()
+    run_pipeline(targets, skip=skip, force="--force" in args)
+    write_run_report()
@@ -0,0 +1,164 @@
+import os
+import sys
+import glob
+import uuid
+import shutil
+from urllib.parse import quote, unquote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from instrumentation import instrument, run_id, write_run_report
+
+# Directories
+prediction_store_dir = "prediction_store"  # model=<model>/bars=<bars>/ticker=<ticker>/run=<run>/part-*.parquet
+
+# Store Parameters
+row_group_rows = 65536  # Rows per Parquet row group, the unit date filters can skip
+keep_runs = 3  # Latest runs kept per model, bars and ticker, older runs are deleted when a new one is written
+stored_bars = "stored"  # Bars key of predictions made on the stored bars, without a --bars frequency
+prediction_schema = pa.schema([
+    ("Date", pa.timestamp("ns")),
+    ("Actual", pa.float64()),
+    ("Predicted", pa.float64()),
+])
+partition_keys = ["model", "bars", "ticker", "run"]
+partition_schema = pa.schema([(key, pa.string()) for key in partition_keys])
+
+# Function to get the bars key of a bar frequency (None for the stored bars)
+def bars_key(frequency):
+    return frequency or stored_bars
+
+# Function to get the directory of one partition; keys are URI-encoded so names like "M&M.NS" stay valid paths
+def partition_dir(model, ticker, run, frequency=None):
+    return os.path.join(prediction_store_dir, f"model={quote(model, safe='')}",
+                        f"bars={quote(bars_key(frequency), safe='')}", f"ticker={quote(ticker, safe='')}",
+                        f"run={quote(run, safe='')}")
+
+# Function to save one model's predictions for one ticker, bar frequency and run, replacing what the same run wrote
+# before. Every writer writes its own uniquely named file, so concurrent writers never touch the same file.
+@instrument("io.write_predictions", ticker_arg="ticker")
+def write_predictions(model, ticker, dates, actual, predicted, run=None, frequency=None):
+    directory = partition_dir(model, ticker, run or run_id(), frequency)
+    os.makedirs(directory, exist_ok=True)
+    previous = glob.glob(os.path.join(directory, "part-*.parquet"))
+
+    data = pd.DataFrame({"Date": pd.to_datetime(pd.Series(dates)).astype("datetime64[ns]").values,
+                         "Actual": pd.to_numeric(pd.Series(actual), errors="coerce").astype("float64").values,
+                         "Predicted": pd.to_numeric(pd.Series(predicted), errors="coerce").astype("float64").values})
+    table = pa.Table.from_pandas(data, schema=prediction_schema, preserve_index=False).replace_schema_metadata(None)
+    path = os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet")
+    pq.write_table(table, f"{path}.tmp", row_group_size=row_group_rows, compression="zstd")
+    os.replace(f"{path}.tmp", path)
+
+    for stale in previous:
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+    prune_runs([model], [ticker], frequency=frequency)
+
+# Function to delete all but the latest runs of each model and ticker at a bar frequency, returning the number of
+# runs deleted. Run ids start with their timestamp, so sorting them puts the latest last.
+def prune_runs(models=None, tickers=None, keep=keep_runs, frequency=None):
+    runs = {}
+    for model, ticker, run, directory in list_partitions(models, tickers, frequency=frequency):
+        runs.setdefault((model, ticker), []).append((run, directory))
+    deleted = 0
+    for partitions in runs.values():
+        for _, directory in sorted(partitions)[:-keep]:
+            shutil.rmtree(directory, ignore_errors=True)
+            deleted += 1
+    return deleted
+
+# Function to list the partitions (model, ticker, run, directory) matching the given models, tickers and runs
+# at one bar frequency. Only the directories of matching models, bars and tickers are listed.
+def list_partitions(models=None, tickers=None, runs=None, frequency=None):
+    partitions = []
+    for model_dir in sorted(glob.glob(os.path.join(prediction_store_dir, "model=*"))):
+        model = unquote(os.path.basename(model_dir)[len("model="):])
+        if models is not None and model not in models:
+            continue
+        bars_dir = os.path.join(model_dir, f"bars={quote(bars_key(frequency), safe='')}")
+        for ticker_dir in sorted(glob.glob(os.path.join(glob.escape(bars_dir), "ticker=*"))):
+            ticker = unquote(os.path.basename(ticker_dir)[len("ticker="):])
+            if tickers is not None and ticker not in tickers:
+                continue
+            for run_dir in sorted(glob.glob(os.path.join(ticker_dir, "run=*"))):
+                run = unquote(os.path.basename(run_dir)[len("run="):])
+                if runs is None or run in runs:
+                    partitions.append((model, ticker, run, run_dir))
+    return partitions
+
+# Function to list the prediction files to read at a bar frequency: of the given runs, or of the latest run of each
+# model and ticker
+def list_files(models=None, tickers=None, runs=None, latest=True, frequency=None):
+    partitions = list_partitions(models, tickers, runs, frequency)
+    if latest and runs is None:
+        # Run ids start with their timestamp, so the largest one of a model and ticker is its latest run
+        newest = {}
+        for model, ticker, run, directory in partitions:
+            if (model, ticker) not in newest or run > newest[(model, ticker)][0]:
+                newest[(model, ticker)] = (run, directory)
+        directories = [directory for _, directory in newest.values()]
+    else:
+        directories = [directory for *_, directory in partitions]
+    return sorted(path for directory in directories for path in glob.glob(os.path.join(directory, "part-*.parquet")))
+
+# Function to load the predictions made at one bar frequency into one long table (Model, Ticker, Run, Date, Actual,
+# Predicted), so models run at different frequencies are never mixed.
+# Model, ticker and run filters only open the matching partitions; date filters skip row groups outside the range.
+@instrument("io.read_predictions")
+def read_predictions(models=None, tickers=None, runs=None, start=None, end=None, latest=True, frequency=None):
+    files = list_files(models, tickers, runs, latest, frequency)
+    columns = ["Model", "Ticker", "Run", "Date", "Actual", "Predicted"]
+    if not files:
+        return pd.DataFrame(columns=columns)
+
+    # The partition keys are read back from the paths of the files
+    dataset = ds.dataset(files, schema=pa.unify_schemas([prediction_schema, partition_schema]), format="parquet",
+                         partitioning=ds.HivePartitioning(partition_schema, segment_encoding="uri"),
+                         partition_base_dir=prediction_store_dir)
+    condition = None
+    if start is not None:
+        condition = ds.field("Date") >= pa.scalar(pd.Timestamp(start), pa.timestamp("ns"))
+    if end is not None:
+        before_end = ds.field("Date") <= pa.scalar(pd.Timestamp(end), pa.timestamp("ns"))
+        condition = before_end if condition is None else condition & before_end
+
+    predictions = dataset.to_table(filter=condition).to_pandas(split_blocks=True)
+    predictions = predictions.rename(columns={"model": "Model", "ticker": "Ticker", "run": "Run"})
+    return predictions[columns].sort_values(["Model", "Ticker", "Date"], kind="stable", ignore_index=True)
+
+# Function to import the per-ticker prediction CSV files of earlier versions into the store, as this process's run
+def import_csv_results(model_results, run=None, frequency=None):
+    imported = 0
+    for model, (results_dir, suffix, _) in model_results.items():
+        for path in sorted(glob.glob(os.path.join(results_dir, f"*{suffix}.csv"))):
+            try:
+                data = pd.read_csv(path)
+                # Hybrid files named their prediction column "Hybrid_Predicted"
+                prediction_column = "Predicted" if "Predicted" in data.columns else "Hybrid_Predicted"
+                ticker = os.path.basename(path)[:-len(f"{suffix}.csv")]
+                write_predictions(model, ticker, data["Date"], data["Actual"], data[prediction_column], run, frequency)
+                imported += 1
+            except Exception as e:
+                print(f"Error importing {path}: {e}")
+    return imported
+
+if __name__ == "__main__":
+    # Usage: python prediction_store.py [--import] [--prune] [--bars F] : import the prediction CSV files and delete
+    # superseded runs, then summarise the store, at the stored bars or the given bar frequency
+    from performance_matrix import bar_frequency, model_results
+    if "--import" in sys.argv:
+        print(f"Imported {import_csv_results(model_results, frequency=bar_frequency)} prediction files "
+              f"into {prediction_store_dir}.")
+    if "--prune" in sys.argv:
+        print(f"Deleted {prune_runs(frequency=bar_frequency)} superseded runs, "
+              f"keeping the latest {keep_runs} of each model and ticker.")
+    partitions = pd.DataFrame(list_partitions(frequency=bar_frequency), columns=["Model", "Ticker", "Run", "Directory"])
+    if partitions.empty:
+        print(f"No {bars_key(bar_frequency)} bar predictions stored in {prediction_store_dir}.")
+    else:
+        print(partitions.groupby("Model").agg(Tickers=("Ticker", "nunique"), Runs=("Run", "nunique")).to_string())
+    write_run_report()
@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from instrumentation import instrument
+
+# Directories
+price_store_dir = "price_store"
+
+# Typed schema shared by every stage of the store
+price_schema = pa.schema([
+    ("Date", pa.timestamp("ns")),
+    ("Close", pa.float64()),
+    ("High", pa.float64()),
+    ("Low", pa.float64()),
+    ("Open", pa.float64()),
+    ("Volume", pa.int64()),
+])
+price_columns = price_schema.names
+
+# Function to get the file holding one ticker of a stage
+def ticker_path(stage, ticker):
+    return os.path.join(price_store_dir, stage, f"{ticker}.arrow")
+
+# Function to get the file describing a view
+def view_path(view):
+    return os.path.join(price_store_dir, f"{view}.view.json")
+
+# Function to cast a price table to the store schema
+def to_store_table(data):
+    data = data[price_columns].copy()
+    data["Date"] = pd.to_datetime(data["Date"]).astype("datetime64[ns]")
+    for column in ["Close", "High", "Low", "Open"]:
+        data[column] = pd.to_numeric(data[column]).astype("float64")
+    # Raw data may still have gaps, so Volume is written as a nullable int64
+    data["Volume"] = pd.to_numeric(data["Volume"]).round().astype("Int64")
+    table = pa.Table.from_pandas(data, schema=price_schema, preserve_index=False)
+
+    # Without pandas metadata, gap-free columns read back as plain int64 rather than Int64
+    return table.replace_schema_metadata(None)
+
+# Function to save one ticker's prices to a stage of the store
+@instrument("io.save_prices", ticker_arg="ticker")
+def save_prices(stage, ticker, data):
+    path = ticker_path(stage, ticker)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Uncompressed Arrow IPC files can be memory-mapped and read without copying
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(to_store_table(data), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+# Writer streaming one ticker's prices into a stage chunk by chunk, replacing the stored file only on success
+class PriceWriter:
+    def __init__(self, stage, ticker):
+        self.path = ticker_path(stage, ticker)
+        self.tmp_path = f"{self.path}.tmp"
+        self.rows = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.writer = pa.ipc.new_file(self.tmp_path, price_schema)
+
+    def write(self, data):
+        if len(data):
+            self.writer.write_table(to_store_table(data))
+            self.rows += len(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.writer.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+# Function to save a named view (a list of tickers, kept in the given order) over a stage
+def save_view(view, stage, tickers):
+    os.makedirs(price_store_dir, exist_ok=True)
+    with open(view_path(view), "w") as f:
+        json.dump({"stage": stage, "tickers": list(tickers)}, f, indent=2)
+
+# Function to resolve a stage or view name to the stage holding the data and its tickers
+def resolve(name):
+    if os.path.exists(view_path(name)):
+        with open(view_path(name)) as f:
+            view = json.load(f)
+        return view["stage"], view["tickers"]
+
+    stage_dir = os.path.join(price_store_dir, name)
+    if not os.path.isdir(stage_dir):
+        return name, []
+    tickers = [file[:-len(".arrow")] for file in os.listdir(stage_dir) if file.endswith(".arrow")]
+    return name, sorted(tickers)
+
+# Function to list the tickers available in a stage or view
+def list_tickers(name):
+    return resolve(name)[1]
+
+# Function to check whether a ticker is stored in a stage or view
+def has_prices(name, ticker):
+    stage, tickers = resolve(name)
+    return ticker in tickers and os.path.exists(ticker_path(stage, ticker))
+
+# Function to load one ticker's prices from a stage or view as an Arrow table
+def load_table(name, ticker, columns=None):
+    stage, _ = resolve(name)
+    return feather.read_table(ticker_path(stage, ticker), columns=columns, memory_map=True)
+
+# Function to read one ticker's prices from a stage or view in record batches, without loading the whole file
+def iter_batches(name, ticker, columns=None):
+    stage, _ = resolve(name)
+    with pa.memory_map(ticker_path(stage, ticker)) as source:
+        reader = pa.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            yield batch.select(columns) if columns else batch
+
+# Function to load one ticker's prices from a stage or view as a DataFrame
+@instrument("io.load_prices", ticker_arg="ticker")
+def load_prices(name, ticker, columns=None):
+    return load_table(name, ticker, columns).to_pandas(split_blocks=True)
+
+# Function to compute a content checksum of a price table
+def data_hash(data):
+    row_hashes = pd.util.hash_pandas_object(data, index=False).values
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
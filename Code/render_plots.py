@@ -0,0 +1,216 @@
+import os
+import sys
+import pandas as pd
+from bar_resampler import frequency_name, frequency_option, load_bars
+from feature_engine import rolling_mean
+from instrumentation import timed, write_run_report
+from prediction_store import read_predictions
+from price_store import list_tickers
+from worker_pool import process_pool
+
+# Bar frequency of the stages whose plots are rendered, from --bars; None keeps the stored bars
+bar_frequency = frequency_option()
+
+# Directories (one of each per bar frequency)
+selected_view = "selected"  # Price store view holding the selected stocks
+arima_results_dir = frequency_name("arima_prediction_results", bar_frequency)
+eda_results_dir = frequency_name("eda_results", bar_frequency)
+arima_fit_results_dir = frequency_name("arima_results", bar_frequency)
+evaluation_results_dir = frequency_name("evaluation_results", bar_frequency)
+metric_plots_dir = os.path.join(evaluation_results_dir, "plots")
+hypothesis_plots_dir = os.path.join(evaluation_results_dir, "hypothesis_plots")
+combined_metrics_file = os.path.join(evaluation_results_dir, "combined_evaluation_metrics.csv")
+
+# Rendering Parameters
+parallel_mode = True  # Render in worker processes
+n_workers = None  # Number of worker processes (None = one per CPU core)
+no_plots_flag = "--no-plots"  # Command-line flag that turns rendering off
+rolling_window = 30  # Window of the rolling mean in the EDA plots (one of feature_engine.feature_windows)
+metric_titles = {
+    "MAE": ("Mean Absolute Error (MAE) Comparison", "Mean Absolute Error"),
+    "RMSE": ("Root Mean Squared Error (RMSE) Comparison", "Root Mean Squared Error"),
+    "MAPE": ("Mean Absolute Percentage Error (MAPE) Comparison", "Mean Absolute Percentage Error (%)"),
+}
+
+# Figures created by this process, reused across charts of the same size
+figures = {}
+
+# Function to check whether plots should be rendered in this run
+def plots_enabled(argv=None):
+    argv = sys.argv if argv is None else argv
+    return no_plots_flag not in argv and os.environ.get("NO_PLOTS", "") not in ("1", "true")
+
+# Function to import pyplot on first use, so stages that only queue render jobs never load matplotlib
+def load_pyplot():
+    import matplotlib
+    matplotlib.use("Agg")  # Render to files only, never to a display
+    import matplotlib.pyplot as plt
+    return plt
+
+# Function to get a cleared figure and axes of the given size
+def get_axes(figsize):
+    if figsize not in figures:
+        figures[figsize] = load_pyplot().subplots(figsize=figsize)
+    fig, ax = figures[figsize]
+    ax.clear()
+    return fig, ax
+
+# Function to save a figure into a directory
+def save_figure(fig, directory, file_name):
+    os.makedirs(directory, exist_ok=True)
+    with timed("io.savefig", file_name):
+        fig.savefig(os.path.join(directory, file_name))
+
+# Function to render the ARIMA prediction plot of a stock from its saved predictions
+def render_arima_prediction(stock_name):
+    # Read from the stock's own partition of the prediction store, or its CSV file if the store has none
+    data = read_predictions(["ARIMA"], [stock_name], frequency=bar_frequency)
+    if data.empty:
+        data = pd.read_csv(os.path.join(arima_results_dir, f"{stock_name}_arima_predictions.csv"), parse_dates=["Date"])
+    fig, ax = get_axes((10, 6))
+    ax.plot(data['Date'], data['Actual'], label="Actual")
+    ax.plot(data['Date'], data['Predicted'], label="Predicted", linestyle="--")
+    ax.set_title(f"ARIMA Prediction for {stock_name}")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Price")
+    ax.legend()
+    save_figure(fig, arima_results_dir, f"{stock_name}_arima_plot.png")
+
+# Function to render the EDA trend and rolling mean plots of a stock
+def render_eda(stock_name, data=None):
+    if data is None:
+        data = load_bars(selected_view, stock_name, bar_frequency, columns=["Date", "Close"])
+
+    # Plot closing price trends
+    fig, ax = get_axes((12, 6))
+    ax.plot(data['Date'], data['Close'], label='Closing Price', color='blue')
+    ax.set_title(f"Closing Price Trend for {stock_name}")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Closing Price")
+    ax.legend()
+    ax.grid()
+    save_figure(fig, eda_results_dir, f"{stock_name}_trend.png")
+
+    # Plot rolling mean for smoothing trends, read from the stock's cached features
+    mean = rolling_mean(stock_name, data, rolling_window)
+    fig, ax = get_axes((12, 6))
+    ax.plot(data['Date'], data['Close'], label='Closing Price', color='blue')
+    ax.plot(data['Date'], mean, label=f'{rolling_window}-Day Rolling Mean', color='orange')
+    ax.set_title(f"Rolling Mean for {stock_name}")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Closing Price")
+    ax.legend()
+    ax.grid()
+    save_figure(fig, eda_results_dir, f"{stock_name}_rolling_mean.png")
+
+# Function to render the ARIMA fit plot of a stock from its saved fitted values
+def render_arima_fit(stock_name):
+    data = pd.read_csv(os.path.join(arima_fit_results_dir, f"{stock_name}_arima_fit.csv"))
+    fig, ax = get_axes((12, 6))
+    ax.plot(data['Actual'], label='Actual', color='blue')
+    ax.plot(data['Fitted'], label='Fitted', color='red')
+    ax.set_title(f"ARIMA Model Fit for {stock_name}")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Closing Price")
+    ax.legend()
+    ax.grid()
+    save_figure(fig, arima_fit_results_dir, f"{stock_name}_arima_fit.png")
+
+# Function to render the per-stock comparison of one metric across models
+def render_metric(metric_name):
+    all_metrics = pd.read_csv(combined_metrics_file)
+    title, ylabel = metric_titles[metric_name]
+
+    # Pivot data to plot grouped bars
+    fig, ax = get_axes((14, 8))
+    pivot_data = all_metrics.pivot(index="Stock", columns="Model", values=metric_name)
+    pivot_data.plot(kind="bar", ax=ax)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel("Stocks")
+    load_pyplot().setp(ax.get_xticklabels(), rotation=45, ha="right")
+    ax.legend(title="Model")
+    fig.tight_layout()
+    save_figure(fig, metric_plots_dir, f"{metric_name}_comparison.png")
+
+# Function to render the box plot of one hypothesis and metric
+def render_hypothesis(hypothesis, metric):
+    metrics_data = pd.read_csv(combined_metrics_file)
+    lstm_data = metrics_data[metrics_data["Model"] == "LSTM"]
+    hybrid_data = metrics_data[metrics_data["Model"] == "Hybrid"]
+    arima_data = metrics_data[metrics_data["Model"] == "ARIMA"]
+
+    if hypothesis == "H1":
+        groups = [pd.concat([lstm_data, hybrid_data])[metric], arima_data[metric]]
+        labels = ["Advanced Models (LSTM + Hybrid)", "ARIMA"]
+    else:
+        groups = [hybrid_data[metric], lstm_data[metric]]
+        labels = ["Hybrid", "LSTM"]
+
+    fig, ax = get_axes((10, 6))
+    ax.boxplot(groups)
+    ax.set_xticks(range(1, len(labels) + 1), labels)
+    ax.set_title(f"{hypothesis}: {metric} Comparison")
+    ax.set_ylabel(metric)
+    save_figure(fig, hypothesis_plots_dir, f"{hypothesis}_{metric}_comparison.png")
+
+# Render functions by job kind
+renderers = {
+    "arima_prediction": render_arima_prediction,
+    "eda": render_eda,
+    "arima_fit": render_arima_fit,
+    "metric": render_metric,
+    "hypothesis": render_hypothesis,
+}
+
+# Functions to list the render jobs of each stage
+def arima_jobs(stock_names):
+    return [("arima_prediction", stock_name) for stock_name in stock_names]
+
+def eda_jobs(stock_names):
+    return [("eda", stock_name) for stock_name in stock_names] + [("arima_fit", stock_name) for stock_name in stock_names]
+
+def metric_jobs():
+    return [("metric", metric_name) for metric_name in metric_titles]
+
+def hypothesis_jobs():
+    return [("hypothesis", hypothesis, metric) for hypothesis in ["H1", "H2"] for metric in ["MAE", "RMSE"]]
+
+# Function to render one job, reporting failures instead of raising them
+def render_job(job):
+    try:
+        with timed(f"render.{job[0]}", " ".join(job[1:])):
+            renderers[job[0]](*job[1:])
+        return job, ""
+    except Exception as e:
+        return job, str(e)
+
+# Function to render many jobs, spread over worker processes when parallel mode is on
+def render_jobs(jobs, parallel=parallel_mode, max_workers=n_workers):
+    if parallel and len(jobs) > 1:
+        with process_pool(max_workers, initializer=None) as executor:
+            results = list(executor.map(render_job, jobs, chunksize=max(1, len(jobs) // 32)))
+    else:
+        results = [render_job(job) for job in jobs]
+
+    for job, error in results:
+        if error:
+            print(f"Error rendering {' '.join(job)}: {error}")
+    print(f"Rendered {sum(1 for _, error in results if not error)} of {len(jobs)} plot jobs.")
+    return results
+
+if __name__ == "__main__":
+    # Render the plots of the stages named on the command line, or of every stage
+    stages = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or ["arima", "eda", "metrics", "hypothesis"]
+    stock_names = list_tickers(selected_view)
+    jobs = []
+    if "arima" in stages:
+        jobs += arima_jobs(stock_names)
+    if "eda" in stages:
+        jobs += eda_jobs(stock_names)
+    if "metrics" in stages:
+        jobs += metric_jobs()
+    if "hypothesis" in stages:
+        jobs += hypothesis_jobs()
+    render_jobs(jobs)
+    write_run_report()
@@ -1,41 +1,32 @@
-import os
-import pandas as pd
+import sys
+from metadata_index import select_universe
+from price_store import list_tickers, save_view, view_path
 
-# Directories
-clean_data_dir = "clean_stock_data"
-selected_data_dir = "selected_stock_data"
-os.makedirs(selected_data_dir, exist_ok=True)
+# Price store stage and the view over it holding the selected stocks
+clean_stage = "clean"
+selected_view = "selected"
 
-# List of selected stocks and their tickers
-selected_stocks = [
-    "M&M.NS", "MARUTI.NS", "TATAMOTORS.NS",  # Automobiles
-    "HDFCBANK.NS", "ICICIBANK.NS", "SBIN.NS",  # Banking and Financial Services
-    "LT.NS", "ULTRACEMCO.NS", "GRASIM.NS",  # Cement and Construction
-    "HINDUNILVR.NS", "ITC.NS", "ASIANPAINT.NS",  # Consumer Goods
-    "RELIANCE.NS", "NTPC.NS", "ADANIENT.NS",  # Energy
-    "SUNPHARMA.NS", "DIVISLAB.NS", "CIPLA.NS",  # Healthcare and Pharmaceuticals
-    "TCS.NS", "INFY.NS", "HCLTECH.NS",  # Information Technology
-    "JSWSTEEL.NS", "TATASTEEL.NS", "HINDALCO.NS",  # Metals and Mining
-    "BHARTIARTL.NS"  # Telecommunications
-]
+# Query selecting the stocks against the metadata index (see metadata_index.query_sql), for example
+# "top 3 by market_cap per sector" once the index holds market caps. The default keeps the project's 25-stock
+# shortlist, flagged in nse_universe.csv.
+selection_query = "where shortlisted = 1"
 
-# Function to filter and copy selected stock data
-def filter_selected_stocks(file_name):
+# Function to save the stocks the selection query picks (or the given stocks) as a view over the clean data
+def filter_selected_stocks(available_tickers, stocks=None, query=None):
     try:
-        ticker = file_name.replace(".csv", "")
-        if ticker in selected_stocks:
-            # Load clean data
-            file_path = os.path.join(clean_data_dir, file_name)
-            data = pd.read_csv(file_path)
+        stocks = select_universe(query or selection_query) if stocks is None else stocks
+        available = set(available_tickers)
+        tickers = [ticker for ticker in stocks if ticker in available]
+        missing = sorted(set(stocks) - set(tickers))
+        if missing:
+            print(f"No clean data for: {', '.join(missing)}")
 
-            # Save to selected data folder
-            selected_file_path = os.path.join(selected_data_dir, file_name)
-            data.to_csv(selected_file_path, index=False)
-            print(f"Selected data for {ticker} saved to {selected_file_path}.")
+        # The view only records tickers, the clean data is not copied
+        save_view(selected_view, clean_stage, tickers)
+        print(f"Selected {len(tickers)} stocks saved to {view_path(selected_view)}.")
     except Exception as e:
-        print(f"Error processing {file_name}: {e}")
+        print(f"Error selecting stocks: {e}")
 
-# Process all files in the clean data directory
-for file in os.listdir(clean_data_dir):
-    if file.endswith(".csv"):
-        filter_selected_stocks(file)
+if __name__ == "__main__":
+    # Usage: python shortlist_stock_data_nse.py [query] : select from all tickers in the clean price store
+    filter_selected_stocks(list_tickers(clean_stage), query=" ".join(arg for arg in sys.argv[1:] if not arg.startswith("--")) or None)
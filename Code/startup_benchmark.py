@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import time
+import subprocess
+import pandas as pd
+from cli import import_only_flag, subcommands
+
+# Directories
+code_dir = os.path.dirname(os.path.abspath(__file__))
+startup_benchmark_file = "startup_benchmark.csv"  # One row per subcommand and run, appended to track regressions
+
+# Benchmark Parameters
+repeats = 3  # Runs per subcommand, the fastest one is kept
+regression_tolerance = 0.2  # Slowdown against the previous run that is reported as a regression
+# Subcommands whose scripts still fetch data at import time are left out
+skipped_subcommands = ["select", "sort"]
+# Backends that the metrics, hypothesis and plotting subcommands must never import
+heavy_modules = ["tensorflow", "keras", "statsmodels", "sklearn"]
+importtime_line = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+# Function to run one subcommand's startup path under -X importtime and summarise it
+def measure_startup(subcommand):
+    command = [sys.executable, "-X", "importtime", os.path.join(code_dir, "cli.py"), subcommand, import_only_flag]
+    start_time = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start_time
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed")
+
+    imports = [(int(self_us), name) for self_us, _, _, name in importtime_line.findall(completed.stderr)]
+    top_level = {name.split(".")[0] for _, name in imports}
+    return {
+        "Subcommand": subcommand,
+        "Module": subcommands[subcommand][0],
+        "Import_ms": round(sum(self_us for self_us, _ in imports) / 1000, 1),
+        "Wall_ms": round(wall_seconds * 1000, 1),
+        "Modules_Imported": len(imports),
+        "Heavy_Imports": " ".join(module for module in heavy_modules if module in top_level),
+    }
+
+# Function to benchmark every subcommand, keeping the fastest of the repeated runs
+def run_benchmark(names=None, runs=repeats):
+    names = names or [name for name in subcommands if name not in skipped_subcommands]
+    results = []
+    for name in names:
+        try:
+            best = min((measure_startup(name) for _ in range(runs)), key=lambda result: result["Wall_ms"])
+            results.append(best)
+        except Exception as e:
+            print(f"Error benchmarking {name}: {e}")
+    return pd.DataFrame(results)
+
+# Function to compare a benchmark against the previous run stored in the benchmark file
+def compare_with_previous(results):
+    if not os.path.exists(startup_benchmark_file) or results.empty:
+        return results.assign(Previous_Import_ms=float("nan"), Regression=False)
+    history = pd.read_csv(startup_benchmark_file)
+    previous = history[history["Run"] == history["Run"].max()].set_index("Subcommand")["Import_ms"]
+    results = results.assign(Previous_Import_ms=results["Subcommand"].map(previous))
+    return results.assign(Regression=results["Import_ms"] > results["Previous_Import_ms"] * (1 + regression_tolerance))
+
+if __name__ == "__main__":
+    # Benchmark the subcommands named on the command line, or all of them
+    results = compare_with_previous(run_benchmark(sys.argv[1:]))
+    print(results.to_string(index=False))
+
+    for _, row in results[results["Regression"]].iterrows():
+        print(f"Startup regression in {row['Subcommand']}: {row['Previous_Import_ms']} ms -> {row['Import_ms']} ms")
+    for _, row in results[results["Subcommand"].isin(["metrics", "hypothesis", "plots", "render"]) & (results["Heavy_Imports"] != "")].iterrows():
+        print(f"{row['Subcommand']} imports {row['Heavy_Imports']} at startup")
+
+    results.assign(Run=time.strftime("%Y-%m-%d %H:%M:%S")).drop(columns=["Previous_Import_ms", "Regression"]).to_csv(
+        startup_benchmark_file, mode="a", header=not os.path.exists(startup_benchmark_file), index=False)
+    print(f"Startup benchmark saved to {startup_benchmark_file}")
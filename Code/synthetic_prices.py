@@ -0,0 +1,86 @@
+import sys
+import zlib
+import calendar
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from bar_resampler import session_close, session_open, trading_weekdays
+from price_store import save_prices
+
+# Price store stage written by the generator, the same one fetch_data_nse_bse.py writes
+raw_stage = "raw"
+
+# Generator Parameters
+base_seed = 404  # Every ticker's series is derived from this seed and its name, so runs are reproducible
+start_date = "2015-01-01"
+n_bars = 2500  # Bars of history per ticker (about ten years of trading days)
+bar_frequency = "B"  # Pandas frequency of the bars ("B" trading days, "h" hourly, "15min" ...)
+annual_drift = 0.08  # Mean yearly log return
+annual_volatility = 0.25  # Yearly volatility of the log returns
+sessions_per_year = 252  # Intraday bars per year are this many sessions of bars
+bars_per_year = {"B": 252, "D": 365, "W": 52}
+
+# Function to get the reproducible random generator of a ticker
+def ticker_rng(ticker, seed=base_seed):
+    return np.random.default_rng([seed, zlib.crc32(ticker.encode())])
+
+# Function to name the synthetic tickers of a universe
+def synthetic_tickers(n_tickers):
+    return [f"SYN{index:05d}.NS" for index in range(n_tickers)]
+
+# Function to get the bar times of one intraday session (None for daily and coarser frequencies)
+def session_bars(frequency):
+    offset = to_offset(frequency)
+    if not isinstance(offset, pd.offsets.Tick) or offset.nanos >= pd.Timedelta(days=1).value:
+        return None
+    session = pd.timedelta_range(f"{session_open}:00", f"{session_close}:00", freq=frequency)
+    return session[session < pd.Timedelta(f"{session_close}:00")]
+
+# Function to build the timestamps of the bars: intraday bars fall only inside the trading session of trading
+# weekdays, like the bars bar_resampler keeps
+def bar_dates(bars, frequency=bar_frequency):
+    session = session_bars(frequency)
+    if session is None:
+        return pd.date_range(start_date, periods=bars, freq=frequency)
+    weekmask = " ".join(calendar.day_abbr[day] for day in trading_weekdays)
+    days = pd.bdate_range(start_date, periods=-(-bars // len(session)), freq="C", weekmask=weekmask)
+    return pd.DatetimeIndex((days.values[:, np.newaxis] + session.values[np.newaxis, :]).ravel()[:bars])
+
+# Function to generate one ticker's OHLCV bars in the schema of fetch_data_nse_bse.py
+def generate_prices(ticker, bars=n_bars, frequency=bar_frequency, seed=base_seed):
+    rng = ticker_rng(ticker, seed)
+    session = session_bars(frequency)
+    periods = bars_per_year.get(frequency, 252) if session is None else sessions_per_year * len(session)
+    drift = annual_drift / periods
+    volatility = annual_volatility / np.sqrt(periods) * rng.uniform(0.6, 1.6)
+
+    # Geometric random walk for the close, starting from a random price level
+    log_returns = rng.normal(drift - volatility ** 2 / 2, volatility, bars)
+    close = rng.uniform(50, 5000) * np.exp(np.cumsum(log_returns))
+
+    # Open near the previous close; high and low bracket the open and close of the bar
+    open_ = np.concatenate([[close[0]], close[:-1]]) * np.exp(rng.normal(0, volatility / 4, bars))
+    spread = np.abs(rng.normal(0, volatility / 2, bars))
+    high = np.maximum(open_, close) * np.exp(spread)
+    low = np.minimum(open_, close) * np.exp(-spread)
+    volume = rng.lognormal(13, 0.6, bars).astype(np.int64)
+
+    return pd.DataFrame({
+        "Date": bar_dates(bars, frequency),
+        "Close": close, "High": high, "Low": low, "Open": open_, "Volume": volume,
+    })
+
+# Function to write a synthetic universe into the raw stage of the price store
+def write_universe(n_tickers, bars=n_bars, frequency=bar_frequency, seed=base_seed):
+    tickers = synthetic_tickers(n_tickers)
+    for ticker in tickers:
+        save_prices(raw_stage, ticker, generate_prices(ticker, bars, frequency, seed))
+    return tickers
+
+if __name__ == "__main__":
+    # Usage: python synthetic_prices.py <tickers> [bars] [frequency]
+    n_tickers = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+    bars = int(sys.argv[2]) if len(sys.argv) > 2 else n_bars
+    frequency = sys.argv[3] if len(sys.argv) > 3 else bar_frequency
+    write_universe(n_tickers, bars, frequency)
+    print(f"Synthetic prices for {n_tickers} tickers ({bars} {frequency} bars) saved to the {raw_stage} stage.")
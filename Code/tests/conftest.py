@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+# The scripts are imported by name, the way they import each other
+code_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, code_dir)
+
+# Function to run every test in its own directory, so the result folders the scripts create on import stay out of Code
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+# Function to serve synthetic prices through the local yf.download stand-in, written in the layout yfinance saves
+@pytest.fixture
+def download_prices(work_dir):
+    import local_price_provider
+    from synthetic_prices import generate_prices
+
+    os.makedirs(local_price_provider.local_data_dir, exist_ok=True)
+
+    def download(ticker, bars=600, frequency="B"):
+        generate_prices(ticker, bars, frequency).set_index("Date").to_csv(
+            os.path.join(local_price_provider.local_data_dir, f"{ticker}.csv"))
+        return local_price_provider.download(ticker).xs(ticker, axis=1, level=1).reset_index()
+
+    return download
@@ -0,0 +1,27 @@
+import numpy as np
+
+# Function to build the windows with the loop create_dataset replaced
+def loop_dataset(data, look_back):
+    X, Y = [], []
+    for i in range(len(data) - look_back):
+        X.append(data[i:i + look_back])
+        Y.append(data[i + look_back])
+    return np.array(X), np.array(Y)
+
+def test_strided_windows_match_loop(download_prices):
+    from lstm_hybrid_analysis_modified import create_dataset, look_back
+
+    close = download_prices("SYN00000.NS")["Close"].to_numpy()
+    scaled = ((close - close.min()) / (close.max() - close.min())).reshape(-1, 1)
+    X, Y = create_dataset(scaled, look_back)
+    expected_X, expected_Y = loop_dataset(scaled, look_back)
+
+    assert X.shape == expected_X.shape
+    np.testing.assert_array_equal(X, expected_X)
+    np.testing.assert_array_equal(Y, expected_Y)
+
+def test_short_series_has_no_windows():
+    from lstm_hybrid_analysis_modified import create_dataset
+
+    X, Y = create_dataset(np.arange(5.0).reshape(-1, 1), 5)
+    assert X.shape == (0, 5, 1) and Y.shape == (0, 1)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from scipy.stats import t as student_t
+
+# Function to compute the Diebold-Mariano statistic with the Harvey-Leybourne-Newbold correction for one series
+def reference_dm(d, horizon):
+    n = len(d)
+    centered = d - d.mean()
+    variance = np.sum(centered ** 2) / n + 2 * sum(np.sum(centered[lag:] * centered[:-lag]) / n for lag in range(1, horizon))
+    statistic = d.mean() / np.sqrt(variance / n) * np.sqrt((n + 1 - 2 * horizon + horizon * (horizon - 1) / n) / n)
+    return statistic, 2 * student_t.sf(abs(statistic), df=n - 1)
+
+@pytest.mark.parametrize("horizon", [1, 3])
+def test_diebold_mariano_matches_reference(download_prices, horizon):
+    from hypothesis_code import compact_series, diebold_mariano
+
+    # Squared-error differentials of a naive and a 5-bar moving-average forecast, the second series with gaps
+    close = download_prices("SYN00002.NS", bars=400)["Close"].to_numpy()
+    naive = close[4:-1]
+    average = np.convolve(close, np.ones(5) / 5, mode="valid")[:-1]
+    actual = close[5:]
+    first = (actual - naive) ** 2 - (actual - average) ** 2
+    second = first[::-1].copy()
+    second[np.random.default_rng(0).choice(len(second), 40, replace=False)] = np.nan
+
+    compact, lengths = compact_series(np.vstack([first, second]))
+    mean, statistic, p_value = diebold_mariano(compact, lengths, horizon)
+
+    for row, series in enumerate([first, second]):
+        series = series[~np.isnan(series)]
+        expected_statistic, expected_p_value = reference_dm(series, horizon)
+        assert lengths[row] == len(series)
+        assert mean[row] == pytest.approx(series.mean())
+        assert statistic[row] == pytest.approx(expected_statistic, rel=1e-10)
+        assert p_value[row] == pytest.approx(expected_p_value, rel=1e-8)
@@ -0,0 +1,16 @@
+import numpy as np
+
+def test_numpy_forward_matches_keras(download_prices):
+    import keras
+    import lstm_hybrid_analysis_modified as lstm
+    from numpy_lstm import check_against_keras, model_weights
+
+    close = download_prices("SYN00003.NS", bars=300)["Close"].to_numpy()
+    X, Y = lstm.create_dataset((close - close.min()) / (close.max() - close.min()), lstm.look_back)
+
+    # A briefly trained model, so the comparison runs on weights like the stored models' rather than the initial ones
+    keras.utils.set_random_seed(404)
+    model = lstm.build_lstm_model()
+    model.fit(X, Y, epochs=2, batch_size=lstm.batch_size, verbose=0)
+
+    assert check_against_keras(model, model_weights(model, np.float64), X) < 4e-7
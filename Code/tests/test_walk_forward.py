@@ -0,0 +1,18 @@
+import numpy as np
+
+def test_extend_matches_refiltering(download_prices):
+    from statsmodels.tsa.arima.model import ARIMA
+    from arima_order_search import quiet_fit
+    from walk_forward_backtest import walk_forward_forecasts
+
+    values = download_prices("SYN00001.NS", bars=260)["Close"].to_numpy()
+    order, train_size = (2, 1, 0), 200
+    # No refit inside the window, so every forecast comes from the first fit's parameters
+    predictions = walk_forward_forecasts(values, order, train_size, refit_interval=len(values))
+
+    with quiet_fit():
+        params = ARIMA(values[:train_size], order=order).fit().params
+        expected = [ARIMA(values[:t], order=order).filter(params).forecast(1)[0] for t in range(train_size, len(values))]
+
+    assert np.isnan(predictions[:train_size]).all()
+    np.testing.assert_allclose(predictions[train_size:], expected, rtol=1e-8)
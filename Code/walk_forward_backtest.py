@@ -0,0 +1,107 @@
+import os
+import time
+from concurrent.futures import as_completed
+import pandas as pd
+import numpy as np
+from arima_order_search import quiet_fit, resolve_order
+from bar_resampler import frequency_name, frequency_option, load_bars, resample_view
+from instrumentation import instrument, write_run_report
+from prediction_store import write_predictions
+from price_store import list_tickers
+from worker_pool import process_pool
+
+# Directories
+selected_view = "selected"  # Price store view holding the selected stocks
+walk_forward_results_dir = frequency_name("walk_forward_results", frequency_option())
+os.makedirs(walk_forward_results_dir, exist_ok=True)
+
+# Backtest Parameters
+arima_order = (5, 1, 0)  # (p, d, q) order for ARIMA model
+bar_frequency = frequency_option()  # Bars the backtest runs on, from --bars ("5min", "h", "W" ...); None keeps the stored bars
+initial_train_size = 500  # Observations used for the first fit
+refit_every = 60  # Steps between full refits, the steps in between only filter the new observation
+parallel_mode = True  # Backtest each stock in a separate worker process
+n_workers = None  # Number of worker processes (None = one per CPU core)
+
+# Function to produce one-step-ahead out-of-sample forecasts over a rolling origin
+def walk_forward_forecasts(ts, order=arima_order, train_size=initial_train_size, refit_interval=refit_every):
+    from statsmodels.tsa.arima.model import ARIMA
+    values = np.asarray(ts, dtype=float)
+    predictions = np.full(len(values), np.nan)
+
+    with quiet_fit():
+        arima_fit = ARIMA(values[:train_size], order=order).fit()
+        steps_since_refit = 0
+
+        for t in range(train_size, len(values)):
+            # Forecast observation t using only the data before it
+            predictions[t] = arima_fit.forecast(1)[0]
+
+            steps_since_refit += 1
+            if steps_since_refit >= refit_interval:
+                # Re-estimate on all data seen so far, warm-started from the current parameters
+                arima_fit = ARIMA(values[:t + 1], order=order).fit(start_params=arima_fit.params)
+                steps_since_refit = 0
+            else:
+                # Add observation t to the filtered state without refitting
+                arima_fit = arima_fit.extend(values[t:t + 1])
+
+    return predictions
+
+# Function to backtest one stock and save its out-of-sample predictions
+@instrument("walk_forward", profile=True)
+def backtest_stock(stock_name):
+    start_time = time.perf_counter()
+    try:
+        data = load_bars(selected_view, stock_name, bar_frequency, columns=["Date", "Close"])
+        if len(data) <= initial_train_size:
+            raise ValueError(f"needs more than {initial_train_size} rows, has {len(data)}")
+
+        order = resolve_order(stock_name, data, arima_order)
+        predictions = walk_forward_forecasts(data['Close'], order)
+
+        # Save only the out-of-sample part, in the same schema as the other prediction files
+        out_of_sample = slice(initial_train_size, None)
+        results_file = os.path.join(walk_forward_results_dir, f"{stock_name}_walk_forward_predictions.csv")
+        pd.DataFrame({
+            "Date": data['Date'].values[out_of_sample],
+            "Actual": data['Close'].values[out_of_sample],
+            "Predicted": predictions[out_of_sample],
+        }).to_csv(results_file, index=False)
+        write_predictions("Walk-Forward ARIMA", stock_name, data['Date'].values[out_of_sample],
+                          data['Close'].values[out_of_sample], predictions[out_of_sample], frequency=bar_frequency)
+
+        print(f"Walk-forward results saved for {stock_name}.")
+        status, error = "success", ""
+    except Exception as e:
+        print(f"Error in walk-forward backtest for {stock_name}: {e}")
+        status, error = "error", str(e)
+
+    return {"Stock": stock_name, "Status": status, "Seconds": round(time.perf_counter() - start_time, 3), "Error": error}
+
+# Function to backtest every stock, in worker processes when parallel mode is on
+def run_backtest(stock_names, parallel=parallel_mode, max_workers=n_workers):
+    # Bars are resampled once here, so the workers only read them from the cache
+    if bar_frequency:
+        resample_view(selected_view, bar_frequency, stock_names)
+
+    if not parallel:
+        return [backtest_stock(stock_name) for stock_name in stock_names]
+
+    results = []
+    with process_pool(max_workers) as executor:
+        futures = {executor.submit(backtest_stock, stock_name): stock_name for stock_name in stock_names}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error processing {futures[future]}: {e}")
+                results.append({"Stock": futures[future], "Status": "error", "Seconds": np.nan, "Error": str(e)})
+    return results
+
+if __name__ == "__main__":
+    # Backtest each stock in the selected view of the price store
+    run_results = pd.DataFrame(run_backtest(list_tickers(selected_view)))
+    failed = run_results[run_results["Status"] != "success"]
+    print(f"Walk-forward backtest finished: {len(run_results) - len(failed)} succeeded, {len(failed)} failed.")
+    write_run_report()
@@ -0,0 +1,61 @@
+import numpy as np
+from keras.utils import Sequence
+
+# Batches of look-back windows for Keras, copying only the windows of the batch being fed.
+# Kept out of lstm_hybrid_analysis_modified.py so importing that module does not load TensorFlow.
+class WindowBatches(Sequence):
+    def __init__(self, X, Y, batch_size=32, shuffle=True, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.X = X
+        self.Y = Y
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.order = self.rng.permutation(len(X)) if shuffle else None
+
+    def __len__(self):
+        return int(np.ceil(len(self.X) / self.batch_size))
+
+    def __getitem__(self, index):
+        start, stop = index * self.batch_size, (index + 1) * self.batch_size
+        if self.order is None:
+            return np.ascontiguousarray(self.X[start:stop]), self.Y[start:stop]
+        batch_index = self.order[start:stop]
+        return self.X[batch_index], self.Y[batch_index]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.order = self.rng.permutation(len(self.X))
+
+# Batches of look-back windows pooled from many series, gathered from one concatenated array.
+# Each window is addressed by its start offset, so the pooled windows are never materialised.
+class PooledWindowBatches(Sequence):
+    def __init__(self, series, starts, look_back, ticker_ids=None, batch_size=256, shuffle=True, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.series = series
+        self.starts = starts
+        self.offsets = np.arange(look_back)
+        self.look_back = look_back
+        self.ticker_ids = ticker_ids
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.order = self.rng.permutation(len(starts)) if shuffle else None
+
+    def __len__(self):
+        return int(np.ceil(len(self.starts) / self.batch_size))
+
+    def __getitem__(self, index):
+        batch_index = slice(index * self.batch_size, (index + 1) * self.batch_size)
+        if self.order is not None:
+            batch_index = self.order[batch_index]
+        starts = self.starts[batch_index]
+        X = self.series[starts[:, np.newaxis] + self.offsets][..., np.newaxis]
+        Y = self.series[starts + self.look_back][:, np.newaxis]
+        if self.ticker_ids is None:
+            return X, Y
+        return (X, self.ticker_ids[batch_index][:, np.newaxis]), Y
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.order = self.rng.permutation(len(self.starts))
@@ -0,0 +1,40 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker Parameters
+blas_threads_per_worker = 1  # BLAS/OpenMP threads allowed inside each worker
+blas_thread_env_vars = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                        "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+# Function to limit BLAS threads for the current process and any process it starts.
+# Only worker processes call it (as their pool initializer): the limit is permanent, and in the main process it would
+# also slow the stages running in other threads.
+def pin_blas_threads(n_threads=blas_threads_per_worker):
+    for var in blas_thread_env_vars:
+        os.environ[var] = str(n_threads)
+
+    # Thread pools of an already-loaded BLAS ignore the environment, so limit them directly
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=n_threads)
+    except ImportError:
+        pass
+
+# Function to get a start method whose workers do not inherit the locks of this process's threads.
+# Forking while another thread holds a lock (e.g. the import lock during a lazy import) deadlocks the
+# worker, so workers are forked from a clean fork server where one is available.
+def worker_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+# Function to create a process pool started from a clean context
+def process_pool(max_workers=None, initializer=pin_blas_threads):
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=worker_context(), initializer=initializer)
+
+# Function to create a process pool whose workers are replaced after a number of tasks, returning
+# whatever a worker leaked to the OS. multiprocessing.Pool is used because ProcessPoolExecutor's
+# max_tasks_per_child can hang when a worker is replaced while tasks are pending (before Python 3.12).
+def recycled_pool(max_workers=None, tasks_per_worker=10, initializer=pin_blas_threads, initargs=()):
+    return worker_context().Pool(max_workers, initializer=initializer, initargs=initargs, maxtasksperchild=tasks_per_worker)